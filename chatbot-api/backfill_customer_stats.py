@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+📊 Customer Stats Backfill
+Fills customers.total_orders / total_spent / lifetime_value / last_order_at from existing orders
+(one-time; afterwards the API keeps them current incrementally - services/customer_stats.py)
+
+Streams orders with keyset pagination and writes absolute values in chunked UPDATEs (set_customer_stats);
+customers that no longer exist are skipped, never recreated.
+Run it before enabling CUSTOMER_STATS_ENABLED, or while no orders are coming in.
+
+Usage:
+    python backfill_customer_stats.py
+    python backfill_customer_stats.py --page-size 2000 --write-chunk 500
+"""
+
+import argparse
+import asyncio
+
+from services.customer_stats import backfill_customer_stats
+from services.http_pool import close_http_pool
+from services.logger import setup_logging, shutdown_logging
+
+
+async def run(args) -> dict:
+    try:
+        return await backfill_customer_stats(page_size=args.page_size, write_chunk=args.write_chunk)
+    finally:
+        await close_http_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute customer aggregates from orders")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--write-chunk", type=int, default=500, help="customers per set_customer_stats call")
+    args = parser.parse_args()
+
+    setup_logging()
+    try:
+        stats = asyncio.run(run(args))
+    finally:
+        shutdown_logging()
+
+    print("📊 CUSTOMER STATS BACKFILL")
+    print("=" * 50)
+    for key, value in stats.items():
+        print(f"   {key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
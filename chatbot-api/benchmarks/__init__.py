@@ -0,0 +1 @@
+# Benchmarks package - offline Supabase stand-in and performance scripts
\ No newline at end of file
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+JSON Encode/Decode Microbenchmark (offline, no network)
+Per-request CPU of the JSON work in create_order and the staff dashboard:
+stdlib json + pretty-print/len(str()) logging (before) vs services.json_codec (after)
+
+Usage:
+    python benchmarks/bench_json.py --items 6 --rows 100
+"""
+
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime, timezone
+
+from harness import SAMPLE_MENUS, sample_order
+from starlette.responses import JSONResponse
+from services.json_codec import ORJSON_AVAILABLE, FastJSONResponse, dumps, loads
+
+
+def order_row(i: int) -> dict:
+    """One orders row as PostgREST returns it (all columns)"""
+    now = datetime.now(timezone.utc).isoformat()
+    return {
+        "id": str(uuid.uuid4()), "order_number": f"T1017{i:08X}", "customer_id": str(uuid.uuid4()),
+        "customer_name": "คุณลูกค้า ทดสอบ", "customer_phone": "0812345678", "total_amount": 750.0,
+        "order_type": "pickup", "payment_method": "cash", "payment_status": "unpaid", "status": "pending",
+        "notes": "ไม่ใส่วาซาบิ", "branch_id": None, "delivery_fee": 0.0, "discount_amount": 0.0,
+        "net_amount": 750.0, "delivery_address": None, "metadata": {}, "tax_amount": 0.0,
+        "estimated_ready_at": None, "completed_at": None, "created_at": now, "updated_at": now,
+    }
+
+
+def create_order_before(body: bytes, supabase_body: bytes, response: dict):
+    data = json.loads(body)                                    # Request.json()
+    json.dumps(data, indent=2, ensure_ascii=False)             # debug pretty-print
+    json.dumps(data).encode()                                  # httpx json= payload
+    result = json.loads(supabase_body)                         # response.json()
+    len(str(result))                                           # size log
+    JSONResponse(response).body                                # FastAPI response
+
+
+def create_order_after(body: bytes, supabase_body: bytes, response: dict):
+    data = loads(body)
+    dumps(data)
+    loads(supabase_body)
+    FastJSONResponse(response).body
+
+
+def dashboard_before(rows_body: bytes):
+    rows = json.loads(rows_body)
+    len(str(rows))
+    JSONResponse({"success": True, "orders": rows}).body
+
+
+def dashboard_after(rows_body: bytes):
+    rows = loads(rows_body)
+    FastJSONResponse({"success": True, "orders": rows}).body
+
+
+def measure(fn, args, iterations: int) -> float:
+    """CPU microseconds per call"""
+    start = time.process_time()
+    for _ in range(iterations):
+        fn(*args)
+    return (time.process_time() - start) / iterations * 1_000_000
+
+
+def run(items: int, rows: int, iterations: int):
+    menus = [{"id": str(uuid.uuid4()), "name": name, "price": price} for name, _, price in SAMPLE_MENUS]
+    body = json.dumps(sample_order(menus, items), ensure_ascii=False).encode()
+    supabase_body = json.dumps([order_row(0)]).encode()
+    response = {"success": True, "order_number": "T10170000ABCD", "order_id": str(uuid.uuid4()),
+                "message": "Order created successfully", "total_amount": 750.0, "status": "pending"}
+    rows_body = json.dumps([order_row(i) for i in range(rows)], ensure_ascii=False).encode()
+
+    print("⚡ JSON MICROBENCHMARK (CPU per request)")
+    print("=" * 50)
+    print(f"   Backend: {'orjson' if ORJSON_AVAILABLE else 'stdlib json (orjson not installed)'}")
+    print(f"   Order payload: {items} item(s), {len(body)} bytes; dashboard: {rows} rows, {len(rows_body)} bytes")
+
+    scenarios = [
+        ("POST /api/orders/create", create_order_before, create_order_after, (body, supabase_body, response)),
+        ("GET /api/orders/status/today", dashboard_before, dashboard_after, (rows_body,)),
+    ]
+    for label, before, after, args in scenarios:
+        count = iterations if label.startswith("POST") else max(1, iterations // 20)
+        before_us = measure(before, args, count)
+        after_us = measure(after, args, count)
+        print(f"\n🔍 {label}")
+        print(f"   🐌 Before: {before_us:8.1f}µs")
+        print(f"   ⚡ After:  {after_us:8.1f}µs")
+        print(f"   📈 Speedup: {before_us / after_us:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="stdlib json vs json_codec per-request CPU")
+    parser.add_argument("--items", type=int, default=6)
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+    run(args.items, args.rows, args.iterations)
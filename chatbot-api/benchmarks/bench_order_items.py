@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Order Items Insert Benchmark (offline)
+Per-item POST loop (legacy) vs one array insert, by item count
+
+Usage:
+    python benchmarks/bench_order_items.py --latency-ms 20
+"""
+
+import argparse
+import asyncio
+
+from harness import FakePostgrest, init_http_pool, close_http_pool, summarize, Timer
+from services.database_service import supabase_request, bulk_insert
+
+ITEM_COUNTS = (1, 3, 6, 12, 24)
+
+
+def build_items(order_id: str, count: int):
+    return [{
+        "order_id": order_id, "menu_id": None, "menu_name": f"Item {i}", "quantity": 1,
+        "unit_price": 100.0, "total_price": 100.0, "notes": "", "metadata": {},
+    } for i in range(count)]
+
+
+async def run(latency_ms: float, repeats: int):
+    fake = FakePostgrest(latency_ms=latency_ms)
+    await init_http_pool(transport=fake)
+    order = fake.seed_rows("orders", [{"order_number": "TBENCH", "total_amount": 0}])[0]
+
+    print("⚡ ORDER ITEMS INSERT BENCHMARK (fake Supabase)")
+    print("=" * 50)
+    print(f"   Simulated latency: {latency_ms}ms, repeats: {repeats}")
+    try:
+        for count in ITEM_COUNTS:
+            loop_ms, bulk_ms = [], []
+            for _ in range(repeats):
+                items = build_items(order["id"], count)
+                with Timer(loop_ms):
+                    for item in items:
+                        await supabase_request("POST", "order_items", item)
+                with Timer(bulk_ms):
+                    await bulk_insert("order_items", items)
+            loop, bulk = summarize(loop_ms), summarize(bulk_ms)
+            print(f"\n🔍 {count} item(s)")
+            print(f"   🐌 Per-item loop: {loop['avg']:.2f}ms avg ({count} round trips)")
+            print(f"   ⚡ Bulk insert:   {bulk['avg']:.2f}ms avg (1 round trip)")
+            print(f"   📈 Speedup: {loop['avg'] / bulk['avg']:.1f}x")
+    finally:
+        await close_http_pool()
+        fake.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-item vs bulk order_items insert")
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args.latency_ms, args.repeats))
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Order Hot Path Benchmark (offline)
+Drives create_order, get_order_status and today's orders through the real app
+with Supabase replaced by the SQLite fake - deterministic, no network
+
+Usage:
+    python benchmarks/bench_orders.py
+    python benchmarks/bench_orders.py --orders 200 --latency-ms 25 --items 12
+    python benchmarks/bench_orders.py --mode both   # RPC vs multi-call create_order
+"""
+
+import argparse
+import asyncio
+
+from harness import fake_app, seed_catalog, sample_order, summarize, Timer
+from routers import orders as orders_router
+
+
+async def run(orders: int, items: int, latency_ms: float, seed: int, mode: str):
+    orders_router.order_rpc["enabled"] = mode == "rpc"
+    async with fake_app(latency_ms=latency_ms, seed=seed) as (client, fake):
+        menus = seed_catalog(fake)
+        fake.reset_stats()
+
+        create_ms, lookup_ms, today_ms = [], [], []
+        order_numbers = []
+        for i in range(orders):
+            payload = sample_order(menus, item_count=items, phone=f"08{i % 50:08d}")
+            with Timer(create_ms):
+                response = await client.post("/api/orders/create", json=payload)
+            response.raise_for_status()
+            order_numbers.append(response.json()["order_number"])
+        create_calls = sum(fake.calls.values())
+
+        fake.reset_stats()
+        for order_number in order_numbers:
+            with Timer(lookup_ms):
+                (await client.get(f"/api/orders/{order_number}")).raise_for_status()
+        lookup_calls = sum(fake.calls.values())
+
+        fake.reset_stats()
+        for _ in range(min(orders, 20)):
+            with Timer(today_ms):
+                (await client.get("/api/orders/today")).raise_for_status()
+        today_calls = sum(fake.calls.values())
+
+    print(f"\n⚡ ORDER HOT PATH BENCHMARK (fake Supabase, create path: {mode})")
+    print("=" * 50)
+    print(f"   Orders: {orders}, items/order: {items}, simulated latency: {latency_ms}ms")
+    for name, samples, calls, count in (
+        ("create_order", create_ms, create_calls, orders),
+        ("get_order_status", lookup_ms, lookup_calls, orders),
+        ("today_orders", today_ms, today_calls, min(orders, 20)),
+    ):
+        stats = summarize(samples)
+        print(f"\n🔍 {name}")
+        print(f"   ⏱️  Avg: {stats['avg']:.2f}ms  p50: {stats['p50']:.2f}ms  "
+              f"p95: {stats['p95']:.2f}ms  max: {stats['max']:.2f}ms")
+        print(f"   📡 Supabase round trips/request: {calls / count:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline order hot path benchmark")
+    parser.add_argument("--orders", type=int, default=50)
+    parser.add_argument("--items", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mode", choices=["rpc", "multi", "both"], default="both")
+    args = parser.parse_args()
+    for mode in (("multi", "rpc") if args.mode == "both" else (args.mode,)):
+        asyncio.run(run(args.orders, args.items, args.latency_ms, args.seed, mode))
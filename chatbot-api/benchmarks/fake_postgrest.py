@@ -0,0 +1,550 @@
+"""
+Fake PostgREST - In-process Supabase REST stand-in backed by SQLite
+Plugs into the shared HTTP pool as an httpx transport so supabase_request,
+the routers and DatabaseV2Service run unchanged, offline and repeatably
+
+Usage:
+    fake = FakePostgrest(latency_ms=20, seed=42)
+    await init_http_pool(transport=fake)
+"""
+
+import asyncio
+import json
+import os
+import random
+import re
+import sqlite3
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import unquote
+
+import httpx
+
+from benchmarks.fake_rpc import BUILTIN_RPCS
+
+DEFAULT_SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "..", "supabase_schema.json")
+
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+FILTER_OPS = {
+    "eq": "=", "neq": "<>", "gt": ">", "gte": ">=", "lt": "<", "lte": "<=",
+    "like": "LIKE", "ilike": "LIKE", "in": "IN", "is": "IS",
+}
+# Unique constraints created by the SQL migrations in this repo
+DEFAULT_UNIQUE = {
+    "orders": [("order_number",)],  # create_order_rpc.sql
+}
+FK_PATTERN = re.compile(r"<fk table='(\w+)' column='(\w+)'/>")
+
+
+class PostgrestError(Exception):
+    """Error returned to the client in PostgREST's JSON error shape"""
+
+    def __init__(self, status: int, code: str, message: str, details: Optional[str] = None):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+        self.details = details
+
+    def to_response(self) -> httpx.Response:
+        body = {"code": self.code, "message": self.message, "details": self.details, "hint": None}
+        return httpx.Response(self.status, json=body)
+
+
+class Column:
+    """Column metadata derived from supabase_schema.json"""
+
+    def __init__(self, name: str, props: Dict[str, Any]):
+        self.name = name
+        self.type = props.get("type")
+        self.format = props.get("format", "")
+        self.default = props.get("default")
+        description = props.get("description", "")
+        self.primary_key = "<pk/>" in description
+        fk = FK_PATTERN.search(description)
+        self.fk: Optional[Tuple[str, str]] = (fk.group(1), fk.group(2)) if fk else None
+
+    @property
+    def is_json(self) -> bool:
+        return self.type is None or self.format in ("json", "jsonb")
+
+    @property
+    def is_timestamp(self) -> bool:
+        return self.format.startswith("timestamp")
+
+    @property
+    def sql_type(self) -> str:
+        if self.type == "integer":
+            return "INTEGER"
+        if self.type == "number":
+            return "REAL"
+        if self.type == "boolean":
+            return "INTEGER"
+        return "TEXT"
+
+
+def _normalize_timestamp(value: Any) -> Any:
+    """Store timestamptz as UTC ISO strings so range filters compare instants, like Postgres"""
+    if not isinstance(value, str):
+        return value
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return value
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).isoformat()
+
+
+def _split_top_level(text: str, sep: str = ",") -> List[str]:
+    """Split on separators that are not nested inside parentheses or quotes"""
+    parts, depth, quoted, current = [], 0, False, ""
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        if char == sep and depth == 0 and not quoted:
+            parts.append(current)
+            current = ""
+        else:
+            current += char
+    if current:
+        parts.append(current)
+    return [part.strip() for part in parts if part.strip()]
+
+
+def parse_select(select: str) -> List[Dict[str, Any]]:
+    """Parse select=*,order_items(*,menus(name,price)) into a field tree"""
+    fields = []
+    for part in _split_top_level(select or "*"):
+        alias = None
+        if ":" in part.split("(", 1)[0]:
+            alias, part = part.split(":", 1)
+        if "(" in part and part.endswith(")"):
+            name, inner = part.split("(", 1)
+            name = name.split("!", 1)[0]
+            fields.append({"embed": name, "alias": alias or name, "select": parse_select(inner[:-1])})
+        else:
+            fields.append({"column": part, "alias": alias or part})
+    return fields
+
+
+class FakePostgrest(httpx.AsyncBaseTransport):
+    """PostgREST-compatible transport for the tables in supabase_schema.json"""
+
+    def __init__(self, db_path: str = ":memory:", schema_path: str = DEFAULT_SCHEMA_PATH,
+                 latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 table_latency_ms: Optional[Dict[str, float]] = None,
+                 error_rate: float = 0.0, error_status: int = 503,
+                 timeout_rate: float = 0.0, fail_tables: Optional[List[str]] = None,
+                 unique: Optional[Dict[str, List[Tuple[str, ...]]]] = None,
+                 seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.table_latency_ms = table_latency_ms or {}
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.timeout_rate = timeout_rate
+        self.fail_tables = set(fail_tables or [])
+        self.random = random.Random(seed)
+        self.calls: Counter = Counter()
+        self.rpc_functions: Dict[str, Callable] = dict(BUILTIN_RPCS)
+        self.rpc_state: Dict[str, Any] = {}  # tables the SQL functions keep that aren't in the schema dump
+        self._forced_failures: List[int] = []
+
+        with open(schema_path, "r", encoding="utf-8") as f:
+            schema = json.load(f)
+        self.tables: Dict[str, Dict[str, Column]] = {
+            table: {name: Column(name, props) for name, props in info["properties"].items()}
+            for table, info in schema["tables"].items()
+        }
+
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self._create_tables(unique if unique is not None else DEFAULT_UNIQUE)
+
+    # ---------- setup ----------
+
+    def _create_tables(self, unique: Dict[str, List[Tuple[str, ...]]]):
+        for table, columns in self.tables.items():
+            column_sql = []
+            for column in columns.values():
+                definition = f'"{column.name}" {column.sql_type}'
+                if column.primary_key:
+                    definition += " PRIMARY KEY"
+                column_sql.append(definition)
+            for constraint in unique.get(table, []):
+                column_sql.append("UNIQUE (" + ", ".join(f'"{c}"' for c in constraint) + ")")
+            self.conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" ({", ".join(column_sql)})')
+        self.conn.commit()
+
+    def register_rpc(self, name: str, function: Callable[["FakePostgrest", Dict[str, Any]], Any]):
+        """Expose a Python function at /rest/v1/rpc/<name>"""
+        self.rpc_functions[name] = function
+
+    def seed_rows(self, table: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Insert fixture rows directly (no latency, no error injection)"""
+        return self.insert(table, rows)
+
+    def fail_next(self, count: int = 1, status: int = 503):
+        """Force the next N requests to fail with the given status"""
+        self._forced_failures.extend([status] * count)
+
+    def reset_stats(self):
+        self.calls.clear()
+
+    # ---------- value conversion ----------
+
+    def _column(self, table: str, name: str) -> Column:
+        column = self.tables[table].get(name)
+        if column is None:
+            raise PostgrestError(400, "PGRST204",
+                                 f"Could not find the '{name}' column of '{table}' in the schema cache")
+        return column
+
+    def _to_db(self, column: Column, value: Any) -> Any:
+        if value is None:
+            return None
+        if column.is_json:
+            return value if isinstance(value, str) else json.dumps(value)
+        if column.type == "boolean":
+            return 1 if value in (True, "true", 1, "1") else 0
+        if column.type == "integer":
+            return int(value)
+        if column.type == "number":
+            return float(value)
+        if column.is_timestamp:
+            return _normalize_timestamp(value)
+        return str(value)
+
+    def _from_db(self, column: Column, value: Any) -> Any:
+        if value is None:
+            return None
+        if column.is_json:
+            try:
+                return json.loads(value)
+            except (TypeError, ValueError):
+                return value
+        if column.type == "boolean":
+            return bool(value)
+        return value
+
+    def _default(self, column: Column) -> Any:
+        if column.default == "gen_random_uuid()":
+            return str(uuid.uuid4())
+        if column.default == "now()":
+            return datetime.now(timezone.utc).isoformat()
+        return column.default
+
+    def _decode_row(self, table: str, row: sqlite3.Row) -> Dict[str, Any]:
+        columns = self.tables[table]
+        return {key: self._from_db(columns[key], row[key]) for key in row.keys()}
+
+    # ---------- filters ----------
+
+    def _parse_value_list(self, raw: str) -> List[str]:
+        inner = raw[1:-1] if raw.startswith("(") and raw.endswith(")") else raw
+        return [item.strip().strip('"') for item in _split_top_level(inner)]
+
+    def _condition(self, table: str, column_name: str, expression: str) -> Tuple[str, List[Any]]:
+        """Translate col=op.value into SQL"""
+        negate = False
+        if expression.startswith("not."):
+            negate, expression = True, expression[4:]
+        if "." not in expression:
+            raise PostgrestError(400, "PGRST100", f'"failed to parse filter ({expression})"')
+        op, raw = expression.split(".", 1)
+        if op not in FILTER_OPS:
+            raise PostgrestError(400, "PGRST100", f'"unknown filter operator ({op})"')
+        column = self.tables[table].get(column_name)
+        if column is None:
+            raise PostgrestError(400, "42703", f"column {table}.{column_name} does not exist")
+
+        quoted = f'"{column_name}"'
+        if op == "is":
+            literal = {"null": "NULL", "true": "1", "false": "0"}.get(raw.lower())
+            if literal is None:
+                raise PostgrestError(400, "PGRST100", f'"failed to parse filter (is.{raw})"')
+            sql = f"{quoted} IS NULL" if literal == "NULL" else f"{quoted} = {literal}"
+            params: List[Any] = []
+        elif op == "in":
+            values = [self._to_db(column, value) for value in self._parse_value_list(raw)]
+            sql = f"{quoted} IN ({', '.join('?' for _ in values)})" if values else "0"
+            params = values
+        elif op in ("like", "ilike"):
+            pattern = raw.replace("*", "%")
+            sql = f"LOWER({quoted}) LIKE LOWER(?)" if op == "ilike" else f"{quoted} LIKE ?"
+            params = [pattern]
+        else:
+            if len(raw) >= 2 and raw[0] == raw[-1] == '"':
+                raw = raw[1:-1]  # quoted value inside a logic tree
+            sql = f"{quoted} {FILTER_OPS[op]} ?"
+            params = [self._to_db(column, raw)]
+        return (f"NOT ({sql})", params) if negate else (sql, params)
+
+    def _logic_tree(self, table: str, operator: str, raw: str) -> Tuple[str, List[Any]]:
+        """Translate or=(a.eq.1,and(b.gt.2,c.lt.3)) into SQL"""
+        inner = raw[1:-1] if raw.startswith("(") else raw
+        clauses, params = [], []
+        for part in _split_top_level(inner):
+            if part.startswith(("and(", "or(")):
+                nested_op, nested_raw = part.split("(", 1)
+                sql, nested_params = self._logic_tree(table, nested_op, "(" + nested_raw)
+            else:
+                column_name, expression = part.split(".", 1)
+                sql, nested_params = self._condition(table, column_name, expression)
+            clauses.append(f"({sql})")
+            params.extend(nested_params)
+        joiner = " OR " if operator == "or" else " AND "
+        return joiner.join(clauses) or "1", params
+
+    def _where(self, table: str, params: List[Tuple[str, str]]) -> Tuple[str, List[Any]]:
+        clauses, values = [], []
+        for key, value in params:
+            if key in RESERVED_PARAMS or "." in key:
+                continue  # embedded-resource filters are not supported
+            if key in ("or", "and"):
+                sql, sql_params = self._logic_tree(table, key, value)
+                sql = f"({sql})"  # one conjunct, like PostgREST - AND would otherwise bind inside the OR
+            else:
+                sql, sql_params = self._condition(table, key, value)
+            clauses.append(sql)
+            values.extend(sql_params)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", values
+
+    def _order_by(self, table: str, order: Optional[str]) -> str:
+        if not order:
+            return ""
+        terms = []
+        for term in order.split(","):
+            pieces = term.strip().split(".")
+            self._column(table, pieces[0])
+            direction = "DESC" if "desc" in pieces[1:] else "ASC"
+            nulls = " NULLS FIRST" if "nullsfirst" in pieces[1:] else (
+                " NULLS LAST" if "nullslast" in pieces[1:] else "")
+            terms.append(f'"{pieces[0]}" {direction}{nulls}')
+        return " ORDER BY " + ", ".join(terms)
+
+    # ---------- data access (also used by registered RPC functions) ----------
+
+    def select(self, table: str, where: str = "", params: Optional[List[Any]] = None,
+               order: Optional[str] = None, limit: Optional[int] = None,
+               offset: Optional[int] = None) -> List[Dict[str, Any]]:
+        sql = f'SELECT * FROM "{table}"{where}{self._order_by(table, order)}'
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+            if offset:
+                sql += f" OFFSET {int(offset)}"
+        cursor = self.conn.execute(sql, params or [])
+        return [self._decode_row(table, row) for row in cursor.fetchall()]
+
+    def insert(self, table: str, rows: List[Dict[str, Any]], on_conflict: Optional[List[str]] = None,
+               resolution: Optional[str] = None) -> List[Dict[str, Any]]:
+        columns = self.tables[table]
+        inserted = []
+        try:
+            for row in rows:
+                for key in row:
+                    self._column(table, key)
+                record = {name: self._default(column) for name, column in columns.items()
+                          if column.default is not None}
+                record.update(row)
+                names = list(record)
+                column_list = ", ".join('"' + n + '"' for n in names)
+                sql = f'INSERT INTO "{table}" ({column_list}) VALUES ({", ".join("?" for _ in names)})'
+                if on_conflict and resolution:
+                    target = ", ".join(f'"{c}"' for c in on_conflict)
+                    if resolution == "ignore-duplicates":
+                        sql += f" ON CONFLICT ({target}) DO NOTHING"
+                    else:
+                        updates = [f'"{n}" = excluded."{n}"' for n in row if n not in on_conflict]
+                        if not updates:
+                            updates = [f'"{on_conflict[0]}" = excluded."{on_conflict[0]}"']
+                        sql += f" ON CONFLICT ({target}) DO UPDATE SET {', '.join(updates)}"
+                sql += " RETURNING *"
+                values = [self._to_db(columns[n], record[n]) for n in names]
+                returned = self.conn.execute(sql, values).fetchone()
+                if returned is not None:
+                    inserted.append(self._decode_row(table, returned))
+            self.conn.commit()
+        except sqlite3.IntegrityError as e:
+            self.conn.rollback()
+            raise PostgrestError(409, "23505", "duplicate key value violates unique constraint", str(e))
+        return inserted
+
+    def check_foreign_keys(self, table: str, rows: List[Dict[str, Any]]):
+        """Reject rows pointing at a missing parent like Postgres (23503); seed_rows skips this"""
+        for row in rows:
+            for name, value in row.items():
+                column = self.tables[table].get(name)
+                if value is None or column is None or column.fk is None:
+                    continue
+                parent, parent_column = column.fk
+                if parent in self.tables and not self.select(parent, f' WHERE "{parent_column}" = ?', [value], limit=1):
+                    raise PostgrestError(
+                        409, "23503", f'insert or update on table "{table}" violates foreign key constraint '
+                                      f'"{table}_{name}_fkey"',
+                        f'Key ({name})=({value}) is not present in table "{parent}".')
+
+    def update(self, table: str, values: Dict[str, Any], where: str, params: List[Any]) -> List[Dict[str, Any]]:
+        columns = self.tables[table]
+        if not values:
+            return []
+        assignments = ", ".join(f'"{self._column(table, n).name}" = ?' for n in values)
+        sql = f'UPDATE "{table}" SET {assignments}{where} RETURNING *'
+        try:
+            cursor = self.conn.execute(sql, [self._to_db(columns[n], v) for n, v in values.items()] + params)
+            rows = [self._decode_row(table, row) for row in cursor.fetchall()]
+            self.conn.commit()
+        except sqlite3.IntegrityError as e:
+            self.conn.rollback()
+            raise PostgrestError(409, "23505", "duplicate key value violates unique constraint", str(e))
+        return rows
+
+    def delete(self, table: str, where: str, params: List[Any]) -> List[Dict[str, Any]]:
+        cursor = self.conn.execute(f'DELETE FROM "{table}"{where} RETURNING *', params)
+        rows = [self._decode_row(table, row) for row in cursor.fetchall()]
+        self.conn.commit()
+        return rows
+
+    # ---------- embedding ----------
+
+    def _project(self, table: str, row: Dict[str, Any], fields: List[Dict[str, Any]]) -> Dict[str, Any]:
+        result: Dict[str, Any] = {}
+        for field in fields:
+            if "embed" in field:
+                result[field["alias"]] = self._embed(table, row, field)
+            elif field["column"] == "*":
+                result.update(row)
+            else:
+                self._column(table, field["column"])
+                result[field["alias"]] = row.get(field["column"])
+        return result
+
+    def _embed(self, parent: str, row: Dict[str, Any], field: Dict[str, Any]) -> Any:
+        child = field["embed"]
+        if child not in self.tables:
+            raise PostgrestError(400, "PGRST200",
+                                 f"Could not find a relationship between '{parent}' and '{child}'")
+        # One-to-many: child has an FK pointing at the parent (orders -> order_items)
+        for column in self.tables[child].values():
+            if column.fk and column.fk[0] == parent:
+                rows = self.select(child, f' WHERE "{column.name}" = ?', [row.get(column.fk[1])])
+                return [self._project(child, r, field["select"]) for r in rows]
+        # Many-to-one: parent has an FK pointing at the child (order_items -> menus)
+        for column in self.tables[parent].values():
+            if column.fk and column.fk[0] == child:
+                rows = self.select(child, f' WHERE "{column.fk[1]}" = ?', [row.get(column.name)], limit=1)
+                return self._project(child, rows[0], field["select"]) if rows else None
+        raise PostgrestError(400, "PGRST200",
+                             f"Could not find a relationship between '{parent}' and '{child}'")
+
+    # ---------- transport ----------
+
+    async def _simulate_network(self, table: str, request: httpx.Request) -> Optional[httpx.Response]:
+        delay = self.table_latency_ms.get(table, self.latency_ms)
+        if self.jitter_ms:
+            delay += self.random.uniform(0, self.jitter_ms)
+        if delay:
+            await asyncio.sleep(delay / 1000)
+
+        if self._forced_failures:
+            status = self._forced_failures.pop(0)
+            return PostgrestError(status, "FAKE", f"Injected failure ({status})").to_response()
+        if self.timeout_rate and self.random.random() < self.timeout_rate:
+            raise httpx.ReadTimeout("Injected timeout", request=request)
+        if table in self.fail_tables or (self.error_rate and self.random.random() < self.error_rate):
+            return PostgrestError(self.error_status, "FAKE",
+                                  f"Injected failure ({self.error_status})").to_response()
+        return None
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        path = unquote(request.url.path)
+        resource = path.split("/rest/v1/", 1)[-1].strip("/")
+        is_rpc = resource.startswith("rpc/")
+        table = resource[4:] if is_rpc else resource
+        self.calls[(request.method, table)] += 1
+
+        injected = await self._simulate_network(table, request)
+        if injected is not None:
+            return injected
+
+        try:
+            await request.aread()
+            body = json.loads(request.content) if request.content else None
+            params = list(request.url.params.multi_items())
+            if is_rpc:
+                return self._handle_rpc(table, body or {})
+            if table not in self.tables:
+                raise PostgrestError(404, "PGRST205", f"Could not find the table 'public.{table}' in the schema cache")
+            return self._handle_table(request, table, params, body)
+        except PostgrestError as e:
+            return e.to_response()
+        except (sqlite3.Error, ValueError, KeyError) as e:
+            return PostgrestError(400, "PGRST100", str(e)).to_response()
+
+    def _handle_rpc(self, name: str, body: Dict[str, Any]) -> httpx.Response:
+        function = self.rpc_functions.get(name)
+        if function is None:
+            raise PostgrestError(404, "PGRST202", f"Could not find the function public.{name} in the schema cache")
+        return httpx.Response(200, json=function(self, body))
+
+    def _handle_table(self, request: httpx.Request, table: str,
+                      params: List[Tuple[str, str]], body: Any) -> httpx.Response:
+        query = dict(params)
+        prefer = request.headers.get("prefer", "")
+        wants_rows = "return=representation" in prefer
+        fields = parse_select(query.get("select", "*"))
+        where, values = self._where(table, params)
+
+        if request.method == "GET":
+            limit = query.get("limit")
+            offset = query.get("offset")
+            rows = self.select(table, where, values, query.get("order"),
+                               int(limit) if limit is not None else None,
+                               int(offset) if offset is not None else None)
+            projected = [self._project(table, row, fields) for row in rows]
+            start = int(offset or 0)
+            content_range = f"{start}-{start + len(rows) - 1}/*" if rows else "*/*"
+            return httpx.Response(200, json=projected, headers={"Content-Range": content_range})
+
+        if request.method == "POST":
+            rows = body if isinstance(body, list) else [body or {}]
+            resolution = None
+            if "resolution=merge-duplicates" in prefer:
+                resolution = "merge-duplicates"
+            elif "resolution=ignore-duplicates" in prefer:
+                resolution = "ignore-duplicates"
+            on_conflict = query["on_conflict"].split(",") if "on_conflict" in query else None
+            if resolution and not on_conflict:
+                on_conflict = [name for name, column in self.tables[table].items() if column.primary_key]
+            self.check_foreign_keys(table, rows)
+            inserted = self.insert(table, rows, on_conflict, resolution)
+            if wants_rows:
+                return httpx.Response(201, json=[self._project(table, row, fields) for row in inserted])
+            return httpx.Response(201)
+
+        if request.method == "PATCH":
+            updated = self.update(table, body or {}, where, values)
+            if wants_rows:
+                return httpx.Response(200, json=[self._project(table, row, fields) for row in updated])
+            return httpx.Response(204)
+
+        if request.method == "DELETE":
+            deleted = self.delete(table, where, values)
+            if wants_rows:
+                return httpx.Response(200, json=[self._project(table, row, fields) for row in deleted])
+            return httpx.Response(204)
+
+        raise PostgrestError(405, "PGRST117", f"Unsupported HTTP method: {request.method}")
+
+    async def aclose(self):
+        """Keep data when the pooled client is recreated; call close() to drop the database"""
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,99 @@
+"""
+Fake RPC functions - Python mirrors of the SQL functions shipped next to performance_indexes.sql
+Registered on every FakePostgrest so /rest/v1/rpc/<name> behaves like the real database
+"""
+
+from datetime import datetime
+from typing import Any, Dict
+
+
+def resolve_customer(fake, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Mirror of resolve_customer_rpc.sql (runs without awaiting, so it is atomic like the advisory lock)"""
+    name, phone = params.get("p_name"), params.get("p_phone")
+    platform = params.get("p_platform") or "WEB"
+    platform_id = params.get("p_platform_id") or f"WEB_{phone}"
+
+    if platform != "WEB":
+        rows = fake.select("customers", ' WHERE "line_user_id" = ?', [platform_id], limit=1)
+        if rows:
+            found = rows[0]
+            if found["phone"] != phone:
+                found = fake.update("customers", {"phone": phone, "display_name": name},
+                                    ' WHERE "id" = ?', [found["id"]])[0]
+            return {**found, "created": False}
+
+    rows = fake.select("customers", ' WHERE "phone" = ?', [phone], order="created_at.asc", limit=1)
+    if rows:
+        found = rows[0]
+        current = found.get("line_user_id") or ""
+        if platform != "WEB" and current.startswith("WEB_") and len(current) < 15:
+            found = fake.update("customers", {"line_user_id": platform_id, "display_name": name},
+                                ' WHERE "id" = ?', [found["id"]])[0]
+        return {**found, "created": False}
+
+    created = fake.insert("customers", [{
+        "display_name": name, "phone": phone, "line_user_id": platform_id,
+        "platform_type": platform, "merged_from": [], "lifetime_value": 0,
+        "tags": [], "metadata": {}, "total_orders": 0, "total_spent": 0,
+    }])[0]
+    return {**created, "created": True}
+
+
+def create_order_full(fake, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Mirror of create_order_rpc.sql (customer resolve + order + items)"""
+    customer = params["p_customer"]
+    found = resolve_customer(fake, {
+        "p_name": customer.get("name"), "p_phone": customer.get("phone"),
+        "p_platform": customer.get("platform"), "p_platform_id": customer.get("platform_id"),
+    })
+
+    order_row = {key: value for key, value in params["p_order"].items() if value is not None}
+    order_row["customer_id"] = found["id"]
+    order = fake.insert("orders", [order_row])[0]
+
+    items = [{**item, "order_id": order["id"]} for item in params.get("p_items") or []]
+    fake.insert("order_items", items)
+
+    return {**order, "items_count": len(items)}
+
+
+def apply_customer_stats(fake, params: Dict[str, Any]) -> int:
+    """Mirror of customer_stats_rpc.sql (additive deltas, clamped at zero, each delta id applied once)"""
+    applied = fake.rpc_state.setdefault("applied_stat_deltas", set())
+    customers = set()
+    for delta in params.get("p_deltas") or []:
+        if delta["id"] in applied:
+            continue
+        applied.add(delta["id"])
+        rows = fake.select("customers", ' WHERE "id" = ?', [delta["customer_id"]], limit=1)
+        if not rows:
+            continue
+        row = rows[0]
+        last_order_at = max(filter(None, [row.get("last_order_at"), delta.get("last_order_at")]),
+                            key=lambda value: datetime.fromisoformat(value), default=None)
+        fake.update("customers", {
+            "total_orders": max((row.get("total_orders") or 0) + delta.get("orders", 0), 0),
+            "total_spent": max((row.get("total_spent") or 0) + delta.get("spent", 0), 0),
+            "lifetime_value": max((row.get("lifetime_value") or 0) + delta.get("lifetime_value", 0), 0),
+            "last_order_at": last_order_at,
+        }, ' WHERE "id" = ?', [row["id"]])
+        customers.add(row["id"])
+    return len(customers)
+
+
+def set_customer_stats(fake, params: Dict[str, Any]) -> int:
+    """Mirror of set_customer_stats in customer_stats_rpc.sql (UPDATE only - missing ids are skipped)"""
+    updated = 0
+    for row in params.get("p_rows") or []:
+        values = {column: row.get(column) for column in
+                  ("total_orders", "total_spent", "lifetime_value", "last_order_at")}
+        updated += len(fake.update("customers", values, ' WHERE "id" = ?', [row["id"]]))
+    return updated
+
+
+BUILTIN_RPCS = {
+    "resolve_customer": resolve_customer,
+    "create_order_full": create_order_full,
+    "apply_customer_stats": apply_customer_stats,
+    "set_customer_stats": set_customer_stats,
+}
@@ -0,0 +1,107 @@
+"""
+Benchmark harness - Run the real FastAPI app against the fake Supabase backend
+Shared by the benchmark scripts in this package
+"""
+
+import os
+import statistics
+import sys
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List
+
+import httpx
+
+# Allow `python benchmarks/<script>.py` from the chatbot-api directory
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# main.py refuses to start without credentials - the fake backend ignores them
+for _var in ("SUPABASE_SERVICE_ROLE_KEY", "SUPABASE_ANON_KEY", "LINE_CHANNEL_ACCESS_TOKEN", "LINE_CHANNEL_SECRET"):
+    os.environ.setdefault(_var, "benchmark")
+# Benchmarks and tests keep the write journal in memory instead of data/write_journal.db
+os.environ.setdefault("JOURNAL_PATH", ":memory:")
+
+from benchmarks.fake_postgrest import FakePostgrest  # noqa: E402
+from services.http_pool import init_http_pool, close_http_pool  # noqa: E402
+
+SAMPLE_CATEGORIES = [
+    {"name": "Sushi", "is_active": True},
+    {"name": "Drinks", "is_active": True},
+]
+
+SAMPLE_MENUS = [
+    ("Salmon Nigiri", 0, 60.0),
+    ("Tuna Roll", 0, 120.0),
+    ("California Roll", 0, 150.0),
+    ("Ebi Tempura", 0, 90.0),
+    ("Green Tea", 1, 30.0),
+    ("Ramune", 1, 45.0),
+]
+
+
+def seed_catalog(fake: FakePostgrest) -> List[Dict[str, Any]]:
+    """Seed categories and menus, return the menu rows"""
+    categories = fake.seed_rows("categories", SAMPLE_CATEGORIES)
+    return fake.seed_rows("menus", [
+        {"name": name, "category_id": categories[category]["id"], "price": price, "menu_code": f"M{i:03d}",
+         "is_available": True}
+        for i, (name, category, price) in enumerate(SAMPLE_MENUS)
+    ])
+
+
+def sample_order(menus: List[Dict[str, Any]], item_count: int = 3, phone: str = "0812345678") -> Dict[str, Any]:
+    """Realistic WebOrder payload with `item_count` line items"""
+    items = []
+    for i in range(item_count):
+        menu = menus[i % len(menus)]
+        items.append({"id": menu["id"], "name": menu["name"], "quantity": 1 + i % 3,
+                      "price": menu["price"], "notes": "no wasabi" if i % 4 == 0 else ""})
+    return {
+        "customer_name": "Benchmark Customer",
+        "customer_phone": phone,
+        "items": items,
+        "total_amount": sum(item["price"] * item["quantity"] for item in items),
+        "order_type": "pickup",
+        "payment_method": "cash",
+        "notes": "benchmark order",
+    }
+
+
+@asynccontextmanager
+async def fake_app(**fake_kwargs):
+    """Yield (api_client, fake) with the pooled Supabase client bound to a fresh fake"""
+    from main import app
+
+    fake = FakePostgrest(**fake_kwargs)
+    await init_http_pool(transport=fake)
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            yield client, fake
+    finally:
+        await close_http_pool()
+        fake.close()
+
+
+def summarize(samples_ms: List[float]) -> Dict[str, float]:
+    """avg/p50/p95/max of a latency sample in ms"""
+    ordered = sorted(samples_ms)
+    return {
+        "avg": statistics.mean(ordered),
+        "p50": ordered[len(ordered) // 2],
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max": ordered[-1],
+    }
+
+
+class Timer:
+    """Context manager collecting elapsed milliseconds into a list"""
+
+    def __init__(self, samples: List[float]):
+        self.samples = samples
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.samples.append((time.perf_counter() - self.start) * 1000)
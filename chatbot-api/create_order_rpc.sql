@@ -0,0 +1,60 @@
+-- 🧾 ATOMIC ORDER CREATION (create_order_full)
+-- สร้างลูกค้า + ออเดอร์ + รายการอาหาร ใน transaction เดียว (1 round trip แทน 4+N)
+-- Called by routers/orders.py via POST /rest/v1/rpc/create_order_full
+-- Any failure rolls back everything - no orphan orders or items
+-- Requires resolve_customer_rpc.sql (customer lookup/creation is shared with find_or_create_customer)
+
+-- Order numbers must be unique (the function relies on this instead of a pre-check)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_order_number_unique
+ON orders(order_number);
+
+CREATE OR REPLACE FUNCTION create_order_full(p_customer jsonb, p_order jsonb, p_items jsonb)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_customer    customers%ROWTYPE;
+    v_order       orders%ROWTYPE;
+    v_items_count integer;
+BEGIN
+    -- 1. Resolve customer (resolve_customer_rpc.sql - same rules as find_or_create_customer)
+    SELECT * INTO v_customer
+    FROM jsonb_populate_record(NULL::customers, resolve_customer(
+        p_customer->>'name', p_customer->>'phone',
+        p_customer->>'platform', p_customer->>'platform_id'));
+
+    -- 2. Order (unique index rejects a duplicate order_number with 23505)
+    INSERT INTO orders (order_number, customer_id, customer_name, customer_phone, total_amount,
+                        order_type, payment_method, payment_status, status, notes, branch_id,
+                        delivery_fee, discount_amount, net_amount, delivery_address, metadata, created_at)
+    SELECT r.order_number, v_customer.id, r.customer_name, r.customer_phone, r.total_amount,
+           r.order_type, r.payment_method, COALESCE(r.payment_status, 'unpaid'), COALESCE(r.status, 'pending'),
+           r.notes, r.branch_id, COALESCE(r.delivery_fee, 0), COALESCE(r.discount_amount, 0),
+           r.net_amount, r.delivery_address, COALESCE(r.metadata, '{}'::jsonb), COALESCE(r.created_at, now())
+    FROM jsonb_populate_record(NULL::orders, p_order) r
+    RETURNING * INTO v_order;
+
+    -- 3. Items in one statement
+    INSERT INTO order_items (order_id, menu_id, menu_name, quantity, unit_price, total_price,
+                             notes, metadata, created_at)
+    SELECT v_order.id, i.menu_id, i.menu_name, i.quantity, i.unit_price, i.total_price,
+           i.notes, COALESCE(i.metadata, '{}'::jsonb), COALESCE(i.created_at, now())
+    FROM jsonb_populate_recordset(NULL::order_items, p_items) i;
+    GET DIAGNOSTICS v_items_count = ROW_COUNT;
+
+    RETURN to_jsonb(v_order) || jsonb_build_object('items_count', v_items_count);
+END;
+$$;
+
+-- Server-side only (FastAPI uses the service role key)
+REVOKE EXECUTE ON FUNCTION create_order_full(jsonb, jsonb, jsonb) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION create_order_full(jsonb, jsonb, jsonb) TO service_role;
+
+-- Make the function visible to PostgREST immediately
+NOTIFY pgrst, 'reload schema';
+
+-- 📝 วิธีใช้:
+-- POST /rest/v1/rpc/create_order_full
+-- {"p_customer": {"name", "phone", "platform", "platform_id"},
+--  "p_order": {...orders columns...}, "p_items": [{...order_items columns...}]}
+-- Returns the created order row + items_count
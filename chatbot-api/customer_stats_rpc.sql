@@ -0,0 +1,101 @@
+-- 📊 CUSTOMER AGGREGATES (apply_customer_stats)
+-- อัปเดต total_orders / total_spent / lifetime_value / last_order_at แบบ incremental
+-- Called by the customer stats write-behind flusher (services/customer_stats.py)
+-- via POST /rest/v1/rpc/apply_customer_stats - one statement per batch of customers
+
+-- Ids of the deltas already applied. The journal replays a batch whose outcome it never saw
+-- (crash before it deleted the entries, timeout after the commit); those ids are skipped
+-- instead of counted twice. Ids only need to outlive the journal's retries - prune old ones
+CREATE TABLE IF NOT EXISTS applied_stat_deltas (
+    id         uuid PRIMARY KEY,
+    applied_at timestamptz NOT NULL DEFAULT now()
+);
+ALTER TABLE applied_stat_deltas ENABLE ROW LEVEL SECURITY;  -- service_role only
+
+CREATE INDEX IF NOT EXISTS idx_applied_stat_deltas_applied_at
+ON applied_stat_deltas(applied_at);
+
+CREATE OR REPLACE FUNCTION apply_customer_stats(p_deltas jsonb)
+RETURNS integer
+LANGUAGE sql
+AS $$
+    -- Additive deltas are applied in the UPDATE itself, so concurrent flushes
+    -- from several workers never overwrite each other's increments
+    WITH deltas AS (
+        SELECT id, customer_id, orders, spent, lifetime_value, last_order_at
+        FROM jsonb_to_recordset(p_deltas) AS d(id uuid, customer_id uuid, orders integer, spent numeric,
+                                                lifetime_value numeric, last_order_at timestamptz)
+    ), fresh AS (
+        -- Same statement as the UPDATE: the ids are recorded exactly when the deltas are applied
+        INSERT INTO applied_stat_deltas (id)
+        SELECT id FROM deltas
+        ON CONFLICT (id) DO NOTHING
+        RETURNING id
+    ), merged AS (
+        SELECT customer_id,
+               sum(orders) AS orders,
+               sum(spent) AS spent,
+               sum(lifetime_value) AS lifetime_value,
+               max(last_order_at) AS last_order_at
+        FROM deltas
+        JOIN fresh USING (id)
+        GROUP BY customer_id
+    ), updated AS (
+        UPDATE customers c
+        SET total_orders   = GREATEST(COALESCE(c.total_orders, 0) + merged.orders, 0),
+            total_spent    = GREATEST(COALESCE(c.total_spent, 0) + merged.spent, 0),
+            lifetime_value = GREATEST(COALESCE(c.lifetime_value, 0) + merged.lifetime_value, 0),
+            last_order_at  = GREATEST(c.last_order_at, merged.last_order_at),
+            updated_at     = now()
+        FROM merged
+        WHERE c.id = merged.customer_id
+        RETURNING 1
+    )
+    SELECT count(*)::integer FROM updated;
+$$;
+
+-- Server-side only (FastAPI uses the service role key)
+REVOKE EXECUTE ON FUNCTION apply_customer_stats(jsonb) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION apply_customer_stats(jsonb) TO service_role;
+
+-- Absolute totals from backfill_customer_stats.py - UPDATE only, so a customer deleted
+-- (e.g. merged away by the dedupe job) while the backfill was scanning is not recreated
+CREATE OR REPLACE FUNCTION set_customer_stats(p_rows jsonb)
+RETURNS integer
+LANGUAGE sql
+AS $$
+    WITH totals AS (
+        SELECT id, total_orders, total_spent, lifetime_value, last_order_at
+        FROM jsonb_to_recordset(p_rows) AS r(id uuid, total_orders integer, total_spent numeric,
+                                             lifetime_value numeric, last_order_at timestamptz)
+    ), updated AS (
+        UPDATE customers c
+        SET total_orders   = totals.total_orders,
+            total_spent    = totals.total_spent,
+            lifetime_value = totals.lifetime_value,
+            last_order_at  = totals.last_order_at,
+            updated_at     = now()
+        FROM totals
+        WHERE c.id = totals.id
+        RETURNING 1
+    )
+    SELECT count(*)::integer FROM updated;
+$$;
+
+-- Server-side only (FastAPI uses the service role key)
+REVOKE EXECUTE ON FUNCTION set_customer_stats(jsonb) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION set_customer_stats(jsonb) TO service_role;
+
+-- Make the function visible to PostgREST immediately
+NOTIFY pgrst, 'reload schema';
+
+-- 📝 วิธีใช้:
+-- POST /rest/v1/rpc/apply_customer_stats
+-- {"p_deltas": [{"id": "<journal entry_id>", "customer_id": "...", "orders": 1, "spent": 0,
+--                "lifetime_value": 350, "last_order_at": "..."}]}
+-- Returns the number of customers updated (0 when every id in the batch was already applied)
+-- POST /rest/v1/rpc/set_customer_stats
+-- {"p_rows": [{"id": "...", "total_orders": 3, "total_spent": 0, "lifetime_value": 900, "last_order_at": "..."}]}
+-- Prune applied ids daily (e.g. pg_cron) - anything older than the journal's retry window:
+-- DELETE FROM applied_stat_deltas WHERE applied_at < now() - interval '7 days';
+-- Existing orders: run `python backfill_customer_stats.py` once to fill the columns
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+🧹 Customer Dedupe Job
+Merges duplicate customers (same phone, or same name + platform ID) into the oldest record:
+orders are moved to the survivor, totals are added up and the duplicates are listed in merged_from
+
+Streams the table page by page, so it can run against 100k+ customers; stop it at any time
+and run it again to continue from the checkpoint. The API still has merged-away customers in
+its identity cache; an order for one of them fails the customers FK once and is resolved again,
+so POST /api/cache/invalidate?table=customers afterwards only saves those extra round trips.
+
+Customer totals: the job flushes this host's stats journal before each merge, but a delta
+applied to a duplicate by another API host after that is lost with the duplicate. Run it
+while no orders come in, or run backfill_customer_stats.py afterwards.
+
+Usage:
+    python dedupe_customers.py --dry-run
+    python dedupe_customers.py --page-size 1000 --checkpoint customer_dedupe.checkpoint.json
+    python dedupe_customers.py --reset
+"""
+
+import argparse
+import asyncio
+import os
+
+from services.customer_dedupe import CustomerDedupeJob
+from services.http_pool import close_http_pool
+from services.logger import setup_logging, shutdown_logging
+
+
+async def run(args) -> dict:
+    job = CustomerDedupeJob(page_size=args.page_size, write_chunk=args.write_chunk,
+                            checkpoint_path=args.checkpoint, dry_run=args.dry_run)
+    if not args.dry_run:
+        job.load_checkpoint()
+    try:
+        return await job.run(max_pages=args.max_pages)
+    finally:
+        await close_http_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge duplicate customers (resumable)")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--write-chunk", type=int, default=100, help="ids per customer read / delete request")
+    parser.add_argument("--checkpoint", default="customer_dedupe.checkpoint.json")
+    parser.add_argument("--max-pages", type=int, default=None, help="stop after N pages (resume later)")
+    parser.add_argument("--dry-run", action="store_true", help="count duplicates without writing anything")
+    parser.add_argument("--reset", action="store_true", help="ignore the checkpoint and start over")
+    args = parser.parse_args()
+
+    if args.reset and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    setup_logging()
+    try:
+        stats = asyncio.run(run(args))
+    finally:
+        shutdown_logging()
+
+    print("🧹 CUSTOMER DEDUPE")
+    print("=" * 50)
+    for key, value in stats.items():
+        print(f"   {key}: {value}")
+    if stats["done"] and not args.dry_run:
+        print("✅ Finished - delete the checkpoint or use --reset before the next full run")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,30 +5,68 @@ Main application with extracted routers for better maintainability
 """
 
 import uvicorn
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
 # Import configuration and validation
-from modules.config import validate_config, SUPABASE_URL, LINE_CHANNEL_SECRET
+from modules.config import validate_config, SUPABASE_URL, LINE_CHANNEL_SECRET, SUPABASE_FAKE, SUPABASE_FAKE_LATENCY_MS
 
 # Import modular routers
-from routers import orders, webhooks, admin, health, static
+from routers import orders, menu, webhooks, admin, health, static
+from services.http_pool import init_http_pool, close_http_pool
+from services.customer_stats import customer_stats  # noqa: F401 - registers its journal handler
+from services.write_journal import write_journal
+from services.job_queue import job_queue
+from services.order_events import order_events
+from services.order_tracking import order_tracker
+from services.logger import get_logger, setup_logging, shutdown_logging
+from services.json_codec import FastJSONResponse
 
 # Load environment variables
 load_dotenv()
-print("🔧 Loading .env file...")
+
+# Log records are written by a background thread (LOG_LEVEL / LOG_FORMAT / LOG_SAMPLING)
+setup_logging()
+logger = get_logger("main")
 
 # Validate configuration
 if not validate_config():
-    print("❌ Configuration validation failed!")
+    logger.critical("❌ Configuration validation failed!")
+    shutdown_logging()
     exit(1)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open shared resources on startup and release them on shutdown"""
+    setup_logging()
+    transport = None
+    if SUPABASE_FAKE:
+        # Offline benchmarking: answer Supabase REST calls from local SQLite
+        from benchmarks.fake_postgrest import FakePostgrest
+        transport = FakePostgrest(SUPABASE_FAKE, latency_ms=SUPABASE_FAKE_LATENCY_MS)
+        logger.info("🧪 Using fake Supabase backend: %s (%sms latency)", SUPABASE_FAKE, SUPABASE_FAKE_LATENCY_MS)
+    await init_http_pool(transport=transport)
+    write_journal.start()
+    job_queue.start()
+    yield
+    order_events.close()  # end open SSE streams so shutdown doesn't wait on them
+    order_tracker.close()  # and the order tracking WebSockets
+    await job_queue.stop()  # unfinished jobs stay queued for the next start
+    await write_journal.stop()  # try to drain journaled writes before the pool closes
+    await close_http_pool()
+    job_queue.close()
+    write_journal.close()
+    shutdown_logging()  # flush queued records
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Tenzai Chatbot API v2.1", 
     version="2.1.0",
-    description="Modular restaurant chatbot API with order management"
+    description="Modular restaurant chatbot API with order management",
+    default_response_class=FastJSONResponse,  # orjson encoding when installed
+    lifespan=lifespan
 )
 
 # CORS for web app (including ngrok domains)
@@ -45,17 +83,18 @@ app.add_middleware(
 app.include_router(health.router)
 app.include_router(static.router)
 app.include_router(orders.router)
+app.include_router(menu.router)
 app.include_router(webhooks.router)
 app.include_router(admin.router)
 
-print("🚀 Tenzai Chatbot API v2.1 initialized with modular structure!")
-print(f"📊 Routers loaded: health, static, orders, webhooks, admin")
+logger.info("🚀 Tenzai Chatbot API v2.1 initialized with modular structure!")
+logger.info("📊 Routers loaded: health, static, orders, menu, webhooks, admin")
 
 # Server startup
 if __name__ == "__main__":
-    print("🚀 Starting Tenzai Chatbot API v2.1...")
-    print(f"🌐 Supabase: {SUPABASE_URL}")
-    print(f"🔗 LINE Channel Secret: {'✅' if LINE_CHANNEL_SECRET else '❌'}")
+    logger.info("🚀 Starting Tenzai Chatbot API v2.1...")
+    logger.info("🌐 Supabase: %s", SUPABASE_URL)
+    logger.info("🔗 LINE Channel Secret: %s", "✅" if LINE_CHANNEL_SECRET else "❌")
     
     # Run on standard port 8000
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -18,6 +18,146 @@ STAFF_LINE_ID = os.getenv("STAFF_LINE_ID", "")  # Staff LINE user ID for notific
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "")
 PORT = int(os.getenv("PORT", 8000))
 
+
+def parse_table_map(raw: str, cast=float) -> dict:
+    """Parse "table=value,table2=value" env strings into a dict"""
+    result = {}
+    for pair in raw.split(","):
+        if "=" not in pair:
+            continue
+        table, value = pair.split("=", 1)
+        try:
+            result[table.strip()] = cast(value.strip())
+        except ValueError:
+            print(f"⚠️ Ignoring invalid table setting: {pair}")
+    return result
+
+
+# Supabase HTTP connection pool (one shared client per worker)
+SUPABASE_HTTP2 = os.getenv("SUPABASE_HTTP2", "false").lower() == "true"
+SUPABASE_MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", 20))
+SUPABASE_MAX_KEEPALIVE = int(os.getenv("SUPABASE_MAX_KEEPALIVE", 10))
+SUPABASE_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY", 30))
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", 30))
+SUPABASE_CONNECT_TIMEOUT = float(os.getenv("SUPABASE_CONNECT_TIMEOUT", 5))
+# Per-table read timeouts in seconds, e.g. "menus=5,orders=15"
+SUPABASE_TABLE_TIMEOUTS = parse_table_map(
+    os.getenv("SUPABASE_TABLE_TIMEOUTS", "menus=5,categories=5,settings=5")
+)
+
+# Retries (idempotent requests only) with jittered exponential backoff
+SUPABASE_RETRY_ATTEMPTS = int(os.getenv("SUPABASE_RETRY_ATTEMPTS", 2))
+SUPABASE_RETRY_BASE_DELAY = float(os.getenv("SUPABASE_RETRY_BASE_DELAY", 0.2))
+SUPABASE_RETRY_MAX_DELAY = float(os.getenv("SUPABASE_RETRY_MAX_DELAY", 2.0))
+# Per-table circuit breaker: open after N consecutive failures, probe again after reset
+SUPABASE_BREAKER_THRESHOLD = int(os.getenv("SUPABASE_BREAKER_THRESHOLD", 5))
+SUPABASE_BREAKER_RESET_SECONDS = float(os.getenv("SUPABASE_BREAKER_RESET_SECONDS", 30))
+
+# Share one in-flight request between identical concurrent GETs
+SUPABASE_COALESCE_GETS = os.getenv("SUPABASE_COALESCE_GETS", "true").lower() == "true"
+
+# Read-through cache for GETs, TTL in seconds per table (tables not listed are not cached)
+# Writes through supabase_request invalidate the table; writes made elsewhere expire by TTL
+SUPABASE_CACHE_ENABLED = os.getenv("SUPABASE_CACHE_ENABLED", "true").lower() == "true"
+SUPABASE_CACHE_MAX_ENTRIES = int(os.getenv("SUPABASE_CACHE_MAX_ENTRIES", 512))
+SUPABASE_CACHE_TTLS = parse_table_map(
+    os.getenv("SUPABASE_CACHE_TTLS", "menus=300,categories=300,settings=300")
+)
+
+# Customer identity cache (phone / platform ID -> customer id) for find_or_create_customer
+# TTL bounds staleness for customer edits made outside the API; 0 disables
+CUSTOMER_CACHE_TTL = float(os.getenv("CUSTOMER_CACHE_TTL", 600))
+CUSTOMER_CACHE_MAX_ENTRIES = int(os.getenv("CUSTOMER_CACHE_MAX_ENTRIES", 5000))
+
+# Idempotency-Key on POST /api/orders/create: results kept per process for TTL seconds
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", 86400))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", 10000))
+
+# GET /api/menu snapshot (services/menu_catalog.py): rebuilt when menus/categories are written
+# through the API or /api/cache/invalidate, and at least every TTL seconds for edits made elsewhere
+MENU_CATALOG_TTL = float(os.getenv("MENU_CATALOG_TTL", 300))
+
+# Fallback chunk size when a bulk (array) insert fails
+SUPABASE_BULK_CHUNK_SIZE = int(os.getenv("SUPABASE_BULK_CHUNK_SIZE", 5))
+
+# Create orders through the create_order_full RPC (create_order_rpc.sql) in one round trip
+# Falls back to the multi-call path automatically if the function is not installed
+ORDER_CREATE_RPC = os.getenv("ORDER_CREATE_RPC", "true").lower() == "true"
+
+# Order numbers (services/order_numbers.py): 0-1023, unique per worker process
+# Unset = random per process; the unique index on orders.order_number catches the rare clash
+ORDER_NUMBER_NODE_ID = int(os.getenv("ORDER_NUMBER_NODE_ID")) if os.getenv("ORDER_NUMBER_NODE_ID") else None
+
+# Resolve/create customers through the resolve_customer RPC (resolve_customer_rpc.sql) in one
+# race-free round trip; false = legacy find-then-create path (also used if not installed)
+CUSTOMER_RESOLVE_RPC = os.getenv("CUSTOMER_RESOLVE_RPC", "true").lower() == "true"
+
+# Customer aggregates (services/customer_stats.py): order create/complete/cancel deltas are
+# journaled and written every FLUSH_INTERVAL seconds or once BATCH_SIZE deltas are pending,
+# through the apply_customer_stats RPC (customer_stats_rpc.sql) when installed
+CUSTOMER_STATS_ENABLED = os.getenv("CUSTOMER_STATS_ENABLED", "true").lower() == "true"
+CUSTOMER_STATS_FLUSH_INTERVAL = float(os.getenv("CUSTOMER_STATS_FLUSH_INTERVAL", 5))
+CUSTOMER_STATS_BATCH_SIZE = int(os.getenv("CUSTOMER_STATS_BATCH_SIZE", 200))
+CUSTOMER_STATS_RPC = os.getenv("CUSTOMER_STATS_RPC", "true").lower() == "true"
+
+# Write journal (services/write_journal.py): audit rows, conversation logs and customer stat
+# deltas are appended to a local SQLite file and flushed to Supabase in batches with retries.
+# One file per host is fine (workers claim batches); ":memory:" keeps the batching but not durability
+# SYNC=FULL also survives power loss, at the cost of an fsync per append
+JOURNAL_PATH = os.getenv("JOURNAL_PATH", "data/write_journal.db")
+JOURNAL_SYNC = os.getenv("JOURNAL_SYNC", "NORMAL").upper()
+JOURNAL_FLUSH_INTERVAL = float(os.getenv("JOURNAL_FLUSH_INTERVAL", 2))
+JOURNAL_BATCH_SIZE = int(os.getenv("JOURNAL_BATCH_SIZE", 200))
+# Failed batches retry with jittered exponential backoff, then stay in the file as dead letters
+JOURNAL_MAX_ATTEMPTS = int(os.getenv("JOURNAL_MAX_ATTEMPTS", 10))
+JOURNAL_RETRY_BASE_DELAY = float(os.getenv("JOURNAL_RETRY_BASE_DELAY", 1))
+JOURNAL_RETRY_MAX_DELAY = float(os.getenv("JOURNAL_RETRY_MAX_DELAY", 300))
+
+# Background jobs (services/job_queue.py) - order confirmations and staff notifications
+# Stored in SQLite next to the write journal by default; per-type concurrency, e.g.
+# "order_confirmation=4,staff_notification=2"; failed jobs back off, then become dead letters
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", JOURNAL_PATH)
+JOB_QUEUE_SYNC = os.getenv("JOB_QUEUE_SYNC", JOURNAL_SYNC).upper()
+JOB_QUEUE_POLL_INTERVAL = float(os.getenv("JOB_QUEUE_POLL_INTERVAL", 1))
+JOB_CONCURRENCY = parse_table_map(os.getenv("JOB_CONCURRENCY", ""), int)
+JOB_DEFAULT_CONCURRENCY = int(os.getenv("JOB_DEFAULT_CONCURRENCY", 4))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 8))
+JOB_RETRY_BASE_DELAY = float(os.getenv("JOB_RETRY_BASE_DELAY", 2))
+JOB_RETRY_MAX_DELAY = float(os.getenv("JOB_RETRY_MAX_DELAY", 600))
+
+# Order change feed (GET /api/orders/changes): rows stamped in the last SETTLE seconds are held back,
+# so a transaction that stamped updated_at earlier but commits later can't land behind a handed-out
+# cursor. Must exceed the longest order-writing transaction plus app/database clock skew
+ORDER_CHANGES_SETTLE = float(os.getenv("ORDER_CHANGES_SETTLE", 5))
+
+# Order events (services/order_events.py) - SSE stream for the staff dashboard, per worker process
+# Reconnecting clients resume from the last REPLAY_SIZE events; a client more than CLIENT_BACKLOG
+# events behind is disconnected (it reconnects and replays); heartbeats keep proxies from timing out
+ORDER_EVENTS_REPLAY_SIZE = int(os.getenv("ORDER_EVENTS_REPLAY_SIZE", 1000))
+ORDER_EVENTS_CLIENT_BACKLOG = int(os.getenv("ORDER_EVENTS_CLIENT_BACKLOG", 100))
+ORDER_EVENTS_HEARTBEAT = float(os.getenv("ORDER_EVENTS_HEARTBEAT", 15))
+# Order tracking WebSocket (order-status.html): open connections allowed per order number
+ORDER_TRACKING_MAX_PER_ORDER = int(os.getenv("ORDER_TRACKING_MAX_PER_ORDER", 10))
+
+# Order status ETags (services/order_versions.py): a conditional GET /api/orders/{order_number} is
+# answered from a local version map kept current by this process's order events; after TTL seconds
+# an entry is re-checked with a one-row read (bounds staleness from writes made by other workers)
+ORDER_VERSION_TTL = float(os.getenv("ORDER_VERSION_TTL", 60))
+ORDER_VERSION_MAX_ENTRIES = int(os.getenv("ORDER_VERSION_MAX_ENTRIES", 5000))
+
+# Logging (services/logger.py): level, "text" or "json" lines, bounded queue to the writer thread
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+# Keep only a fraction of DEBUG/INFO records per module, e.g. "services.database_service=0.1"
+# Warnings and errors are never sampled out
+LOG_SAMPLING = parse_table_map(os.getenv("LOG_SAMPLING", ""))
+
+# Offline mode: serve Supabase REST from the in-process SQLite fake (benchmarks only)
+# Value is the SQLite path, e.g. ":memory:" or "bench.db"
+SUPABASE_FAKE = os.getenv("SUPABASE_FAKE", "")
+SUPABASE_FAKE_LATENCY_MS = float(os.getenv("SUPABASE_FAKE_LATENCY_MS", 0))
+
 # FAQ Responses
 FAQ_RESPONSES = {
     "hours": "🕙 เปิดให้บริการทุกวัน 10:00-21:00 น.\n📋 รับออเดอร์ล่าสุด 20:30 น.",
@@ -0,0 +1,27 @@
+-- 🔁 ORDER CHANGE FEED (GET /api/orders/changes)
+-- updated_at ต้องขยับทุกครั้งที่ออเดอร์เปลี่ยน ไม่ว่าจะเขียนจากที่ไหน (API, RPC, SQL editor)
+-- The staff dashboard polls "orders with (updated_at, id) past my cursor" - a row whose
+-- updated_at didn't move would never reach it
+
+-- clock_timestamp(), not now(): stamps the row write rather than the transaction start, which keeps
+-- the stamp-to-commit delay short. It does not make commit order match updated_at order - a row can
+-- still commit after a later-stamped one - so the API only reads rows older than ORDER_CHANGES_SETTLE
+-- seconds (keep it above the longest order transaction, e.g. create_order_full, plus clock skew)
+CREATE OR REPLACE FUNCTION touch_orders_updated_at()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    NEW.updated_at := clock_timestamp();
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS orders_touch_updated_at ON orders;
+CREATE TRIGGER orders_touch_updated_at
+BEFORE INSERT OR UPDATE ON orders
+FOR EACH ROW EXECUTE FUNCTION touch_orders_updated_at();
+
+-- Keyset scan of the feed: WHERE (updated_at, id) > (cursor) ORDER BY updated_at, id
+CREATE INDEX IF NOT EXISTS idx_orders_updated_id
+ON orders(updated_at, id);
@@ -19,6 +19,10 @@ WHERE status IN ('pending','confirmed','preparing');
 -- Daily queries: use created_at index with date range
 -- Example: WHERE created_at >= '2025-08-23'::date AND created_at < '2025-08-24'::date
 
+-- Staff dashboard day view: date range + keyset pages ordered by (created_at, id) desc
+CREATE INDEX IF NOT EXISTS idx_orders_created_id 
+ON orders(created_at, id);
+
 -- Payment transactions
 CREATE INDEX IF NOT EXISTS idx_payments_order 
 ON payment_transactions(order_id);
@@ -33,6 +37,10 @@ ON customers(line_user_id);
 CREATE INDEX IF NOT EXISTS idx_customers_phone 
 ON customers(phone);
 
+-- Keyset pagination for the dedupe job (dedupe_customers.py)
+CREATE INDEX IF NOT EXISTS idx_customers_created_id 
+ON customers(created_at, id);
+
 -- Order Status History (สำหรับ audit trail)
 CREATE INDEX IF NOT EXISTS idx_order_history_order 
 ON order_status_history(order_id);
@@ -60,4 +68,5 @@ ANALYZE; -- Update statistics
 -- Daily orders: WHERE created_at >= CURRENT_DATE AND created_at < CURRENT_DATE + INTERVAL '1 day'
 -- Specific date: WHERE created_at >= '2025-08-23'::date AND created_at < '2025-08-24'::date
 -- Status filter: WHERE status = 'pending' (uses idx_orders_status)
+-- Active orders: WHERE status IN ('pending','confirmed','preparing') (uses idx_orders_pending)
 -- Customer orders: WHERE customer_id = 'uuid' (uses idx_orders_customer)
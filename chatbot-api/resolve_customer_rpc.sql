@@ -0,0 +1,72 @@
+-- 👤 CUSTOMER RESOLUTION (resolve_customer)
+-- หา/สร้างลูกค้าใน 1 round trip (แทน GET platform -> GET phone -> POST -> GET)
+-- Called by find_or_create_customer via POST /rest/v1/rpc/resolve_customer
+-- Run this before create_order_rpc.sql (create_order_full resolves customers through it)
+
+CREATE OR REPLACE FUNCTION resolve_customer(p_name text, p_phone text,
+                                            p_platform text DEFAULT 'WEB',
+                                            p_platform_id text DEFAULT NULL)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_platform    text := COALESCE(p_platform, 'WEB');
+    v_platform_id text := COALESCE(p_platform_id, 'WEB_' || p_phone);
+    v_customer    customers%ROWTYPE;
+    v_created     boolean := false;
+BEGIN
+    -- Serialize resolution per phone / platform ID across every connection and worker.
+    -- customers.phone has historical duplicates, so a unique index can't enforce this yet;
+    -- the transaction-scoped lock makes concurrent first orders from one phone create one row.
+    -- Phone is always locked first, so two callers can't deadlock on the pair.
+    PERFORM pg_advisory_xact_lock(hashtext('customer:phone:' || p_phone));
+    IF v_platform <> 'WEB' THEN
+        PERFORM pg_advisory_xact_lock(hashtext('customer:platform:' || v_platform_id));
+    END IF;
+
+    -- 1. LINE/FB/IG: platform ID first, refresh the phone if it changed
+    IF v_platform <> 'WEB' THEN
+        SELECT * INTO v_customer FROM customers WHERE line_user_id = v_platform_id LIMIT 1;
+        IF FOUND AND v_customer.phone IS DISTINCT FROM p_phone THEN
+            UPDATE customers SET phone = p_phone, display_name = p_name, updated_at = now()
+            WHERE id = v_customer.id
+            RETURNING * INTO v_customer;
+        END IF;
+    END IF;
+
+    -- 2. Phone (universal key), upgrading a generic WEB_ platform ID
+    IF v_customer.id IS NULL THEN
+        SELECT * INTO v_customer FROM customers WHERE phone = p_phone ORDER BY created_at LIMIT 1;
+        IF FOUND AND v_platform <> 'WEB'
+           AND v_customer.line_user_id LIKE 'WEB\_%' AND length(v_customer.line_user_id) < 15 THEN
+            UPDATE customers SET line_user_id = v_platform_id, display_name = p_name, updated_at = now()
+            WHERE id = v_customer.id
+            RETURNING * INTO v_customer;
+        END IF;
+    END IF;
+
+    -- 3. New customer
+    IF v_customer.id IS NULL THEN
+        INSERT INTO customers (display_name, phone, line_user_id, platform_type, merged_from,
+                               lifetime_value, tags, metadata, total_orders, total_spent)
+        VALUES (p_name, p_phone, v_platform_id, v_platform, '[]'::jsonb,
+                0, '[]'::jsonb, '{}'::jsonb, 0, 0)
+        RETURNING * INTO v_customer;
+        v_created := true;
+    END IF;
+
+    RETURN to_jsonb(v_customer) || jsonb_build_object('created', v_created);
+END;
+$$;
+
+-- Server-side only (FastAPI uses the service role key)
+REVOKE EXECUTE ON FUNCTION resolve_customer(text, text, text, text) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION resolve_customer(text, text, text, text) TO service_role;
+
+-- Make the function visible to PostgREST immediately
+NOTIFY pgrst, 'reload schema';
+
+-- 📝 วิธีใช้:
+-- POST /rest/v1/rpc/resolve_customer
+-- {"p_name": "...", "p_phone": "08...", "p_platform": "LINE", "p_platform_id": "LINE_U..."}
+-- Returns the customer row + created (true when a new customer was inserted)
@@ -8,8 +8,15 @@ from datetime import datetime
 from fastapi import APIRouter, Request, HTTPException
 
 from services.database_service import supabase_request
+from services.query_cache import query_cache
+from services.customer_cache import customer_cache
+from services.job_queue import job_queue
+from services.write_journal import write_journal
+from services.logger import get_logger
+from services.json_codec import read_json
 
 router = APIRouter(prefix="/api", tags=["admin"])
+logger = get_logger(__name__)
 
 @router.get("/schema/inspect")
 async def inspect_database_schema():
@@ -21,7 +28,7 @@ async def inspect_database_schema():
         
         for table_name in tables:
             try:
-                print(f"📋 Inspecting table: {table_name}")
+                logger.info("📋 Inspecting table: %s", table_name)
                 # Get sample data to see column structure
                 data = await supabase_request("GET", f"{table_name}?limit=1", use_service_key=False)
                 
@@ -41,7 +48,7 @@ async def inspect_database_schema():
                     }
                     
             except Exception as e:
-                print(f"❌ Error inspecting {table_name}: {e}")
+                logger.error("❌ Error inspecting %s: %s", table_name, e)
                 schemas[table_name] = {
                     "error": str(e),
                     "accessible": False
@@ -55,7 +62,7 @@ async def inspect_database_schema():
         }
         
     except Exception as e:
-        print(f"❌ Schema inspection error: {e}")
+        logger.error("❌ Schema inspection error: %s", e)
         return {
             "status": "error", 
             "error": str(e),
@@ -71,7 +78,7 @@ async def get_sample_data():
         
         for table in tables:
             try:
-                print(f"📊 Getting sample from {table}...")
+                logger.info("📊 Getting sample from %s...", table)
                 # Get first row to see structure
                 data = await supabase_request("GET", f"{table}?limit=1", use_service_key=False)
                 samples[table] = {
@@ -80,7 +87,7 @@ async def get_sample_data():
                     'row_count': len(data)
                 }
             except Exception as e:
-                print(f"❌ Error accessing {table}: {e}")
+                logger.error("❌ Error accessing %s: %s", table, e)
                 samples[table] = {
                     'error': str(e),
                     'accessible': False
@@ -93,7 +100,7 @@ async def get_sample_data():
         }
         
     except Exception as e:
-        print(f"❌ Sample data error: {e}")
+        logger.error("❌ Sample data error: %s", e)
         return {
             "status": "error",
             "error": str(e),
@@ -104,7 +111,7 @@ async def get_sample_data():
 async def create_staff_notification(request: Request):
     """Create staff notification record"""
     try:
-        data = await request.json()
+        data = await read_json(request)
         
         notification_data = {
             "order_number": data.get("order_number"),
@@ -122,5 +129,64 @@ async def create_staff_notification(request: Request):
         }
         
     except Exception as e:
-        print(f"❌ Error creating staff notification: {e}")
-        raise HTTPException(status_code=500, detail="Failed to create staff notification")
\ No newline at end of file
+        logger.error("❌ Error creating staff notification: %s", e)
+        raise HTTPException(status_code=500, detail="Failed to create staff notification")
+
+@router.post("/cache/invalidate")
+async def invalidate_cache(table: str = None):
+    """Flush cached reads after edits made outside the API (e.g. menu dashboard)"""
+    if table:
+        removed = query_cache.invalidate_table(table)
+    else:
+        removed = query_cache.get_stats()["entries"]
+        query_cache.clear()
+    if table in (None, "customers"):
+        removed += customer_cache.clear()
+    
+    logger.info("🧹 Cache invalidated: %s (%s entries)", table or 'all tables', removed)
+    return {
+        "success": True,
+        "table": table or "all",
+        "removed_entries": removed
+    }
+
+@router.get("/jobs")
+async def job_queue_stats():
+    """Background job queue: depth, dead letters and wait/run latency per job type"""
+    return {
+        "success": True,
+        "jobs": job_queue.get_stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@router.get("/jobs/dead")
+async def dead_jobs(limit: int = 50):
+    """Jobs that used up their retries (newest first) - ids, errors and order numbers, never payloads"""
+    return {
+        "success": True,
+        "jobs": job_queue.dead_letters(min(max(limit, 1), 500))
+    }
+
+@router.post("/jobs/{job_id}/retry")
+async def retry_dead_job(job_id: str):
+    """Queue a dead job again with a fresh attempt budget"""
+    if not job_queue.retry(job_id):
+        raise HTTPException(status_code=404, detail="Dead job not found")
+    logger.info("🔁 Dead job %s queued again", job_id)
+    return {"success": True, "job_id": job_id}
+
+@router.get("/journal/dead")
+async def dead_journal_entries(kind: str = None, limit: int = 50):
+    """Journaled writes the database rejected or that used up their retries (newest first, no payloads)"""
+    return {
+        "success": True,
+        "entries": write_journal.dead_letters(min(max(limit, 1), 500), kind)
+    }
+
+@router.post("/journal/{seq}/retry")
+async def retry_dead_journal_entry(seq: int):
+    """Queue a dead journal entry again with a fresh attempt budget"""
+    if not write_journal.retry(seq):
+        raise HTTPException(status_code=404, detail="Dead journal entry not found")
+    logger.info("🔁 Dead journal entry %s queued again", seq)
+    return {"success": True, "seq": seq}
\ No newline at end of file
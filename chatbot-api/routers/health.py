@@ -7,6 +7,21 @@ Extracted from main.py for better modularity
 from datetime import datetime
 from fastapi import APIRouter
 
+from services.http_pool import get_pool_stats
+from services.request_coalescer import supabase_coalescer
+from services.query_cache import query_cache
+from services.customer_cache import customer_cache
+from services.idempotency import idempotency_store
+from services.menu_catalog import menu_catalog
+from services.metrics import get_metrics
+from services.resilience import get_resilience_stats
+from services.logger import get_logging_stats
+from services.customer_stats import customer_stats
+from services.write_journal import write_journal
+from services.order_events import order_events
+from services.order_tracking import order_tracker
+from services.order_versions import order_versions
+
 router = APIRouter(tags=["health"])
 
 @router.get("/health")
@@ -16,4 +31,97 @@ async def health_check():
         "status": "ok", 
         "service": "Tenzai Chatbot API", 
         "timestamp": datetime.now().isoformat()
+    }
+
+@router.get("/health/pool")
+async def pool_stats():
+    """Supabase HTTP connection pool usage"""
+    return {
+        "status": "ok",
+        "pool": get_pool_stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@router.get("/health/coalescing")
+async def coalescing_stats():
+    """Single-flight GET coalescing counters (joins = saved Supabase round trips)"""
+    return {
+        "status": "ok",
+        "coalescing": supabase_coalescer.get_stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@router.get("/health/cache")
+async def cache_stats():
+    """Read-through query cache, customer identity cache, menu snapshot, order ETags and idempotency store counters"""
+    return {
+        "status": "ok",
+        "cache": query_cache.get_stats(),
+        "customer_identity": customer_cache.get_stats(),
+        "menu_catalog": menu_catalog.get_stats(),
+        "order_versions": order_versions.get_stats(),
+        "idempotency": idempotency_store.get_stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@router.get("/health/metrics")
+async def latency_metrics():
+    """Recorded latencies (e.g. order_items.insert by item-count bucket)"""
+    return {
+        "status": "ok",
+        "metrics": get_metrics(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@router.get("/health/breakers")
+async def breaker_stats():
+    """Supabase retry counters and per-table circuit breaker state"""
+    stats = get_resilience_stats()
+    open_tables = [name for name, b in stats["breakers"].items() if b["state"] != "closed"]
+    return {
+        "status": "degraded" if open_tables else "ok",
+        "open_circuits": open_tables,
+        **stats,
+        "timestamp": datetime.now().isoformat()
+    }
+
+@router.get("/health/customer-stats")
+async def customer_stats_health():
+    """Customer aggregate write-behind: journaled deltas, flushes, dropped batches"""
+    stats = customer_stats.get_stats()
+    return {
+        "status": "degraded" if stats["dropped"] else "ok",
+        "customer_stats": stats,
+        "timestamp": datetime.now().isoformat()
+    }
+
+@router.get("/health/journal")
+async def journal_health():
+    """Write journal: pending and dead-letter entries per kind, flush/retry counters"""
+    stats = write_journal.get_stats()
+    dead = sum(counts["dead"] for counts in stats["kinds"].values())
+    return {
+        "status": "degraded" if dead or stats["append_errors"] else "ok",
+        "journal": stats,
+        "timestamp": datetime.now().isoformat()
+    }
+
+@router.get("/health/events")
+async def events_health():
+    """Order event stream (dashboards) and order tracking WebSockets (customers)"""
+    return {
+        "status": "ok",
+        "events": order_events.get_stats(),
+        "tracking": order_tracker.get_stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@router.get("/health/logging")
+async def logging_stats():
+    """Log queue depth, dropped and sampled-out record counts"""
+    stats = get_logging_stats()
+    return {
+        "status": "degraded" if stats["dropped"] else "ok",
+        "logging": stats,
+        "timestamp": datetime.now().isoformat()
     }
\ No newline at end of file
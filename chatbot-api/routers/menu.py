@@ -0,0 +1,48 @@
+"""
+Menu Router
+Serves the customer web app's catalog from the in-memory snapshot
+"""
+
+from fastapi import APIRouter, HTTPException, Request, Response
+
+from services.menu_catalog import menu_catalog
+from services.logger import get_logger
+
+router = APIRouter(prefix="/api", tags=["menu"])
+logger = get_logger(__name__)
+
+# Browsers keep the body and revalidate every load - an unchanged menu costs one 304
+CACHE_CONTROL = "public, no-cache"
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "").lower() not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+@router.get("/menu")
+async def get_menu(request: Request):
+    """Active categories and available menus (strong ETag, 304 on If-None-Match, gzip precompressed)"""
+    try:
+        snapshot = await menu_catalog.get()
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("❌ Error loading menu catalog: %s", e)
+        raise HTTPException(status_code=500, detail="Failed to load menu")
+
+    gzipped = _accepts_gzip(request.headers.get("accept-encoding", ""))
+    headers = {
+        "ETag": snapshot.gzip_etag if gzipped else snapshot.etag,
+        "Cache-Control": CACHE_CONTROL,
+        "Vary": "Accept-Encoding",
+    }
+    if snapshot.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    if gzipped:
+        headers["Content-Encoding"] = "gzip"
+        return Response(snapshot.gzip_body, media_type="application/json", headers=headers)
+    return Response(snapshot.body, media_type="application/json", headers=headers)
@@ -4,165 +4,252 @@ Handles all order-related endpoints (CRUD operations)
 Extracted from main.py for better modularity
 """
 
-import json
-import uuid
-import traceback
-from datetime import datetime
-from typing import Dict, List, Optional, Any
-from fastapi import APIRouter, Request, HTTPException, BackgroundTasks
+import asyncio
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+from typing import Dict, List, Optional, Any, Tuple
+from fastapi import APIRouter, Request, Response, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from pytz import timezone
 
-from services.database_service import supabase_request, find_or_create_customer
-from services.notification_service import send_order_confirmation, send_staff_notification
+from modules.config import ORDER_CREATE_RPC, ORDER_CHANGES_SETTLE
+from schemas.order_schemas import OrderCreate, OrderItemCreate
+from services.database_service import (
+    supabase_request, find_or_create_customer, bulk_insert, generate_platform_id, is_missing_customer
+)
+from services.customer_cache import customer_cache
+from services.metrics import timed, count_bucket
+from services.query_builder import template, encode_cursor, decode_cursor
+from services.customer_stats import customer_stats
+from services.order_status import change_order_status, status_timeline, ORDER_STATUSES, ACTIVE_STATUSES
+from services.order_numbers import order_numbers, is_order_number_conflict
+from services.idempotency import idempotency_store, request_fingerprint, validate_key
+from services.notification_service import queue_order_notifications
+from services.order_events import order_events
+from services.order_tracking import order_tracker, status_message, Watcher
+from services.order_versions import order_versions, order_etag, etag_matches
 from services.ai_service import get_ai_response
+from services.logger import get_logger
+from services.json_codec import read_json, dumps
 
 router = APIRouter(prefix="/api/orders", tags=["orders"])
+logger = get_logger(__name__)
 
+# create_order_full RPC (create_order_rpc.sql) - switched off automatically if not installed
+order_rpc = {"enabled": ORDER_CREATE_RPC}
 
-@router.post("/create")
-async def create_order(request: Request, background_tasks: BackgroundTasks):
-    """Create a new order from WebOrder form"""
+# Inserts with a fresh order number after a unique-index clash (practically never needed)
+ORDER_NUMBER_ATTEMPTS = 3
+
+# Staff dashboard pages through a busy day with next_cursor, then polls the change feed
+TODAY_PAGE_SIZE = 100
+CHANGES_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 500
+# Tracking page revalidates every poll; unchanged orders cost a 304 from the version map
+ORDER_STATUS_CACHE_CONTROL = "private, no-cache"
+# Change feed only reads rows stamped more than settle_seconds ago (see ORDER_CHANGES_SETTLE)
+changes_feed = {"settle_seconds": ORDER_CHANGES_SETTLE}
+# Change feed position before any order exists
+FEED_START = {"updated_at": "1970-01-01T00:00:00+00:00", "id": "00000000-0000-0000-0000-000000000000"}
+
+
+def _build_order_row(data: OrderCreate, order_number: str, customer_id: Optional[str], now: datetime) -> Dict:
+    """orders insert payload (include all required fields from V2 schema)"""
+    return {
+        "order_number": order_number,
+        "customer_id": customer_id,
+        "customer_name": data.customer_name,
+        "customer_phone": data.customer_phone,
+        "total_amount": data.total_amount,
+        "order_type": data.order_type,
+        "payment_method": data.payment_method,
+        "payment_status": "unpaid",
+        "status": "pending",
+        "notes": data.notes or "",
+        "branch_id": None,  # V2 field - nullable
+        "delivery_fee": 0.00,  # V2 field - default 0
+        "discount_amount": 0.00,  # V2 field - default 0
+        "net_amount": data.total_amount,  # V2 field
+        "delivery_address": None,  # V2 field - nullable
+        "metadata": {},  # V2 field - empty object
+        "created_at": now.isoformat()  # Already in Thailand timezone (+07:00)
+    }
+
+
+def _build_item_rows(items: List[OrderItemCreate], order_id: Optional[str], now: datetime) -> List[Dict]:
+    """order_items insert payloads"""
+    created_at = now.isoformat()  # Already in Thailand timezone (+07:00)
+    return [{
+        "order_id": order_id,
+        "menu_id": item.id,
+        "menu_name": item.name,
+        "quantity": item.quantity,
+        "unit_price": item.price,
+        "total_price": item.price * item.quantity,
+        "notes": item.notes or "",
+        "metadata": {},  # V2 field
+        "created_at": created_at  # V2 field
+    } for item in items]
+
+
+def _parse_order(body: bytes) -> OrderCreate:
+    """Validate the raw body in one pass (pydantic-core parses the JSON itself)"""
     try:
-        # Parse JSON data with proper error handling
+        return OrderCreate.model_validate_json(body)
+    except ValidationError as e:
+        # Same shape as FastAPI's own 422s: [{"loc": [...], "msg": ..., "type": ...}]
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False,
+                                                             include_input=False))
+
+
+async def _create_order_rpc(data: OrderCreate, now: datetime) -> Optional[Dict]:
+    """Customer, order and items in one transaction; None means use the multi-call path"""
+    payload = {
+        "p_customer": {
+            "name": data.customer_name,
+            "phone": data.customer_phone,
+            "platform": "WEB",
+            "platform_id": generate_platform_id("WEB", data.customer_phone)
+        },
+        "p_items": _build_item_rows(data.items, None, now)
+    }
+    
+    for attempt in range(ORDER_NUMBER_ATTEMPTS):
+        payload["p_order"] = _build_order_row(data, order_numbers.next(), None, now)
         try:
-            data = await request.json()
-        except json.JSONDecodeError as e:
-            raise HTTPException(status_code=400, detail="Invalid JSON format")
-        except Exception as e:
-            raise HTTPException(status_code=400, detail="Failed to parse request data")
-            
-        print(f"📝 Creating order with data: {json.dumps(data, indent=2, ensure_ascii=False)}")
-        
-        # Validate required fields
-        required_fields = ["customer_name", "customer_phone", "items", "total_amount", "order_type"]
-        for field in required_fields:
-            if field not in data:
-                raise HTTPException(status_code=400, detail=f"Missing required field: {field}")
-        
-        # Validate field values
-        if not data["customer_name"].strip():
-            raise HTTPException(status_code=400, detail="Customer name cannot be empty")
-        
-        if not data["customer_phone"].strip() or len(data["customer_phone"]) < 10:
-            raise HTTPException(status_code=400, detail="Invalid phone number format")
+            with timed("orders.create", "rpc"):
+                order = await supabase_request("POST", "rpc/create_order_full", payload)
+            break
+        except HTTPException as e:
+            # Only an error *response* proves the transaction rolled back; on a timeout or
+            # dropped connection it may have committed, so retrying could duplicate the order
+            if e.status_code != 500 or not str(e.detail).startswith("Database error:"):
+                raise
+            if is_order_number_conflict(e) and attempt + 1 < ORDER_NUMBER_ATTEMPTS:
+                logger.warning("⚠️ Order number %s already taken, retrying (attempt %d)",
+                               payload["p_order"]["order_number"], attempt + 1)
+                continue
+            if "PGRST202" in str(e.detail):
+                order_rpc["enabled"] = False
+                logger.warning("⚠️ create_order_full not installed - using multi-call order path")
+            else:
+                logger.warning("⚠️ create_order_full failed, falling back to multi-call path: %s", e.detail)
+            return None
+    
+    logger.info("✅ Order created via RPC: %s (%s items)", order['order_number'], order.get('items_count'))
+    return order
+
+
+async def _create_order_multi_call(data: OrderCreate, now: datetime) -> Dict:
+    """Legacy path: customer lookup, order insert, items insert"""
+    with timed("orders.create", "multi"):
+        resolve_customer = lambda: find_or_create_customer(
+            name=data.customer_name,
+            phone=data.customer_phone,
+            platform="WEB",
+            platform_user_id=data.customer_phone
+        )
+        customer_id = await resolve_customer()
+        re_resolved = False
+        
+        # Create order - the generator never repeats a number, so no existence check;
+        # the unique index on order_number rejects the impossible case and we draw again
+        for attempt in range(ORDER_NUMBER_ATTEMPTS):
+            order_data = _build_order_row(data, order_numbers.next(), customer_id, now)
+            logger.debug("🚀 Attempting to create order with data: %s", order_data)
+            try:
+                created_orders = await supabase_request("POST", "orders", order_data)
+                if not created_orders or len(created_orders) == 0:
+                    logger.error("❌ Supabase returned empty result for order creation")
+                    raise HTTPException(status_code=500, detail="Database failed to create order")
+                break
+            except HTTPException as e:
+                if is_order_number_conflict(e) and attempt + 1 < ORDER_NUMBER_ATTEMPTS:
+                    logger.warning("⚠️ Order number %s already taken, retrying (attempt %d)",
+                                   order_data["order_number"], attempt + 1)
+                    continue
+                if is_missing_customer(e) and not re_resolved and attempt + 1 < ORDER_NUMBER_ATTEMPTS:
+                    # Cached id of a customer deleted since - forget it and look the customer up again
+                    logger.warning("⚠️ Customer %s no longer exists, resolving again", customer_id)
+                    customer_cache.invalidate(customer_id)
+                    customer_id = await resolve_customer()
+                    re_resolved = True
+                    continue
+                logger.error("❌ Order creation failed: %s", e.detail)
+                # Return the actual error instead of generic message
+                raise e
+            except Exception as e:
+                logger.exception("❌ Unexpected error during order creation: %s", e)
+                raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
         
-        if not data["items"]:
-            raise HTTPException(status_code=400, detail="Order must contain at least one item")
+        order = created_orders[0]
+        logger.info("✅ Order record created in database: %s", order.get('id', 'Unknown ID'))
         
-        if float(data["total_amount"]) <= 0:
-            raise HTTPException(status_code=400, detail="Total amount must be positive")
+        # Create order items (one array insert instead of one round trip per item)
+        items_data = _build_item_rows(data.items, order["id"], now)
+        with timed("order_items.insert", count_bucket(len(items_data))):
+            await bulk_insert("order_items", items_data)
         
-        if data["order_type"] not in ["pickup", "delivery"]:
-            raise HTTPException(status_code=400, detail="Order type must be 'pickup' or 'delivery'")
+        return order
+
+
+@router.post("/create")
+async def create_order(request: Request, response: Response):
+    """Create a new order from WebOrder form
+
+    With an Idempotency-Key header, a retry of the same request never creates a second order
+    (or sends a second notification): it waits for the first attempt or gets its stored response.
+    """
+    key = request.headers.get("Idempotency-Key")
+    if key is None:
+        return await _create_order(request)
+    
+    key = validate_key(key)
+    fingerprint = request_fingerprint(await request.body())
+    result, replayed = await idempotency_store.run(
+        f"orders.create:{key}", fingerprint, lambda: _create_order(request))
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+        logger.info("♻️ Replayed order response for Idempotency-Key %s", key)
+    return result
+
+async def _create_order(request: Request) -> Dict:
+    try:
+        # OrderCreate is the contract: malformed JSON, missing fields and bad values all
+        # come back as a 422 naming the exact field (e.g. ["items", 0, "quantity"])
+        data = _parse_order(await request.body())
+        logger.debug("📝 Creating order with data: %s", data)
         
         # Create or find customer
-        customer_id = await find_or_create_customer(
-            name=data["customer_name"],
-            phone=data["customer_phone"],
-            platform="WEB",
-            platform_user_id=data["customer_phone"]
-        )
-        
-        # Generate unique order number with retry logic
         thailand_tz = timezone('Asia/Bangkok')
         now = datetime.now(thailand_tz)
         
-        # Generate unique order number (retry if duplicate)
-        for attempt in range(3):
-            order_number = f"T{now.strftime('%m%d')}{str(uuid.uuid4())[:8].upper()}"
-            
-            # Check if order number already exists
-            existing = await supabase_request("GET", f"orders?order_number=eq.{order_number}")
-            if not existing or len(existing) == 0:
-                break
-            
-            print(f"⚠️ Order number {order_number} already exists, retrying... (attempt {attempt + 1})")
-        else:
-            # If all retries failed, use timestamp
-            order_number = f"T{now.strftime('%m%d%H%M%S')}"
-        
-        # Prepare order data (include all required fields from V2 schema)
-        order_data = {
-            "order_number": order_number,
-            "customer_id": customer_id,
-            "customer_name": data["customer_name"],
-            "customer_phone": data["customer_phone"],
-            "total_amount": float(data["total_amount"]),
-            "order_type": data["order_type"],
-            "payment_method": data.get("payment_method", "cash"),
-            "payment_status": "unpaid",
-            "status": "pending",
-            "notes": data.get("notes", ""),
-            "branch_id": None,  # V2 field - nullable
-            "delivery_fee": 0.00,  # V2 field - default 0
-            "discount_amount": 0.00,  # V2 field - default 0
-            "net_amount": float(data["total_amount"]),  # V2 field
-            "delivery_address": None,  # V2 field - nullable
-            "metadata": {},  # V2 field - empty object
-            "created_at": now.isoformat()  # Already in Thailand timezone (+07:00)
-        }
-        
-        # Create order
-        print(f"🚀 Attempting to create order with data: {order_data}")
-        try:
-            created_orders = await supabase_request("POST", "orders", order_data)
-            if not created_orders or len(created_orders) == 0:
-                print(f"❌ Supabase returned empty result for order creation")
-                raise HTTPException(status_code=500, detail="Database failed to create order")
-        except HTTPException as e:
-            print(f"❌ Order creation failed: {e.detail}")
-            # Return the actual error instead of generic message
-            raise e
-        except Exception as e:
-            print(f"❌ Unexpected error during order creation: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
-        
-        order = created_orders[0]
-        print(f"✅ Order record created in database: {order.get('id', 'Unknown ID')}")
-        
-        # Create order items
-        total_calculated = 0
-        for item in data["items"]:
-            item_data = {
-                "order_id": order["id"],
-                "menu_id": item.get("id"),
-                "menu_name": item["name"],
-                "quantity": item["quantity"],
-                "unit_price": float(item["price"]),
-                "total_price": float(item["price"]) * item["quantity"],
-                "notes": item.get("notes", ""),
-                "metadata": {},  # V2 field
-                "created_at": now.isoformat()  # Already in Thailand timezone (+07:00)  # V2 field
-            }
-            total_calculated += item_data["total_price"]
-            
-            await supabase_request("POST", "order_items", item_data)
+        # One round trip via create_order_full when installed, else the multi-call path
+        order = None
+        if order_rpc["enabled"]:
+            order = await _create_order_rpc(data, now)
+        if order is None:
+            order = await _create_order_multi_call(data, now)
+        order_number = order["order_number"]
+        customer_stats.record_order_created(order)  # written behind, in batches
+        order_events.publish("order_created", order)  # open staff dashboards see it immediately
         
         # Verify total amount
-        if abs(total_calculated - float(data["total_amount"])) > 0.01:
-            print(f"⚠️ Total amount mismatch: calculated {total_calculated}, provided {data['total_amount']}")
+        total_calculated = sum(item.price * item.quantity for item in data.items)
+        if abs(total_calculated - data.total_amount) > 0.01:
+            logger.warning("⚠️ Total amount mismatch: calculated %s, provided %s", total_calculated, data.total_amount)
         
-        print(f"✅ Order created successfully: {order_number}")
+        logger.info("✅ Order created successfully: %s", order_number)
         
-        # Send notifications in background
-        background_tasks.add_task(
-            send_order_confirmation,
+        # Notifications are durable jobs (they survive restarts and are retried on failure)
+        queue_order_notifications(
             order_number,
-            data["customer_phone"],  # customer_phone
-            data["customer_name"],   # customer_name
+            data.customer_name,
+            data.customer_phone,
             "WEB",                   # platform
-            data["customer_phone"],  # platform_user_id
-            float(data["total_amount"]),  # total_amount
-            len(data["items"]),      # items_count
-            data["items"]            # items_list
-        )
-        background_tasks.add_task(
-            send_staff_notification,
-            order_number,
-            data["customer_name"],
-            data["customer_phone"],
-            float(data["total_amount"]),
-            data["items"]
+            data.customer_phone,     # platform_user_id
+            data.total_amount,
+            [item.model_dump() for item in data.items]  # plain item dicts
         )
         
         return {
@@ -177,89 +264,162 @@ async def create_order(request: Request, background_tasks: BackgroundTasks):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Error creating order: {e}")
+        logger.error("❌ Error creating order: %s", e)
         raise HTTPException(status_code=500, detail="Failed to create order")
 
 @router.get("/today")
-async def get_today_orders_legacy():
+async def get_today_orders_legacy(status: Optional[str] = None, cursor: Optional[str] = None,
+                                  limit: int = TODAY_PAGE_SIZE, date: Optional[str] = None):
     """Legacy endpoint for Staff Dashboard compatibility"""
-    return await get_today_orders()
+    return await get_today_orders(status, cursor, limit, date)
+
+def _business_day(date: Optional[str], thailand_tz) -> Tuple[datetime, datetime]:
+    """[midnight, next midnight) of a Bangkok calendar day (today when no date is given)"""
+    if date:
+        try:
+            day = datetime.strptime(date, "%Y-%m-%d").date()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="date must be YYYY-MM-DD")
+    else:
+        day = datetime.now(thailand_tz).date()
+    start = thailand_tz.localize(datetime.combine(day, dt_time.min))
+    end = thailand_tz.localize(datetime.combine(day + timedelta(days=1), dt_time.min))
+    return start, end
+
+def _parse_statuses(status: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """'active' (idx_orders_pending) or a comma-separated list of statuses"""
+    if not status:
+        return None
+    if status == "active":
+        return ACTIVE_STATUSES
+    statuses = tuple(dict.fromkeys(s.strip() for s in status.split(",") if s.strip()))
+    unknown = [s for s in statuses if s not in ORDER_STATUSES]
+    if unknown or not statuses:
+        raise HTTPException(status_code=400, detail=f"Invalid status. Must be 'active' or any of: {list(ORDER_STATUSES)}")
+    return statuses
 
 @router.get("/status/today")
-async def get_today_orders():
-    """Get today's orders for staff dashboard"""
+async def get_today_orders(status: Optional[str] = None, cursor: Optional[str] = None,
+                           limit: int = TODAY_PAGE_SIZE, date: Optional[str] = None):
+    """Orders of one Bangkok business day for the staff dashboard, newest first, keyset paginated"""
+    thailand_tz = timezone('Asia/Bangkok')
+    start, end = _business_day(date, thailand_tz)
+    statuses = _parse_statuses(status)
+    limit = min(max(limit, 1), MAX_PAGE_SIZE)
     try:
-        print("📊 Getting today's orders...")
-        
-        # Get Thailand timezone
-        thailand_tz = timezone('Asia/Bangkok')
-        thailand_now = datetime.now(thailand_tz)
-        today_str = thailand_now.strftime('%Y-%m-%d')
-        
-        print(f"🕒 Thailand time: {thailand_now}")
-        print(f"📅 Looking for orders on: {today_str}")
-        
-        # Query all orders to debug (use service key to read orders)
-        all_orders = await supabase_request("GET", "orders?select=*&order=created_at.desc&limit=100", use_service_key=True)
-        
-        # Show ALL orders for debugging (remove date filter temporarily)
-        today_orders = all_orders[:20]  # Show first 20 orders
-        
-        print(f"📈 Found {len(today_orders)} orders today out of {len(all_orders)} total orders")
-        
-        return {
-            "success": True,
-            "orders": today_orders,
-            "date": today_str,
-            "thailand_time": thailand_now.isoformat(),
-            "total_count": len(today_orders),
-            "debug_info": {
-                "total_orders_found": len(all_orders),
-                "sample_dates": [order.get("created_at", "")[:10] for order in all_orders[:5] if order.get("created_at")],
-                "looking_for_date": today_str,
-                "timezone": "Asia/Bangkok (+07:00)"
-            }
-        }
-        
+        after = decode_cursor(cursor, 2) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    try:
+        # One extra row tells whether another page exists
+        rows = await template("orders_between", start.isoformat(), end.isoformat(), limit + 1, statuses, after).fetch()
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ Error getting today's orders: {e}")
+        logger.error("❌ Error getting today's orders: %s", e)
         raise HTTPException(status_code=500, detail="Failed to get today's orders")
 
+    orders = rows[:limit]
+    has_more = len(rows) > limit
+    logger.debug("📈 %d orders on %s (statuses=%s, more=%s)", len(orders), start.date(), statuses, has_more)
+    return {
+        "success": True,
+        "orders": orders,
+        "date": start.strftime('%Y-%m-%d'),
+        "thailand_time": datetime.now(thailand_tz).isoformat(),
+        "total_count": len(orders),
+        "has_more": has_more,
+        "next_cursor": encode_cursor(orders[-1], "created_at", "id") if has_more else None
+    }
+
+@router.get("/changes")
+async def get_order_changes(response: Response, since: Optional[str] = None, limit: int = CHANGES_PAGE_SIZE):
+    """Orders created or updated after the `since` cursor, oldest change first; without `since` just the current cursor"""
+    response.headers["Cache-Control"] = "no-store"
+    # Commit order isn't updated_at order: a row stamped T1 can commit after one stamped T2 > T1.
+    # Cursors never pass the settle horizon, so every row behind a cursor had committed when it was read
+    horizon = (datetime.now(dt_timezone.utc) - timedelta(seconds=changes_feed["settle_seconds"])).isoformat()
+    limit = min(max(limit, 1), MAX_PAGE_SIZE)
+    try:
+        after = decode_cursor(since, 2) if since else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    try:
+        if after is None:
+            latest = await template("latest_order_change", horizon).first()
+            return {
+                "success": True,
+                "orders": [],
+                "has_more": False,
+                "next_cursor": encode_cursor(latest or FEED_START, "updated_at", "id")
+            }
+        rows = await template("orders_changed_since", after, horizon, limit + 1).fetch()
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("❌ Error getting order changes: %s", e)
+        raise HTTPException(status_code=500, detail="Failed to get order changes")
+
+    orders = rows[:limit]
+    return {
+        "success": True,
+        "orders": orders,
+        "has_more": len(rows) > limit,
+        # Nothing changed: the client keeps polling from where it is
+        "next_cursor": encode_cursor(orders[-1], "updated_at", "id") if orders else since
+    }
+
+@router.get("/events")
+async def stream_order_events(request: Request, last_event_id: Optional[str] = None):
+    """Server-Sent Events: order_created / order_status_changed, resumable with Last-Event-ID"""
+    # Browsers send the header on reconnect; the query parameter lets a reloaded page resume too
+    subscriber = order_events.subscribe(request.headers.get("last-event-id") or last_event_id)
+    return StreamingResponse(
+        order_events.stream(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}  # no proxy buffering
+    )
+
 @router.get("/{order_number}")
-async def get_order_status(order_number: str):
-    """Get order status for tracking page"""
-    print(f"🔍 Starting get_order_status for: {order_number}")
-    
+async def get_order_status(order_number: str, request: Request, response: Response):
+    """Get order status for tracking page (strong ETag, 304 on If-None-Match)"""
     # Prevent conflict with /today endpoint
     if order_number.lower() == "today":
         raise HTTPException(status_code=400, detail="Invalid order number")
     
     try:
-        print(f"🔍 Getting status for order: {order_number}")
+        # Conditional poll: answered from the version map (or a one-row read) - no join, no body
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            etag = await order_versions.current(order_number)
+            if etag is not None and etag_matches(if_none_match, etag):
+                order_versions.stats["not_modified"] += 1
+                return Response(status_code=304, headers={"ETag": etag, "Cache-Control": ORDER_STATUS_CACHE_CONTROL})
         
         # Query order with customer and items (use service key for order lookup)
-        order_query = f"orders?order_number=eq.{order_number}&select=*,order_items(*,menus(name,price))&limit=1"
-        orders = await supabase_request("GET", order_query, use_service_key=True)
-        
-        print(f"🔍 Orders result: {orders}")
-        print(f"🔍 Orders type: {type(orders)}")
-        print(f"🔍 Orders length: {len(orders) if orders else 'None'}")
+        orders = await template("order_status", order_number).fetch()
         
         if not orders or len(orders) == 0:
+            order_versions.forget(order_number)
             raise HTTPException(status_code=404, detail="Order not found")
         
         order = orders[0]
-        print(f"🔍 Order data: {order}")
+        etag = order_etag(order)
+        order_versions.remember(order_number, etag)
+        order_versions.stats["full_responses"] += 1
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = ORDER_STATUS_CACHE_CONTROL
         
         # Safely get order_items
         order_items = order.get("order_items", []) if order else []
-        print(f"🔍 Order items: {order_items}")
+        logger.debug("🔍 Order %s: status=%s, %d item(s)", order_number, order.get("status"), len(order_items))
         
         # Transform items data for frontend
         transformed_items = []
         if order_items:
             for item in order_items:
-                print(f"🔍 Processing item: {item}")
                 # Handle both nested menus object and direct menu_name
                 menu_data = item.get("menus") if item else None
                 if menu_data and isinstance(menu_data, dict):
@@ -277,13 +437,6 @@ async def get_order_status(order_number: str):
         
         # Create status timeline
         current_status = order.get("status", "pending") if order else "pending"
-        status_timeline = [
-            {"status": "pending", "text": "รับออเดอร์แล้ว", "completed": True},
-            {"status": "confirmed", "text": "ยืนยันออเดอร์", "completed": current_status in ["confirmed", "preparing", "ready", "completed"]},
-            {"status": "preparing", "text": "กำลังเตรียมอาหาร", "completed": current_status in ["preparing", "ready", "completed"]},
-            {"status": "ready", "text": "เตรียมเสร็จแล้ว", "completed": current_status in ["ready", "completed"]},
-            {"status": "completed", "text": "เสร็จสิ้น", "completed": current_status == "completed"}
-        ]
         
         return {
             "order_number": order.get("order_number", "Unknown") if order else "Unknown",
@@ -295,37 +448,75 @@ async def get_order_status(order_number: str):
             "order_type": order.get("order_type", "pickup") if order else "pickup",
             "created_at": order.get("created_at", "") if order else "",
             "items": transformed_items,
-            "status_history": status_timeline,
+            "status_history": status_timeline(current_status),
             "notes": order.get("notes", "") if order else ""
         }
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Error getting order status: {e}")
-        import traceback
-        print(f"❌ Full traceback: {traceback.format_exc()}")
+        logger.exception("❌ Error getting order status: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to get order status: {str(e)}")
 
+async def _push_updates(websocket: WebSocket, watcher: Watcher):
+    while True:
+        message = await watcher.next()
+        if message is None:
+            await websocket.close(code=1001)  # server shutting down - the page reconnects
+            return
+        await websocket.send_text(message)
+
+@router.websocket("/{order_number}/track")
+async def track_order(websocket: WebSocket, order_number: str):
+    """Push one order's status changes to order-status.html (instead of it polling GET /{order_number})"""
+    await websocket.accept()
+    watcher = order_tracker.register(order_number)
+    if watcher is None:
+        await websocket.close(code=1013)  # try again later - the page keeps polling meanwhile
+        return
+    try:
+        # Current state first, so a change between the page's GET and this connect isn't missed
+        try:
+            order = await template("order_tracking", order_number).first()
+        except Exception as e:
+            logger.error("❌ Error loading order %s for tracking: %s", order_number, e)
+            await websocket.close(code=1011)
+            return
+        if order is None:
+            await websocket.close(code=4404)
+            return
+        await websocket.send_text(dumps(status_message(order)).decode("utf-8"))
+
+        sender = asyncio.create_task(_push_updates(websocket, watcher))
+        try:
+            while True:
+                await websocket.receive_text()  # nothing is expected from the page; raises on disconnect
+        except WebSocketDisconnect:
+            pass
+        finally:
+            sender.cancel()
+            await asyncio.gather(sender, return_exceptions=True)
+    finally:
+        order_tracker.unregister(order_number, watcher)
+
 @router.patch("/{order_number}/status")
 async def update_order_status(order_number: str, request: Request):
     """Update order status (for staff dashboard)"""
     try:
-        data = await request.json()
+        data = await read_json(request)
         new_status = data.get("status")
         
         if not new_status:
             raise HTTPException(status_code=400, detail="Status is required")
         
-        valid_statuses = ["pending", "confirmed", "preparing", "ready", "completed", "cancelled"]
-        if new_status not in valid_statuses:
-            raise HTTPException(status_code=400, detail=f"Invalid status. Must be one of: {valid_statuses}")
+        if new_status not in ORDER_STATUSES:
+            raise HTTPException(status_code=400, detail=f"Invalid status. Must be one of: {list(ORDER_STATUSES)}")
         
         # Update order status
-        update_data = {"status": new_status}
-        result = await supabase_request("PATCH", f"orders?order_number=eq.{order_number}", update_data)
+        if await change_order_status(order_number, new_status) is None:
+            raise HTTPException(status_code=404, detail="Order not found")
         
-        print(f"✅ Updated order {order_number} status to {new_status}")
+        logger.info("✅ Updated order %s status to %s", order_number, new_status)
         
         return {
             "success": True,
@@ -337,5 +528,5 @@ async def update_order_status(order_number: str, request: Request):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Error updating order status: {e}")
+        logger.error("❌ Error updating order status: %s", e)
         raise HTTPException(status_code=500, detail="Failed to update order status")
\ No newline at end of file
@@ -4,15 +4,18 @@ Handles LINE webhook events and other platform webhooks
 Extracted from main.py for better modularity
 """
 
-import json
 from fastapi import APIRouter, Request, HTTPException, BackgroundTasks
 
 from modules.config import FAQ_RESPONSES
-from services.database_service import supabase_request
+from services.order_status import change_order_status
+from services.write_journal import write_journal
 from services.line_service import send_line_message, verify_line_signature
 from services.ai_service import get_ai_response, classify_intent
+from services.logger import get_logger
+from services.json_codec import loads, JSONDecodeError
 
 router = APIRouter(prefix="/webhook", tags=["webhooks"])
+logger = get_logger(__name__)
 
 @router.post("/line")
 async def line_webhook(request: Request, background_tasks: BackgroundTasks):
@@ -27,17 +30,17 @@ async def line_webhook(request: Request, background_tasks: BackgroundTasks):
         
         # Verify signature
         if not verify_line_signature(body, signature):
-            print("❌ Invalid LINE signature")
+            logger.error("❌ Invalid LINE signature")
             raise HTTPException(status_code=401, detail="Invalid signature")
         
         # Parse events
         try:
-            webhook_data = json.loads(body.decode('utf-8'))
-        except json.JSONDecodeError:
+            webhook_data = loads(body)
+        except JSONDecodeError:
             raise HTTPException(status_code=400, detail="Invalid JSON")
         
         events = webhook_data.get("events", [])
-        print(f"📨 LINE webhook: {len(events)} events")
+        logger.info("📨 LINE webhook: %s events", len(events))
         
         # Process each event
         for event in events:
@@ -47,7 +50,7 @@ async def line_webhook(request: Request, background_tasks: BackgroundTasks):
                 user_id = event["source"]["userId"]
                 postback_data = event["postback"]["data"]
                 
-                print(f"📞 Postback from {user_id}: {postback_data}")
+                logger.info("📞 Postback from %s: %s", user_id, postback_data)
                 
                 # Parse postback data (action=accept_order&order=T123456)
                 if "action=accept_order" in postback_data:
@@ -55,34 +58,32 @@ async def line_webhook(request: Request, background_tasks: BackgroundTasks):
                     if order_number:
                         # Update order status to confirmed
                         try:
-                            update_data = {"status": "confirmed"}
-                            await supabase_request("PATCH", f"orders?order_number=eq.{order_number}", update_data)
+                            await change_order_status(order_number, "confirmed")
                             
                             reply_message = {
                                 "type": "text",
                                 "text": f"✅ รับออเดอร์ #{order_number} แล้ว!\nสถานะ: ยืนยันออเดอร์"
                             }
                             await send_line_message(reply_token, [reply_message])
-                            print(f"✅ Order {order_number} accepted by staff")
+                            logger.info("✅ Order %s accepted by staff", order_number)
                         except Exception as e:
-                            print(f"❌ Error accepting order: {e}")
+                            logger.error("❌ Error accepting order: %s", e)
                 
                 elif "action=reject_order" in postback_data:
                     order_number = postback_data.split("order=")[1] if "order=" in postback_data else ""
                     if order_number:
                         # Update order status to cancelled
                         try:
-                            update_data = {"status": "cancelled"}
-                            await supabase_request("PATCH", f"orders?order_number=eq.{order_number}", update_data)
+                            await change_order_status(order_number, "cancelled")
                             
                             reply_message = {
                                 "type": "text",
                                 "text": f"❌ ปฏิเสธออเดอร์ #{order_number}\nสถานะ: ยกเลิกออเดอร์"
                             }
                             await send_line_message(reply_token, [reply_message])
-                            print(f"❌ Order {order_number} rejected by staff")
+                            logger.info("❌ Order %s rejected by staff", order_number)
                         except Exception as e:
-                            print(f"❌ Error rejecting order: {e}")
+                            logger.error("❌ Error rejecting order: %s", e)
             
             elif event["type"] == "message" and event["message"]["type"] == "text":
                 # Handle text message
@@ -90,11 +91,11 @@ async def line_webhook(request: Request, background_tasks: BackgroundTasks):
                 user_id = event["source"]["userId"]
                 message_text = event["message"]["text"]
                 
-                print(f"💬 Message from {user_id}: {message_text}")
+                logger.debug("💬 Message from %s: %s", user_id, message_text)
                 
                 # Classify intent and respond (matching original behavior)
                 intent = classify_intent(message_text)
-                print(f"🎯 Intent classified as: {intent}")
+                logger.debug("🎯 Intent classified as: %s", intent)
                 
                 response_text = ""
                 messages = []
@@ -159,26 +160,26 @@ async def line_webhook(request: Request, background_tasks: BackgroundTasks):
                 # Send reply
                 success = await send_line_message(reply_token, messages)
                 if success:
-                    print(f"✅ Replied to {user_id}")
+                    logger.debug("✅ Replied to %s", user_id)
                     
-                    # Log conversation (matching original behavior)
+                    # Log conversation (journaled - written to Supabase in the background)
                     try:
                         conversation_data = {
                             "line_user_id": f"LINE_{user_id}",
                             "message_text": message_text,
                             "response_text": response_text or "ปุ่มและข้อความ"
                         }
-                        await supabase_request("POST", "conversations", conversation_data)
-                        print(f"📝 Logged conversation for LINE_{user_id}")
+                        write_journal.insert("conversations", conversation_data)
+                        logger.debug("📝 Logged conversation for LINE_%s", user_id)
                     except Exception as e:
-                        print(f"⚠️ Failed to log conversation: {e}")
+                        logger.warning("⚠️ Failed to log conversation: %s", e)
                 else:
-                    print(f"❌ Failed to reply to {user_id}")
+                    logger.error("❌ Failed to reply to %s", user_id)
         
         return {"status": "ok", "processed_events": len(events)}
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Webhook error: {e}")
+        logger.error("❌ Webhook error: %s", e)
         raise HTTPException(status_code=500, detail="Webhook processing failed")
\ No newline at end of file
@@ -4,11 +4,13 @@ Order-related Pydantic schemas for request/response validation
 
 from datetime import datetime
 from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class OrderItemCreate(BaseModel):
     """Schema for creating order items"""
+    model_config = ConfigDict(str_strip_whitespace=True)
+
     id: Optional[str] = None
     name: str = Field(..., min_length=1, max_length=200)
     quantity: int = Field(..., ge=1, le=99)
@@ -23,19 +25,24 @@ class CustomerInfo(BaseModel):
 
 
 class OrderCreate(BaseModel):
-    """Schema for creating new orders"""
+    """Schema for creating new orders (POST /api/orders/create request body)
+
+    Unknown fields (platform, platform_user_id, per-item totals from the web app) are ignored.
+    """
+    model_config = ConfigDict(str_strip_whitespace=True)
+
     customer_name: str = Field(..., min_length=1, max_length=100)
     customer_phone: str = Field(..., min_length=10, max_length=15)
-    items: List[OrderItemCreate] = Field(..., min_items=1)
-    total_amount: float = Field(..., ge=0)
-    order_type: str = Field(..., regex="^(pickup|delivery)$")
-    payment_method: Optional[str] = Field("cash", regex="^(cash|card|qr|bank_transfer)$")
+    items: List[OrderItemCreate] = Field(..., min_length=1)
+    total_amount: float = Field(..., gt=0)
+    order_type: str = Field(..., pattern="^(pickup|delivery)$")
+    payment_method: str = Field("cash", pattern="^(cash|card|qr|bank_transfer)$")
     notes: Optional[str] = Field(None, max_length=1000)
 
 
 class OrderStatusUpdate(BaseModel):
     """Schema for updating order status"""
-    status: str = Field(..., regex="^(pending|confirmed|preparing|ready|completed|cancelled)$")
+    status: str = Field(..., pattern="^(pending|confirmed|preparing|ready|completed|cancelled)$")
 
 
 class OrderResponse(BaseModel):
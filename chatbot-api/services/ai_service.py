@@ -4,12 +4,16 @@ Independent AI-related functions
 """
 import httpx
 from modules.config import OPENROUTER_API_KEY, FALLBACK_MESSAGE
+from services.logger import get_logger
+from services.json_codec import loads
+
+logger = get_logger(__name__)
 
 async def get_ai_response(message: str, user_id: str = "") -> str:
     """Get AI response from OpenRouter for complex queries"""
     try:
         if not OPENROUTER_API_KEY:
-            print("⚠️ OpenRouter API key not available, using fallback")
+            logger.warning("⚠️ OpenRouter API key not available, using fallback")
             return FALLBACK_MESSAGE
             
         headers = {
@@ -38,7 +42,7 @@ async def get_ai_response(message: str, user_id: str = "") -> str:
             "temperature": 0.7
         }
         
-        print(f"🤖 Asking AI: {message[:50]}...")
+        logger.debug("🤖 Asking AI: %.50s...", message)
         
         async with httpx.AsyncClient(timeout=15.0) as client:
             response = await client.post(
@@ -48,20 +52,19 @@ async def get_ai_response(message: str, user_id: str = "") -> str:
             )
             
         if response.status_code == 200:
-            data = response.json()
+            data = loads(response.content)
             ai_response = data["choices"][0]["message"]["content"].strip()
-            print(f"✅ AI response: {ai_response[:50]}...")
+            logger.debug("✅ AI response: %.50s...", ai_response)
             return ai_response
         else:
-            print(f"❌ OpenRouter error: {response.status_code}")
-            print(f"   Response: {response.text}")
+            logger.error("❌ OpenRouter error: %s - %.300s", response.status_code, response.text)
             return FALLBACK_MESSAGE
             
     except httpx.TimeoutException:
-        print("❌ AI request timeout")
+        logger.error("❌ AI request timeout")
         return FALLBACK_MESSAGE
     except Exception as e:
-        print(f"❌ AI error: {e}")
+        logger.error("❌ AI error: %s", e)
         return FALLBACK_MESSAGE
 
 def classify_intent(message_text: str) -> str:
@@ -0,0 +1,111 @@
+"""
+Customer identity cache - phone / platform ID -> customer, kept in memory
+Lets repeat customers skip the Supabase lookups in find_or_create_customer
+Updated by find_or_create_customer's own writes; changes made elsewhere expire by TTL, and an order
+insert that hits a deleted customer (FK 23503) drops the stale id at once
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from modules.config import CUSTOMER_CACHE_MAX_ENTRIES, CUSTOMER_CACHE_TTL
+
+# Fields find_or_create_customer needs to decide whether to PATCH
+IDENTITY_FIELDS = ("id", "phone", "line_user_id")
+
+
+class CustomerIdentityCache:
+    """LRU + TTL map of customer id -> identity, indexed by phone and platform ID"""
+
+    def __init__(self, max_entries: int = 5000, ttl: float = 600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._records: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._by_phone: Dict[str, str] = {}
+        self._by_platform_id: Dict[str, str] = {}
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0,
+                      "expirations": 0, "invalidations": 0}
+
+    def _lookup(self, index: Dict[str, str], key: Optional[str]) -> Optional[Dict[str, Any]]:
+        customer_id = index.get(key) if key else None
+        entry = self._records.get(customer_id) if customer_id else None
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+
+        expires_at, record = entry
+        if expires_at <= time.monotonic():
+            self._remove(customer_id)
+            self.stats["expirations"] += 1
+            self.stats["misses"] += 1
+            return None
+
+        self._records.move_to_end(customer_id)
+        self.stats["hits"] += 1
+        return dict(record)
+
+    def get_by_phone(self, phone: str) -> Optional[Dict[str, Any]]:
+        return self._lookup(self._by_phone, phone)
+
+    def get_by_platform_id(self, platform_id: str) -> Optional[Dict[str, Any]]:
+        return self._lookup(self._by_platform_id, platform_id)
+
+    def put(self, customer: Dict[str, Any]):
+        """Store (or replace) a customer's identity; stale phone/platform keys are dropped"""
+        if self.ttl <= 0 or not customer.get("id"):
+            return
+        record = {field: customer.get(field) for field in IDENTITY_FIELDS}
+        self._remove(record["id"])
+
+        self._records[record["id"]] = (time.monotonic() + self.ttl, record)
+        if record["phone"]:
+            self._by_phone[record["phone"]] = record["id"]
+        if record["line_user_id"]:
+            self._by_platform_id[record["line_user_id"]] = record["id"]
+        self.stats["stores"] += 1
+
+        while len(self._records) > self.max_entries:
+            oldest = next(iter(self._records))
+            self._remove(oldest)
+            self.stats["evictions"] += 1
+
+    def invalidate(self, customer_id: str) -> bool:
+        """Forget one customer (e.g. after a merge or an edit outside find_or_create_customer)"""
+        removed = self._remove(customer_id)
+        if removed:
+            self.stats["invalidations"] += 1
+        return removed
+
+    def clear(self) -> int:
+        removed = len(self._records)
+        self._records.clear()
+        self._by_phone.clear()
+        self._by_platform_id.clear()
+        self.stats["invalidations"] += removed
+        return removed
+
+    def _remove(self, customer_id: str) -> bool:
+        entry = self._records.pop(customer_id, None)
+        if entry is None:
+            return False
+        record = entry[1]
+        # Only drop index keys that still point at this customer
+        if self._by_phone.get(record["phone"]) == customer_id:
+            del self._by_phone[record["phone"]]
+        if self._by_platform_id.get(record["line_user_id"]) == customer_id:
+            del self._by_platform_id[record["line_user_id"]]
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self._records),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+        }
+
+
+# Global instance
+customer_cache = CustomerIdentityCache(CUSTOMER_CACHE_MAX_ENTRIES, CUSTOMER_CACHE_TTL)
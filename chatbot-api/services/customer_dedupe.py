@@ -0,0 +1,304 @@
+"""
+Customer dedupe service - Merge duplicate customers without loading the whole table
+Streams customers oldest-first with keyset pagination, keeps only a normalized-key -> survivor index
+in memory, and merges each page's duplicates with chunked writes; the JSON checkpoint holds just the
+cursor, and a resumed run rebuilds the index from the rows before it (one scan, not one per page)
+
+Not safe alongside live stats flushes from other hosts: a customer_stats delta applied to a duplicate
+after its totals were read is lost with it. The job drains this host's journal before each merge;
+run it while no orders come in, or run backfill_customer_stats.py afterwards to recount
+"""
+import os
+import re
+import unicodedata
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from services.customer_cache import customer_cache
+from services.customer_stats import customer_stats
+from services.json_codec import dumps, loads
+from services.logger import get_logger
+from services.query_builder import Query
+
+logger = get_logger(__name__)
+
+# Only what the merge needs - 100k rows stream through a page at a time
+CUSTOMER_MERGE_COLUMNS = (
+    "id", "phone", "display_name", "line_user_id", "platform_type", "created_at",
+    "merged_from", "total_orders", "total_spent", "lifetime_value", "last_order_at",
+)
+
+# Platform IDs that say nothing about the customer (see generate_platform_id)
+GENERIC_PLATFORM_PREFIXES = ("WEB_", "UNKNOWN_")
+
+# Honorifics people type in front of their name ("คุณสมชาย" == "สมชาย")
+_NAME_PREFIXES = ("คุณ", "khun ", "k.", "mr.", "mrs.", "ms.", "miss ")
+
+CHECKPOINT_VERSION = 2  # 1 also stored the whole index - still readable
+
+
+def normalize_phone(phone: Optional[str]) -> Optional[str]:
+    """Digits only, +66 / 66 country code folded to the local 0 prefix; None if too short to trust"""
+    digits = re.sub(r"\D", "", phone or "")
+    if digits.startswith("66") and len(digits) == 11:
+        digits = "0" + digits[2:]
+    return digits if len(digits) >= 9 else None
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """Case/width/spacing/punctuation-insensitive name (Thai combining marks kept)"""
+    text = unicodedata.normalize("NFKC", name or "").casefold().strip()
+    for prefix in _NAME_PREFIXES:
+        if text.startswith(prefix):
+            text = text[len(prefix):]
+            break
+    return "".join(ch for ch in text if ch.isalnum() or unicodedata.category(ch).startswith("M"))
+
+
+def is_generic_platform_id(platform_id: Optional[str]) -> bool:
+    return not platform_id or platform_id.startswith(GENERIC_PLATFORM_PREFIXES)
+
+
+def identity_keys(customer: Dict[str, Any]) -> List[str]:
+    """Index keys for one customer: normalized phone, and normalized name + platform ID for phone-less rows"""
+    keys = []
+    phone = normalize_phone(customer.get("phone"))
+    if phone:
+        keys.append(f"phone:{phone}")
+    name = normalize_name(customer.get("display_name"))
+    platform_id = customer.get("line_user_id")
+    if name and not is_generic_platform_id(platform_id):
+        keys.append(f"name:{name}|{platform_id}")
+    return keys
+
+
+def _timestamp(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _merged_ids(merged_from: Any) -> set:
+    if not isinstance(merged_from, list):
+        return set()
+    return {entry.get("id") if isinstance(entry, dict) else entry for entry in merged_from}
+
+
+def merge_record(survivor: Dict[str, Any], duplicates: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Survivor row to write back: duplicates appended to merged_from, their totals added once"""
+    merged_from = list(survivor["merged_from"]) if isinstance(survivor.get("merged_from"), list) else []
+    already = _merged_ids(merged_from)
+    new = [dup for dup in duplicates if dup["id"] not in already]
+    now = datetime.now(timezone.utc).isoformat()
+
+    record = {
+        "id": survivor["id"],
+        "display_name": survivor.get("display_name"),
+        "phone": survivor.get("phone"),
+        "line_user_id": survivor.get("line_user_id"),
+        "platform_type": survivor.get("platform_type"),
+        "total_orders": int(survivor.get("total_orders") or 0),
+        "total_spent": float(survivor.get("total_spent") or 0),
+        "lifetime_value": float(survivor.get("lifetime_value") or 0),
+        "last_order_at": survivor.get("last_order_at"),
+        "merged_from": merged_from,
+        "updated_at": now,
+    }
+    for dup in new:
+        merged_from.append({
+            "id": dup["id"],
+            "line_user_id": dup.get("line_user_id"),
+            "platform_type": dup.get("platform_type"),
+            "phone": dup.get("phone"),
+            "display_name": dup.get("display_name"),
+            "created_at": dup.get("created_at"),
+            "merged_at": now,
+        })
+        record["total_orders"] += int(dup.get("total_orders") or 0)
+        record["total_spent"] += float(dup.get("total_spent") or 0)
+        record["lifetime_value"] += float(dup.get("lifetime_value") or 0)
+        dup_last = _timestamp(dup.get("last_order_at"))
+        if dup_last and (not _timestamp(record["last_order_at"]) or dup_last > _timestamp(record["last_order_at"])):
+            record["last_order_at"] = dup.get("last_order_at")
+        # A real platform ID (LINE_/FB_/IG_) beats a generated WEB_ one - same rule as find_or_create_customer
+        if is_generic_platform_id(record["line_user_id"]) and not is_generic_platform_id(dup.get("line_user_id")):
+            record["line_user_id"] = dup["line_user_id"]
+            record["platform_type"] = dup.get("platform_type")
+        if not record["display_name"] and dup.get("display_name"):
+            record["display_name"] = dup["display_name"]
+        if not record["phone"] and dup.get("phone"):
+            record["phone"] = dup["phone"]
+
+    record["total_spent"] = round(record["total_spent"], 2)
+    record["lifetime_value"] = round(record["lifetime_value"], 2)
+    return record
+
+
+def _chunks(items: List[Any], size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class CustomerDedupeJob:
+    """Resumable merge of duplicate customers into the oldest record with the same identity key"""
+
+    def __init__(self, page_size: int = 1000, write_chunk: int = 100,
+                 checkpoint_path: Optional[str] = None, dry_run: bool = False):
+        self.page_size = page_size
+        self.write_chunk = write_chunk
+        self.checkpoint_path = checkpoint_path
+        self.dry_run = dry_run
+        self.cursor: Optional[List[str]] = None  # [created_at, id] of the last row processed
+        self.index: Dict[str, str] = {}          # identity key -> survivor customer id
+        self.done = False
+        self.stats = {"pages": 0, "scanned": 0, "duplicates": 0, "merged": 0,
+                      "survivors_updated": 0, "orders_reassigned": 0, "skipped": 0}
+
+    # ---------- checkpoint ----------
+
+    def load_checkpoint(self) -> bool:
+        """Resume from the checkpoint file if there is one"""
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return False
+        with open(self.checkpoint_path, "rb") as f:
+            state = loads(f.read())
+        if state.get("version") not in (1, CHECKPOINT_VERSION):
+            raise ValueError(f"Unsupported checkpoint version in {self.checkpoint_path}")
+        self.cursor = state.get("cursor")
+        self.index = state.get("index") or {}  # empty from version 2 on - run() rebuilds it
+        self.done = bool(state.get("done"))
+        self.stats.update(state.get("stats") or {})
+        logger.info("♻️ Resuming customer dedupe after %s", self.cursor)
+        return True
+
+    def save_checkpoint(self):
+        """Cursor and counters only - a few hundred bytes whatever the table size"""
+        if not self.checkpoint_path or self.dry_run:
+            return
+        state = {"version": CHECKPOINT_VERSION, "cursor": self.cursor, "done": self.done, "stats": self.stats}
+        # Write-then-rename so a crash never leaves a half-written checkpoint
+        temp_path = f"{self.checkpoint_path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(dumps(state))
+        os.replace(temp_path, self.checkpoint_path)
+
+    # ---------- streaming ----------
+
+    async def fetch_page(self, cursor: Optional[List[str]] = None, name: str = "dedupe_page") -> List[Dict[str, Any]]:
+        query = (Query("customers", name).select(*CUSTOMER_MERGE_COLUMNS)
+                 .order("created_at").order("id").limit(self.page_size))
+        if cursor:
+            query.after("created_at", cursor[0], "id", cursor[1])
+        return await query.fetch()
+
+    async def rebuild_index(self):
+        """Index the rows up to the checkpoint cursor again - survivors under their own keys and
+        the keys of the duplicates they absorbed (merged_from), as the interrupted run had them"""
+        stop = (_timestamp(self.cursor[0]), self.cursor[1])
+        cursor: Optional[List[str]] = None
+        while True:
+            rows = await self.fetch_page(cursor, "dedupe_rebuild_index")
+            past_cursor = False
+            for row in rows:
+                if (_timestamp(row["created_at"]), row["id"]) > stop:
+                    past_cursor = True
+                    break
+                merged = row["merged_from"] if isinstance(row.get("merged_from"), list) else []
+                for identity in [row, *(entry for entry in merged if isinstance(entry, dict))]:
+                    for key in identity_keys(identity):
+                        self.index.setdefault(key, row["id"])
+            if past_cursor or len(rows) < self.page_size:
+                break
+            cursor = [rows[-1]["created_at"], rows[-1]["id"]]
+        logger.info("♻️ Rebuilt the dedupe index up to %s (%d keys)", self.cursor, len(self.index))
+
+    def index_page(self, rows: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        """Group this page's duplicates by survivor; rows arrive oldest-first so the first seen survives"""
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            keys = identity_keys(row)
+            survivor = next((self.index[key] for key in keys if key in self.index), None)
+            if survivor is None or survivor == row["id"]:
+                survivor = row["id"]
+            else:
+                groups.setdefault(survivor, []).append(row)
+            for key in keys:
+                self.index.setdefault(key, survivor)
+        return groups
+
+    async def merge_groups(self, groups: Dict[str, List[Dict[str, Any]]]):
+        """Update survivors, reassign orders, then delete duplicates - each step safe to repeat"""
+        # Stat deltas journaled for these customers go in first, then their totals are read
+        # (survivors and duplicates) - a delta landing on a duplicate after its delete is lost
+        await customer_stats.flush()
+        current: Dict[str, Dict[str, Any]] = {}
+        ids = list(groups) + [dup["id"] for duplicates in groups.values() for dup in duplicates]
+        for chunk in _chunks(ids, self.write_chunk):
+            rows = await Query("customers", "dedupe_survivors").select(*CUSTOMER_MERGE_COLUMNS).in_("id", chunk).fetch()
+            current.update({row["id"]: row for row in rows})
+
+        survivor_ids, duplicate_ids = [], []
+        for survivor_id, duplicates in groups.items():
+            duplicates = [current[dup["id"]] for dup in duplicates if dup["id"] in current]
+            survivor = current.get(survivor_id)
+            if survivor is None:
+                # Deleted since it was indexed - leave its duplicates for the next run
+                self.stats["skipped"] += len(duplicates)
+                continue
+            if not duplicates:
+                continue
+            record = merge_record(survivor, duplicates)
+            # PATCH by id, never an upsert: a survivor deleted meanwhile must not come back
+            updated = await Query("customers", "dedupe_merge_survivors").eq("id", survivor_id).update(
+                {column: value for column, value in record.items() if column != "id"})
+            if not updated:
+                self.stats["skipped"] += len(duplicates)
+                continue
+            ids = [dup["id"] for dup in duplicates]
+            moved = await Query("orders", "dedupe_reassign_orders").in_("customer_id", ids).update(
+                {"customer_id": survivor_id})
+            self.stats["orders_reassigned"] += len(moved or [])
+            survivor_ids.append(survivor_id)
+            duplicate_ids.extend(ids)
+
+        # Survivors are written before duplicates disappear: a crash in between is replayed
+        # from the checkpoint and merge_record skips ids already in merged_from
+        for chunk in _chunks(duplicate_ids, self.write_chunk):
+            await Query("customers", "dedupe_delete_duplicates").in_("id", chunk).delete()
+
+        # Only this process's cache - the API re-resolves a merged-away id when its order insert fails
+        for customer_id in survivor_ids + duplicate_ids:
+            customer_cache.invalidate(customer_id)
+        self.stats["survivors_updated"] += len(survivor_ids)
+        self.stats["merged"] += len(duplicate_ids)
+
+    async def run(self, max_pages: Optional[int] = None) -> Dict[str, Any]:
+        """Process pages until the table is exhausted (or max_pages this call); returns stats"""
+        pages = 0
+        if self.cursor and not self.index and not self.done:
+            await self.rebuild_index()
+        while not self.done and (max_pages is None or pages < max_pages):
+            rows = await self.fetch_page(self.cursor)
+            groups = self.index_page(rows)
+            self.stats["duplicates"] += sum(len(dups) for dups in groups.values())
+            if groups and not self.dry_run:
+                await self.merge_groups(groups)
+
+            if rows:
+                self.cursor = [rows[-1]["created_at"], rows[-1]["id"]]
+                self.stats["scanned"] += len(rows)
+                self.stats["pages"] += 1
+            self.done = len(rows) < self.page_size
+            self.save_checkpoint()
+            pages += 1
+            logger.info("🧹 Dedupe page %d: %d rows, %d duplicate(s)", self.stats["pages"], len(rows),
+                        sum(len(dups) for dups in groups.values()))
+        return self.get_stats()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "indexed_keys": len(self.index), "done": self.done,
+                "cursor": self.cursor, "dry_run": self.dry_run}
@@ -0,0 +1,257 @@
+"""
+Customer stats service - Incremental customer aggregates with write-behind flushes
+Order create / complete / cancel adjust total_orders, total_spent, lifetime_value and last_order_at
+as deltas in the write journal; its flusher applies each batch in one apply_customer_stats call,
+which skips delta ids it has already applied - a replayed batch is never counted twice
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from modules.config import (
+    CUSTOMER_STATS_ENABLED, CUSTOMER_STATS_FLUSH_INTERVAL, CUSTOMER_STATS_BATCH_SIZE, CUSTOMER_STATS_RPC
+)
+from services.database_service import supabase_request
+from services.logger import get_logger
+from services.query_builder import Query
+from services.write_journal import WriteJournal, write_journal
+
+logger = get_logger(__name__)
+
+STATS_COLUMNS = ("id", "total_orders", "total_spent", "lifetime_value", "last_order_at")
+
+
+def order_contribution(status: Optional[str], amount: Any) -> Tuple[int, float, float]:
+    """(orders, lifetime_value, spent) one order adds to its customer while in `status`
+
+    Cancelled orders count for nothing, every other order counts towards total_orders and
+    lifetime_value, and only completed orders count as money actually spent.
+    """
+    if status == "cancelled":
+        return 0, 0.0, 0.0
+    amount = float(amount or 0)
+    return 1, amount, amount if status == "completed" else 0.0
+
+
+def _timestamp(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _latest(current: Optional[str], candidate: Optional[str]) -> Optional[str]:
+    candidate_at = _timestamp(candidate)
+    if candidate_at is None:
+        return current
+    current_at = _timestamp(current)
+    return candidate if current_at is None or candidate_at > current_at else current
+
+
+def _is_rolled_back(error: HTTPException) -> bool:
+    """An error *response* means the statement rolled back; a timeout may have committed"""
+    return error.status_code == 500 and str(error.detail).startswith("Database error:")
+
+
+async def _patch_totals(records: List[Dict[str, Any]], name: str) -> int:
+    """PATCH each customer by id (id=eq.<id>); a customer deleted meanwhile matches nothing and stays deleted"""
+    updated = 0
+    for record in records:
+        values = {column: value for column, value in record.items() if column != "id"}
+        updated += len(await Query("customers", name).eq("id", record["id"]).update(values) or [])
+    return updated
+
+
+def _merge_deltas(deltas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """One entry per customer, so a batch is one UPDATE row per customer"""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for delta in deltas:
+        entry = merged.setdefault(delta["customer_id"], {
+            "customer_id": delta["customer_id"], "orders": 0, "lifetime_value": 0.0, "spent": 0.0,
+            "last_order_at": None,
+        })
+        entry["orders"] += delta["orders"]
+        entry["lifetime_value"] += delta["lifetime_value"]
+        entry["spent"] += delta["spent"]
+        entry["last_order_at"] = _latest(entry["last_order_at"], delta["last_order_at"])
+    for entry in merged.values():
+        entry["lifetime_value"] = round(entry["lifetime_value"], 2)
+        entry["spent"] = round(entry["spent"], 2)
+    return list(merged.values())
+
+
+class CustomerStatsWriter:
+    """Deltas are journaled when recorded; the journal flushes them every flush_interval or batch_size deltas"""
+
+    KIND = "customer_stats"
+
+    def __init__(self, journal: WriteJournal, flush_interval: float = 5.0, batch_size: int = 200,
+                 enabled: bool = True):
+        self.journal = journal
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.enabled = enabled
+        self.use_rpc = CUSTOMER_STATS_RPC
+        self.stats = {"recorded": 0, "flushes": 0, "customers_written": 0, "dropped": 0, "errors": 0}
+        journal.register(self.KIND, self.apply, flush_interval, batch_size)
+
+    # ---------- recording ----------
+
+    def add(self, customer_id: Optional[str], orders: int = 0, lifetime_value: float = 0.0,
+            spent: float = 0.0, last_order_at: Optional[str] = None):
+        """Journal a delta for one customer (local append, no network)"""
+        if not self.enabled or not customer_id:
+            return
+        if not (orders or lifetime_value or spent or last_order_at):
+            return
+        self.journal.append(self.KIND, {"customer_id": customer_id, "orders": orders, "lifetime_value": lifetime_value,
+                                        "spent": spent, "last_order_at": last_order_at})
+        self.stats["recorded"] += 1
+
+    def record_order_created(self, order: Dict[str, Any]):
+        orders, lifetime_value, spent = order_contribution(order.get("status", "pending"), order.get("total_amount"))
+        self.add(order.get("customer_id"), orders, lifetime_value, spent, order.get("created_at"))
+
+    def record_status_change(self, order: Dict[str, Any], new_status: str):
+        """`order` is the row as it was before the change (status, customer_id, total_amount)"""
+        if order.get("status") == new_status:
+            return
+        old = order_contribution(order.get("status"), order.get("total_amount"))
+        new = order_contribution(new_status, order.get("total_amount"))
+        self.add(order.get("customer_id"), new[0] - old[0], new[1] - old[1], new[2] - old[2])
+
+    # ---------- flushing ----------
+
+    async def flush(self) -> int:
+        """Write every journaled delta now; returns the number of customers written"""
+        before = self.stats["customers_written"]
+        await self.journal.flush(self.KIND)
+        return self.stats["customers_written"] - before
+
+    async def apply(self, deltas: List[Dict[str, Any]]):
+        """Journal handler: apply one batch of deltas (raising keeps them in the journal for a retry)"""
+        batch = _merge_deltas(deltas)
+        self.stats["flushes"] += 1
+        try:
+            if self.use_rpc:
+                await self._apply_rpc(deltas, batch)
+            else:
+                await self._apply_read_modify_write(batch)
+        except HTTPException as e:
+            self.stats["errors"] += 1
+            if self.use_rpc or _is_rolled_back(e):
+                raise  # not applied, or the RPC skips the deltas it did apply - the journal retries the batch
+            # Fallback writes might have been applied - retrying could double count; backfill repairs drift
+            self.stats["dropped"] += len(batch)
+            logger.error("❌ Customer stats flush outcome unknown, dropped %d customer(s): %s", len(batch), e.detail)
+            return
+
+        self.stats["customers_written"] += len(batch)
+        logger.debug("📊 Flushed stats for %d customer(s)", len(batch))
+
+    async def _apply_rpc(self, deltas: List[Dict[str, Any]], batch: List[Dict[str, Any]]):
+        """All deltas in one atomic UPDATE (customer_stats_rpc.sql), keyed by journal entry_id"""
+        p_deltas = [{"id": delta["entry_id"], "customer_id": delta["customer_id"], "orders": delta["orders"],
+                     "spent": delta["spent"], "lifetime_value": delta["lifetime_value"],
+                     "last_order_at": delta["last_order_at"]} for delta in deltas]
+        try:
+            await supabase_request("POST", "rpc/apply_customer_stats", {"p_deltas": p_deltas})
+        except HTTPException as e:
+            if "PGRST202" not in str(e.detail):
+                raise
+            self.use_rpc = False
+            logger.warning("⚠️ apply_customer_stats not installed - using read-modify-write stats flushes")
+            await self._apply_read_modify_write(batch)
+
+    async def _apply_read_modify_write(self, batch: List[Dict[str, Any]]):
+        """Fallback: read current totals, PATCH new ones (not atomic across workers, no replay dedupe)"""
+        deltas = {entry["customer_id"]: entry for entry in batch}
+        rows = await Query("customers", "customer_stats_current").select(*STATS_COLUMNS).in_("id", list(deltas)).fetch()
+        now = datetime.now(timezone.utc).isoformat()
+        records = []
+        for row in rows:
+            delta = deltas[row["id"]]
+            records.append({
+                "id": row["id"],
+                "total_orders": max(int(row.get("total_orders") or 0) + delta["orders"], 0),
+                "total_spent": max(round(float(row.get("total_spent") or 0) + delta["spent"], 2), 0.0),
+                "lifetime_value": max(round(float(row.get("lifetime_value") or 0) + delta["lifetime_value"], 2), 0.0),
+                "last_order_at": _latest(row.get("last_order_at"), delta["last_order_at"]),
+                "updated_at": now,
+            })
+        await _patch_totals(records, "customer_stats_write")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "rpc": self.use_rpc,
+            "pending_deltas": self.journal.depth(self.KIND),
+            "dead_deltas": self.journal.depth(self.KIND, dead=True),
+            "flush_interval_seconds": self.flush_interval,
+            "batch_size": self.batch_size,
+        }
+
+
+async def backfill_customer_stats(page_size: int = 1000, write_chunk: int = 500) -> Dict[str, Any]:
+    """Recompute every customer's aggregates from orders (streamed with keyset pagination)
+
+    Absolute values overwrite the columns, so run it once before enabling CUSTOMER_STATS_ENABLED
+    (or while no orders are coming in) - live deltas applied during the scan could be lost.
+    """
+    totals: Dict[str, List[Any]] = {}
+    cursor: Optional[List[str]] = None
+    scanned = 0
+    while True:
+        query = (Query("orders", "customer_stats_backfill")
+                 .select("id", "customer_id", "status", "total_amount", "created_at")
+                 .order("created_at").order("id").limit(page_size))
+        if cursor:
+            query.after("created_at", cursor[0], "id", cursor[1])
+        rows = await query.fetch()
+        for row in rows:
+            if not row.get("customer_id"):
+                continue
+            entry = totals.setdefault(row["customer_id"], [0, 0.0, 0.0, None])
+            orders, lifetime_value, spent = order_contribution(row.get("status"), row.get("total_amount"))
+            entry[0] += orders
+            entry[1] += lifetime_value
+            entry[2] += spent
+            entry[3] = _latest(entry[3], row.get("created_at"))
+        scanned += len(rows)
+        if len(rows) < page_size:
+            break
+        cursor = [rows[-1]["created_at"], rows[-1]["id"]]
+        logger.info("📊 Backfill scanned %d orders (%d customers)", scanned, len(totals))
+
+    records = [{"id": customer_id, "total_orders": orders, "lifetime_value": round(lifetime_value, 2),
+                "total_spent": round(spent, 2), "last_order_at": last_order_at}
+               for customer_id, (orders, lifetime_value, spent, last_order_at) in totals.items()]
+    # UPDATE only: customers deleted since their orders were scanned are skipped, never recreated
+    updated = 0
+    use_rpc = True
+    for start in range(0, len(records), write_chunk):
+        chunk = records[start:start + write_chunk]
+        if use_rpc:
+            try:
+                updated += await supabase_request("POST", "rpc/set_customer_stats", {"p_rows": chunk}) or 0
+                continue
+            except HTTPException as e:
+                if "PGRST202" not in str(e.detail):
+                    raise
+                use_rpc = False
+                logger.warning("⚠️ set_customer_stats not installed - backfill PATCHes one customer at a time")
+        now = datetime.now(timezone.utc).isoformat()
+        updated += await _patch_totals([{**record, "updated_at": now} for record in chunk],
+                                       "customer_stats_backfill_write")
+    logger.info("✅ Backfilled stats for %d customers from %d orders", updated, scanned)
+    return {"orders_scanned": scanned, "customers_updated": updated}
+
+
+# Global instance
+customer_stats = CustomerStatsWriter(write_journal, CUSTOMER_STATS_FLUSH_INTERVAL, CUSTOMER_STATS_BATCH_SIZE,
+                                     CUSTOMER_STATS_ENABLED)
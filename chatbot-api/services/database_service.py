@@ -3,13 +3,64 @@ Database service - Supabase operations
 Independent functions that can be tested separately
 """
 import uuid
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Union
 import httpx
 from fastapi import HTTPException
-from modules.config import SUPABASE_URL, SUPABASE_SERVICE_KEY, SUPABASE_ANON_KEY
+from modules.config import (
+    SUPABASE_URL, SUPABASE_SERVICE_KEY, SUPABASE_ANON_KEY,
+    SUPABASE_COALESCE_GETS, SUPABASE_CACHE_ENABLED, SUPABASE_BULK_CHUNK_SIZE,
+    SUPABASE_RETRY_ATTEMPTS, CUSTOMER_RESOLVE_RPC
+)
+from services.http_pool import (
+    get_http_client, get_table_timeout, track_request, normalize_endpoint, endpoint_table
+)
+from services.request_coalescer import supabase_coalescer
+from services.query_cache import query_cache, written_tables
+from services.customer_cache import customer_cache
+from services.resilience import (
+    CircuitOpenError, get_breaker, should_retry_error, should_retry_status, wait_before_retry
+)
+from services.logger import get_logger
+from services.json_codec import dumps, loads
+from services.metrics import timed
 
-async def supabase_request(method: str, endpoint: str, data: Dict = None, use_service_key: bool = True) -> Dict:
+logger = get_logger(__name__)
+
+# resolve_customer RPC (resolve_customer_rpc.sql) - switched off automatically if not installed
+customer_rpc = {"enabled": CUSTOMER_RESOLVE_RPC}
+
+async def supabase_request(method: str, endpoint: str, data: Union[Dict, List[Dict]] = None, use_service_key: bool = True) -> Dict:
     """Make request to Supabase REST API with enhanced error handling"""
+    if method != "GET":
+        try:
+            return await _execute_request(method, endpoint, data, use_service_key)
+        finally:
+            # Bump the table generation: later reads skip old cache entries
+            # and never join a GET that was already in flight before this write
+            for table in written_tables(endpoint):
+                query_cache.invalidate_table(table)
+    
+    key = f"{'service' if use_service_key else 'anon'}:{normalize_endpoint(endpoint)}"
+    generation = query_cache.generation(endpoint)
+    cacheable = SUPABASE_CACHE_ENABLED and query_cache.ttl_for(endpoint) > 0
+    if cacheable:
+        hit, cached = query_cache.get(key)
+        if hit:
+            return cached
+    
+    fetch = lambda: _execute_request(method, endpoint, data, use_service_key)
+    if SUPABASE_COALESCE_GETS:
+        # Identical concurrent reads share one round trip
+        result = await supabase_coalescer.run(f"{key}@{generation}", fetch)
+    else:
+        result = await fetch()
+    
+    if cacheable:
+        query_cache.set(key, endpoint, result, generation)
+    return result
+
+async def _execute_request(method: str, endpoint: str, data: Union[Dict, List[Dict]] = None, use_service_key: bool = True) -> Dict:
+    """Single HTTP call to Supabase REST API"""
     try:
         headers = {
             "apikey": SUPABASE_SERVICE_KEY if use_service_key else SUPABASE_ANON_KEY,
@@ -17,51 +68,108 @@ async def supabase_request(method: str, endpoint: str, data: Dict = None, use_se
             "Content-Type": "application/json"
         }
         
-        # Add Prefer header for POST requests to return created data
-        if method == "POST":
+        # Add Prefer header for POST/PATCH requests to return created/updated rows
+        if method in ("POST", "PATCH"):
             headers["Prefer"] = "return=representation"
+            if method == "POST" and "on_conflict=" in endpoint:
+                # Upsert - update the existing row instead of failing with 409
+                headers["Prefer"] += ",resolution=merge-duplicates"
         
         url = f"{SUPABASE_URL}/rest/v1/{endpoint}"
-        print(f"📡 {method} {endpoint} (service_key: {use_service_key})")
+        logger.debug("📡 %s %s (service_key: %s)", method, endpoint, use_service_key)
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            if method == "GET":
-                response = await client.get(url, headers=headers)
-            elif method == "POST":
-                response = await client.post(url, headers=headers, json=data)
-            elif method == "PATCH":
-                response = await client.patch(url, headers=headers, json=data)
+        if method not in ("GET", "POST", "PATCH", "DELETE"):
+            raise ValueError(f"Unsupported method: {method}")
+        
+        # Shared keep-alive client - no new TCP/TLS handshake per call
+        client = get_http_client()
+        breaker = get_breaker(endpoint_table(endpoint))
+        for attempt in range(SUPABASE_RETRY_ATTEMPTS + 1):
+            breaker.check()  # fail fast while the table's circuit is open
+            try:
+                async with track_request():
+                    response = await client.request(
+                        method, url, headers=headers,
+                        content=dumps(data) if method != "GET" and data is not None else None,
+                        timeout=get_table_timeout(endpoint)
+                    )
+            except httpx.TransportError as e:
+                breaker.record_failure()
+                if attempt < SUPABASE_RETRY_ATTEMPTS and should_retry_error(method, endpoint, e):
+                    logger.warning("🔁 Retrying %s %s after %s (attempt %d)", method, endpoint, type(e).__name__, attempt + 1)
+                    await wait_before_retry(attempt)
+                    continue
+                raise
+            except BaseException:
+                breaker.abandon()  # cancelled - never leave a half-open probe dangling
+                raise
+            
+            if response.status_code >= 500 or response.status_code == 429:
+                breaker.record_failure()
+                if attempt < SUPABASE_RETRY_ATTEMPTS and should_retry_status(method, endpoint, response.status_code):
+                    logger.warning("🔁 Retrying %s %s after status %d (attempt %d)",
+                                   method, endpoint, response.status_code, attempt + 1)
+                    await wait_before_retry(attempt, response.headers.get("retry-after"))
+                    continue
             else:
-                raise ValueError(f"Unsupported method: {method}")
+                breaker.record_success()
+            break
         
         if response.status_code not in [200, 201, 204]:
-            print(f"❌ Supabase error: {response.status_code}")
-            print(f"   URL: {url}")
-            print(f"   Headers: {headers}")
-            print(f"   Data sent: {data}")
-            print(f"   Response: {response.text}")
+            # Never log headers (API keys) or payloads (customer data)
+            logger.error("❌ Supabase error: %s %s -> %d: %.500s", method, endpoint, response.status_code, response.text)
             raise HTTPException(status_code=500, detail=f"Database error: {response.status_code} - {response.text}")
         
         # Handle response body - Supabase may return empty body with 201 status
-        if response.text:
-            result = response.json()
-            print(f"✅ Supabase response: {len(str(result))} chars")
+        if response.content:
+            result = loads(response.content)
+            logger.debug("✅ Supabase response: %d bytes", len(response.content))
         else:
             result = []
-            print(f"✅ Supabase response: Empty body (Status {response.status_code})")
+            logger.debug("✅ Supabase response: Empty body (Status %d)", response.status_code)
         
         return result
         
+    except HTTPException:
+        raise
+    except CircuitOpenError as e:
+        logger.warning("🚫 %s - failing fast", e)
+        raise HTTPException(status_code=503, detail="Database temporarily unavailable")
     except httpx.TimeoutException:
-        print("❌ Supabase timeout")
+        logger.error("❌ Supabase timeout: %s %s", method, endpoint)
         raise HTTPException(status_code=504, detail="Database timeout")
     except httpx.RequestError as e:
-        print(f"❌ Supabase connection error: {e}")
+        logger.error("❌ Supabase connection error: %s", e)
         raise HTTPException(status_code=503, detail="Database connection failed")
     except Exception as e:
-        print(f"❌ Unexpected error in supabase_request: {e}")
+        logger.exception("❌ Unexpected error in supabase_request: %s", e)
         raise HTTPException(status_code=500, detail="Database error")
 
+async def bulk_insert(table: str, rows: List[Dict], chunk_size: int = SUPABASE_BULK_CHUNK_SIZE) -> List[Dict]:
+    """Insert rows as one array POST; fall back to chunked array inserts if the bulk write fails"""
+    if not rows:
+        return []
+    
+    try:
+        return await supabase_request("POST", table, rows)
+    except HTTPException as e:
+        if len(rows) <= chunk_size:
+            raise
+        # A single INSERT statement is atomic, so nothing was written - safe to retry in chunks
+        logger.warning("⚠️ Bulk insert of %d %s rows failed (%s), retrying in chunks of %d",
+                       len(rows), table, e.detail, chunk_size)
+    
+    inserted = []
+    for start in range(0, len(rows), chunk_size):
+        inserted.extend(await supabase_request("POST", table, rows[start:start + chunk_size]))
+    return inserted
+
+def is_missing_customer(error: HTTPException) -> bool:
+    """FK violation on customer_id (23503) - a cached id whose customer is gone, e.g. merged away by
+    the dedupe job (its own process, so it can't clear this process's customer cache)"""
+    detail = str(error.detail)
+    return "23503" in detail and "customer_id" in detail
+
 def generate_platform_id(platform: str, identifier: str = None) -> str:
     """Generate platform-specific customer ID"""
     if platform == "LINE" and identifier:
@@ -79,80 +187,134 @@ def generate_platform_id(platform: str, identifier: str = None) -> str:
     else:
         return f"UNKNOWN_{str(uuid.uuid4())[:8]}"
 
+def _cached_customer_id(phone: str, platform: str, platform_user_id: Optional[str], platform_id: str) -> Optional[str]:
+    """Customer id from the identity cache, only when resolving would not write anything"""
+    if platform != "WEB" and platform_user_id:
+        # Platform ID outranks phone - a phone hit could be a different customer
+        customer = customer_cache.get_by_platform_id(platform_id)
+        return customer["id"] if customer and customer["phone"] == phone else None
+    customer = customer_cache.get_by_phone(phone)
+    return customer["id"] if customer else None
+
+async def _resolve_customer_rpc(name: str, phone: str, platform: str, platform_id: str) -> Optional[str]:
+    """Find or create in one serialized database call; None means use the legacy path"""
+    payload = {"p_name": name, "p_phone": phone, "p_platform": platform, "p_platform_id": platform_id}
+    try:
+        customer = await supabase_request("POST", "rpc/resolve_customer", payload)
+    except HTTPException as e:
+        if "PGRST202" not in str(e.detail):
+            raise
+        customer_rpc["enabled"] = False
+        logger.warning("⚠️ resolve_customer not installed - using legacy customer lookup")
+        return None
+    
+    if customer.get("created"):
+        logger.info("✅ Customer created with ID: %s (%s)", customer["id"], platform)
+    customer_cache.put(customer)
+    return customer["id"]
+
 async def find_or_create_customer(name: str, phone: str, platform: str = "WEB", platform_user_id: str = None) -> str:
     """Smart customer management - find existing or create new with proper platform ID"""
     try:
-        print(f"🔍 Processing customer: name={name}, phone={phone}, platform={platform}")
+        logger.debug("🔍 Processing customer: name=%s, phone=%s, platform=%s", name, phone, platform)
         platform_id = generate_platform_id(platform, platform_user_id or phone)
         
-        # Step 1: For LINE/FB/IG, try to find by platform_user_id first (more reliable)
-        if platform != "WEB" and platform_user_id:
-            platform_query = f"customers?line_user_id=eq.{platform_id}&select=id,line_user_id,phone&limit=1"
-            platform_customers = await supabase_request("GET", platform_query, use_service_key=False)
-            
-            if platform_customers and len(platform_customers) > 0:
-                customer_id = platform_customers[0]["id"]
-                existing_phone = platform_customers[0]["phone"]
-                
-                # Update phone if it has changed
-                if existing_phone != phone:
-                    update_data = {"phone": phone, "display_name": name}
-                    await supabase_request("PATCH", f"customers?id=eq.{customer_id}", update_data)
-                    print(f"✅ Updated customer {customer_id} phone: {existing_phone} → {phone}")
-                else:
-                    print(f"✅ Found existing customer by platform ID: {customer_id}")
+        if customer_rpc["enabled"]:
+            customer_id = _cached_customer_id(phone, platform, platform_user_id, platform_id)
+            if customer_id:
+                return customer_id
+            with timed("customers.resolve", "rpc"):
+                customer_id = await _resolve_customer_rpc(name, phone, platform, platform_id)
+            if customer_id:
                 return customer_id
         
-        # Step 2: Try to find existing customer by phone (universal key)
-        phone_query = f"customers?phone=eq.{phone}&select=id,line_user_id&limit=1"
-        phone_customers = await supabase_request("GET", phone_query, use_service_key=False)
+        with timed("customers.resolve", "legacy"):
+            return await _find_or_create_customer_legacy(name, phone, platform, platform_user_id, platform_id)
+        
+    except Exception as e:
+        logger.error("❌ Customer operation error: %s", e)
+        raise HTTPException(status_code=500, detail=f"Customer operation failed: {str(e)}")
+
+async def _find_or_create_customer_legacy(name: str, phone: str, platform: str, platform_user_id: Optional[str],
+                                          platform_id: str) -> str:
+    """Find-then-create in up to 4 round trips (not safe against concurrent first orders)"""
+    # Step 1: For LINE/FB/IG, try to find by platform_user_id first (more reliable)
+    if platform != "WEB" and platform_user_id:
+        customer = customer_cache.get_by_platform_id(platform_id)
+        if customer is None:
+            platform_query = f"customers?line_user_id=eq.{platform_id}&select=id,line_user_id,phone&limit=1"
+            platform_customers = await supabase_request("GET", platform_query, use_service_key=False)
+            customer = platform_customers[0] if platform_customers else None
         
-        if phone_customers and len(phone_customers) > 0:
-            customer_id = phone_customers[0]["id"]
-            current_platform_id = phone_customers[0]["line_user_id"]
+        if customer:
+            customer_id = customer["id"]
+            existing_phone = customer["phone"]
             
-            # Update platform ID if it's generic web ID and we have better info
-            if current_platform_id.startswith("WEB_") and len(current_platform_id) < 15 and platform != "WEB":
-                update_data = {"line_user_id": platform_id, "display_name": name}
+            # Update phone if it has changed
+            if existing_phone != phone:
+                update_data = {"phone": phone, "display_name": name}
                 await supabase_request("PATCH", f"customers?id=eq.{customer_id}", update_data)
-                print(f"✅ Updated customer {customer_id} platform ID: {current_platform_id} → {platform_id}")
+                # GET results are shared with coalesced callers and the caches - copy, never mutate
+                customer = {**customer, "phone": phone}
+                logger.info("✅ Updated customer %s phone", customer_id)
             else:
-                print(f"✅ Found existing customer by phone: {customer_id} ({current_platform_id})")
+                logger.debug("✅ Found existing customer by platform ID: %s", customer_id)
+            customer_cache.put(customer)
             return customer_id
+    
+    # Step 2: Try to find existing customer by phone (universal key)
+    customer = customer_cache.get_by_phone(phone)
+    if customer is None:
+        phone_query = f"customers?phone=eq.{phone}&select=id,line_user_id,phone&limit=1"
+        phone_customers = await supabase_request("GET", phone_query, use_service_key=False)
+        customer = phone_customers[0] if phone_customers else None
+    
+    if customer:
+        customer_id = customer["id"]
+        current_platform_id = customer["line_user_id"] or ""
         
-        # Step 3: Create new customer with proper platform ID (V2 schema)
-        customer_data = {
-            "display_name": name,
-            "phone": phone,
-            "line_user_id": platform_id,  # Keep for backward compatibility
-            "platform_type": platform,  # V2 field
-            "merged_from": [],  # V2 field
-            "lifetime_value": 0.00,  # V2 field
-            "tags": [],  # V2 field
-            "metadata": {},  # V2 field
-            "total_orders": 0,  # Default value
-            "total_spent": 0.00  # Default value
-        }
-        
-        print(f"📝 Creating new customer: {customer_data}")
-        customer_result = await supabase_request("POST", "customers", customer_data)
-        
-        # Handle Supabase response patterns
-        if not customer_result or len(customer_result) == 0:
-            print("🔄 Customer created but no ID returned, fetching...")
-            fetch_query = f"customers?line_user_id=eq.{platform_id}&select=id&limit=1"
-            fetch_result = await supabase_request("GET", fetch_query, use_service_key=False)
-            if fetch_result and len(fetch_result) > 0:
-                customer_id = fetch_result[0]["id"]
-                print(f"✅ Fetched new customer ID: {customer_id}")
-                return customer_id
+        # Update platform ID if it's generic web ID and we have better info
+        if current_platform_id.startswith("WEB_") and len(current_platform_id) < 15 and platform != "WEB":
+            update_data = {"line_user_id": platform_id, "display_name": name}
+            await supabase_request("PATCH", f"customers?id=eq.{customer_id}", update_data)
+            customer = {**customer, "line_user_id": platform_id}  # shared GET result - copy, never mutate
+            logger.info("✅ Updated customer %s platform ID: %s → %s", customer_id, current_platform_id, platform_id)
         else:
-            customer_id = customer_result[0]["id"]
-            print(f"✅ Customer created with ID: {customer_id}")
+            logger.debug("✅ Found existing customer by phone: %s (%s)", customer_id, current_platform_id)
+        customer_cache.put(customer)
+        return customer_id
+    
+    # Step 3: Create new customer with proper platform ID (V2 schema)
+    customer_data = {
+        "display_name": name,
+        "phone": phone,
+        "line_user_id": platform_id,  # Keep for backward compatibility
+        "platform_type": platform,  # V2 field
+        "merged_from": [],  # V2 field
+        "lifetime_value": 0.00,  # V2 field
+        "tags": [],  # V2 field
+        "metadata": {},  # V2 field
+        "total_orders": 0,  # Default value
+        "total_spent": 0.00  # Default value
+    }
+    
+    logger.debug("📝 Creating new customer: %s", customer_data)
+    customer_result = await supabase_request("POST", "customers", customer_data)
+    
+    # Handle Supabase response patterns
+    if not customer_result or len(customer_result) == 0:
+        logger.warning("🔄 Customer created but no ID returned, fetching...")
+        fetch_query = f"customers?line_user_id=eq.{platform_id}&select=id&limit=1"
+        fetch_result = await supabase_request("GET", fetch_query, use_service_key=False)
+        if fetch_result and len(fetch_result) > 0:
+            customer_id = fetch_result[0]["id"]
+            logger.info("✅ Fetched new customer ID: %s", customer_id)
+            customer_cache.put({"id": customer_id, "phone": phone, "line_user_id": platform_id})
             return customer_id
-            
-        raise Exception("Failed to create or retrieve customer")
-        
-    except Exception as e:
-        print(f"❌ Customer operation error: {e}")
-        raise HTTPException(status_code=500, detail=f"Customer operation failed: {str(e)}")
\ No newline at end of file
+    else:
+        customer_id = customer_result[0]["id"]
+        logger.info("✅ Customer created with ID: %s (%s)", customer_id, platform)
+        customer_cache.put(customer_result[0])
+        return customer_id
+    
+    raise Exception("Failed to create or retrieve customer")
\ No newline at end of file
@@ -11,6 +11,12 @@ from typing import Dict, List, Optional, Any, Union
 from pytz import timezone
 
 from services.database_service import supabase_request
+from services.query_builder import Query, template
+from services.order_status import change_order_status
+from services.write_journal import write_journal
+from services.logger import get_logger
+
+logger = get_logger(__name__)
 
 class DatabaseV2Service:
     """Database service with dual-write capability for migration"""
@@ -26,7 +32,7 @@ class DatabaseV2Service:
         if mode not in valid_modes:
             raise ValueError(f"Invalid mode: {mode}. Must be one of: {valid_modes}")
         self.migration_mode = mode
-        print(f"🔄 Database migration mode set to: {mode}")
+        logger.info("🔄 Database migration mode set to: %s", mode)
     
     async def create_customer_v2(self, customer_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create customer with V2 enhancements"""
@@ -51,7 +57,7 @@ class DatabaseV2Service:
                 result_v2 = await self._create_customer_v2_enhanced(enhanced_data)
                 return result_v1  # Return V1 for compatibility
             except Exception as e:
-                print(f"⚠️ V2 customer create failed: {e}")
+                logger.warning("⚠️ V2 customer create failed: %s", e)
                 return result_v1  # Fallback to V1
         else:  # v2_only
             return await self._create_customer_v2_enhanced(enhanced_data)
@@ -90,7 +96,7 @@ class DatabaseV2Service:
                 result_v2 = await self._create_order_v2_enhanced(enhanced_data)
                 return result_v1
             except Exception as e:
-                print(f"⚠️ V2 order create failed: {e}")
+                logger.warning("⚠️ V2 order create failed: %s", e)
                 return result_v1
         else:  # v2_only
             result = await self._create_order_v2_enhanced(enhanced_data)
@@ -111,16 +117,7 @@ class DatabaseV2Service:
                                    reason: Optional[str] = None) -> Dict[str, Any]:
         """Update order status with V2 audit trail"""
         
-        # Get current order first
-        orders = await supabase_request("GET", f"orders?order_number=eq.{order_number}&limit=1")
-        if not orders:
-            raise Exception(f"Order {order_number} not found")
-        
-        current_order = orders[0]
-        old_status = current_order.get("status")
-        
         update_data = {
-            "status": new_status,
             "updated_at": datetime.now(self.thailand_tz).isoformat()
         }
         
@@ -132,10 +129,15 @@ class DatabaseV2Service:
         if new_status == "cancelled" and reason:
             update_data["cancelled_reason"] = reason
         
-        if self.migration_mode == 'v1_only':
-            result = await supabase_request("PATCH", f"orders?order_number=eq.{order_number}", update_data)
-        elif self.migration_mode == 'dual_write':
-            result = await supabase_request("PATCH", f"orders?order_number=eq.{order_number}", update_data)
+        # Compare-and-set: current_order is the row as it was right before this change
+        transition = await change_order_status(order_number, new_status, update_data)
+        if transition is None:
+            raise Exception(f"Order {order_number} not found")
+        current_order, updated_order = transition
+        old_status = current_order.get("status")
+        result = [updated_order]
+        
+        if self.migration_mode == 'dual_write':
             try:
                 # Create audit trail
                 await self._create_order_status_history(
@@ -151,9 +153,8 @@ class DatabaseV2Service:
                         {"old_status": old_status, "new_status": new_status, "reason": reason}
                     )
             except Exception as e:
-                print(f"⚠️ V2 audit logging failed: {e}")
-        else:  # v2_only
-            result = await supabase_request("PATCH", f"orders?order_number=eq.{order_number}", update_data)
+                logger.warning("⚠️ V2 audit logging failed: %s", e)
+        elif self.migration_mode == 'v2_only':
             await self._create_order_status_history(
                 current_order, new_status,
                 f"Status changed from {old_status} to {new_status}",
@@ -171,41 +172,40 @@ class DatabaseV2Service:
     async def _create_order_status_history(self, order: Dict[str, Any], new_status: str, 
                                          description: str, staff_id: Optional[str] = None,
                                          notes: Optional[str] = None):
-        """Create order status history record"""
+        """Create order status history record (journaled - written to Supabase in the background)"""
         history_data = {
             "order_id": order["id"],
             "old_status": order.get("status"),
             "new_status": new_status,
             "changed_by": staff_id or "system",
-            "description": description,
-            "notes": notes,
+            "reason": notes,
+            "metadata": {"description": description},
             "created_at": datetime.now(self.thailand_tz).isoformat()
         }
         
         try:
-            await supabase_request("POST", "order_status_history", history_data)
+            write_journal.insert("order_status_history", history_data)
         except Exception as e:
-            print(f"⚠️ Failed to create status history: {e}")
+            logger.warning("⚠️ Failed to create status history: %s", e)
     
     async def _log_staff_action(self, staff_id: str, action_type: str, target_type: str,
                                target_id: str, description: str, metadata: Dict[str, Any]):
-        """Log staff action for security audit"""
+        """Log staff action for security audit (journaled - written to Supabase in the background)"""
         action_data = {
             "staff_id": staff_id,
-            "action_type": action_type,
+            "action": action_type,
             "target_type": target_type,
             "target_id": target_id,
-            "description": description,
-            "metadata": metadata,
+            "details": {"description": description, **metadata},
             "ip_address": None,  # Would be filled from request context
             "user_agent": None,  # Would be filled from request context
             "created_at": datetime.now(self.thailand_tz).isoformat()
         }
         
         try:
-            await supabase_request("POST", "staff_actions", action_data)
+            write_journal.insert("staff_actions", action_data)
         except Exception as e:
-            print(f"⚠️ Failed to log staff action: {e}")
+            logger.warning("⚠️ Failed to log staff action: %s", e)
     
     def _calculate_net_amount(self, order_data: Dict[str, Any]) -> float:
         """Calculate net amount for order"""
@@ -220,7 +220,7 @@ class DatabaseV2Service:
         """Create payment transaction (V2 feature)"""
         if self.migration_mode == 'v1_only':
             # V1 doesn't support payment transactions
-            print("⚠️ Payment transactions not supported in V1 mode")
+            logger.warning("⚠️ Payment transactions not supported in V1 mode")
             return {}
         
         enhanced_data = {
@@ -237,18 +237,12 @@ class DatabaseV2Service:
         """Get order with status history (V2 feature)"""
         if self.migration_mode == 'v1_only':
             # Fallback to V1 without history
-            orders = await supabase_request("GET", f"orders?order_number=eq.{order_number}&limit=1")
-            if orders:
-                return orders[0]
-            return {}
+            order = await Query("orders").eq("order_number", order_number).first()
+            return order or {}
         
         # Get order with full history
-        order_query = f"orders?order_number=eq.{order_number}&select=*,order_items(*),order_status_history(*)&limit=1"
-        orders = await supabase_request("GET", order_query, use_service_key=False)
-        
-        if orders:
-            return orders[0]
-        return {}
+        order = await template("order_with_history", order_number).first(use_service_key=False)
+        return order or {}
 
 # Global instance
 db_v2 = DatabaseV2Service()
\ No newline at end of file
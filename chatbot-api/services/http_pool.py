@@ -0,0 +1,145 @@
+"""
+HTTP pool service - Shared httpx client for Supabase REST calls
+One keep-alive client per worker, opened and closed by the FastAPI lifespan
+"""
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlencode
+import httpx
+from services.logger import get_logger
+from modules.config import (
+    SUPABASE_HTTP2, SUPABASE_MAX_CONNECTIONS, SUPABASE_MAX_KEEPALIVE,
+    SUPABASE_KEEPALIVE_EXPIRY, SUPABASE_TIMEOUT, SUPABASE_CONNECT_TIMEOUT,
+    SUPABASE_TABLE_TIMEOUTS
+)
+
+try:
+    import h2  # noqa: F401 - required by httpx for HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = get_logger(__name__)
+
+_client: Optional[httpx.AsyncClient] = None
+
+_stats = {
+    "clients_created": 0,
+    "requests": 0,
+    "errors": 0,
+    "in_flight": 0,
+    "peak_in_flight": 0,
+}
+
+
+def endpoint_table(endpoint: str) -> str:
+    """Extract table name from a REST endpoint ("orders?id=eq.1" -> "orders")"""
+    return endpoint.split("?", 1)[0].strip("/")
+
+
+def normalize_endpoint(endpoint: str) -> str:
+    """Canonical form of an endpoint - query params sorted so equivalent reads share a key"""
+    table, _, query = endpoint.partition("?")
+    if not query:
+        return table.strip("/")
+    params = sorted(parse_qsl(query, keep_blank_values=True))
+    return f"{table.strip('/')}?{urlencode(params, safe='*,().:!')}"
+
+
+def get_table_timeout(endpoint: str) -> httpx.Timeout:
+    """Timeout for a request, using the per-table override when configured"""
+    read_timeout = SUPABASE_TABLE_TIMEOUTS.get(endpoint_table(endpoint), SUPABASE_TIMEOUT)
+    return httpx.Timeout(read_timeout, connect=min(SUPABASE_CONNECT_TIMEOUT, read_timeout))
+
+
+def _build_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    """Create the pooled client from config"""
+    use_http2 = SUPABASE_HTTP2 and HTTP2_AVAILABLE
+    if SUPABASE_HTTP2 and not HTTP2_AVAILABLE:
+        logger.warning("⚠️ SUPABASE_HTTP2 enabled but h2 is not installed - using HTTP/1.1")
+
+    limits = httpx.Limits(
+        max_connections=SUPABASE_MAX_CONNECTIONS,
+        max_keepalive_connections=SUPABASE_MAX_KEEPALIVE,
+        keepalive_expiry=SUPABASE_KEEPALIVE_EXPIRY
+    )
+    _stats["clients_created"] += 1
+    return httpx.AsyncClient(
+        http2=use_http2,
+        limits=limits,
+        timeout=httpx.Timeout(SUPABASE_TIMEOUT, connect=SUPABASE_CONNECT_TIMEOUT),
+        transport=transport
+    )
+
+
+async def init_http_pool(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    """Open the shared client (called from the app lifespan)"""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = _build_client(transport)
+    logger.info("🔌 Supabase HTTP pool ready (max=%d, keepalive=%d, http2=%s)",
+                SUPABASE_MAX_CONNECTIONS, SUPABASE_MAX_KEEPALIVE, SUPABASE_HTTP2 and HTTP2_AVAILABLE)
+    return _client
+
+
+async def close_http_pool():
+    """Close the shared client and release pooled connections"""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+        logger.info("🔌 Supabase HTTP pool closed")
+    _client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it lazily outside the app lifespan (scripts, tests)"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+@asynccontextmanager
+async def track_request():
+    """Count in-flight requests for pool usage stats"""
+    _stats["requests"] += 1
+    _stats["in_flight"] += 1
+    _stats["peak_in_flight"] = max(_stats["peak_in_flight"], _stats["in_flight"])
+    try:
+        yield
+    except Exception:
+        _stats["errors"] += 1
+        raise
+    finally:
+        _stats["in_flight"] -= 1
+
+
+def _connection_stats() -> Dict[str, int]:
+    """Inspect the underlying httpcore pool (best effort - private API)"""
+    pool = getattr(getattr(_client, "_transport", None), "_pool", None)
+    connections = getattr(pool, "connections", None)
+    if connections is None:
+        return {}
+
+    idle = sum(1 for conn in connections if conn.is_idle())
+    return {
+        "open_connections": len(connections),
+        "idle_connections": idle,
+        "active_connections": len(connections) - idle,
+    }
+
+
+def get_pool_stats() -> Dict:
+    """Pool configuration and usage counters"""
+    return {
+        "initialized": _client is not None and not _client.is_closed,
+        "http2": SUPABASE_HTTP2 and HTTP2_AVAILABLE,
+        "max_connections": SUPABASE_MAX_CONNECTIONS,
+        "max_keepalive_connections": SUPABASE_MAX_KEEPALIVE,
+        "keepalive_expiry": SUPABASE_KEEPALIVE_EXPIRY,
+        "default_timeout": SUPABASE_TIMEOUT,
+        "table_timeouts": SUPABASE_TABLE_TIMEOUTS,
+        **_stats,
+        **_connection_stats(),
+    }
@@ -0,0 +1,107 @@
+"""
+Idempotency service - Idempotency-Key handling for non-idempotent POSTs
+The first request with a key runs; retries join it while it is in flight and get its stored
+result afterwards (LRU + TTL bounded, per process)
+"""
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+from modules.config import IDEMPOTENCY_MAX_ENTRIES, IDEMPOTENCY_TTL
+
+MAX_KEY_LENGTH = 255
+
+
+def request_fingerprint(body: bytes) -> str:
+    """Same key + different body is a client bug, not a retry"""
+    return hashlib.sha256(body).hexdigest()
+
+
+def validate_key(key: str) -> str:
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH or not key.isprintable():
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} printable characters")
+    return key
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "task", "expires_at")
+
+    def __init__(self, fingerprint: str, task: asyncio.Future):
+        self.fingerprint = fingerprint
+        self.task = task
+        self.expires_at: Optional[float] = None  # set once the task finishes
+
+
+class IdempotencyStore:
+    """Key -> in-flight task or finished result; 5xx/unexpected failures are forgotten so a retry can run"""
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 86400.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.stats = {"executed": 0, "joined": 0, "replayed": 0, "conflicts": 0,
+                      "failures_forgotten": 0, "evictions": 0, "expirations": 0}
+
+    async def run(self, key: str, fingerprint: str, handler: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Return (result, replayed); replayed is True when another request with this key did the work"""
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at is not None and entry.expires_at <= time.monotonic():
+            self._entries.pop(key)
+            self.stats["expirations"] += 1
+            entry = None
+
+        if entry is not None:
+            if entry.fingerprint != fingerprint:
+                self.stats["conflicts"] += 1
+                raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+            self._entries.move_to_end(key)
+            self.stats["replayed" if entry.task.done() else "joined"] += 1
+            return await asyncio.shield(entry.task), True
+
+        # Own task: a client that disconnects mid-request doesn't cancel the work its retry will wait for
+        task = asyncio.ensure_future(handler())
+        entry = _Entry(fingerprint, task)
+        self._entries[key] = entry
+        task.add_done_callback(lambda done: self._finish(key, entry, done))
+        self.stats["executed"] += 1
+        self._evict()
+        return await asyncio.shield(task), False
+
+    def _finish(self, key: str, entry: _Entry, task: asyncio.Future):
+        error = None if task.cancelled() else task.exception()
+        keep = not task.cancelled() and (
+            error is None or (isinstance(error, HTTPException) and error.status_code < 500))
+        if keep:
+            # Successes and client errors (4xx) replay as-is
+            entry.expires_at = time.monotonic() + self.ttl
+        elif self._entries.get(key) is entry:
+            del self._entries[key]
+            self.stats["failures_forgotten"] += 1
+
+    def _evict(self):
+        """Drop least recently used finished entries; in-flight ones are never evicted"""
+        while len(self._entries) > self.max_entries:
+            victim = next((key for key, entry in self._entries.items() if entry.task.done()), None)
+            if victim is None:
+                break
+            del self._entries[victim]
+            self.stats["evictions"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        in_flight = sum(1 for entry in self._entries.values() if not entry.task.done())
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "in_flight": in_flight,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+        }
+
+
+# Global instance
+idempotency_store = IdempotencyStore(IDEMPOTENCY_MAX_ENTRIES, IDEMPOTENCY_TTL)
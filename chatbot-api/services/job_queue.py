@@ -0,0 +1,277 @@
+"""
+Job queue - Durable background jobs (replaces FastAPI BackgroundTasks for notifications)
+Jobs are committed to local SQLite before the request returns, run by a bounded pool with a
+concurrency limit per job type, retried with backoff and parked as dead letters when they keep failing
+"""
+import asyncio
+import random
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from modules.config import (
+    JOB_QUEUE_PATH, JOB_QUEUE_SYNC, JOB_QUEUE_POLL_INTERVAL, JOB_CONCURRENCY, JOB_DEFAULT_CONCURRENCY,
+    JOB_MAX_ATTEMPTS, JOB_RETRY_BASE_DELAY, JOB_RETRY_MAX_DELAY
+)
+from services.json_codec import dumps, loads
+from services.logger import get_logger
+from services.metrics import LatencySeries
+from services.write_journal import SYNC_MODES, open_local_db
+
+logger = get_logger(__name__)
+
+# A running job whose worker died (crash, kill -9) becomes claimable again after this long
+LEASE_SECONDS = 300.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    run_at REAL NOT NULL,
+    lease_until REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_due ON jobs (type, status, run_at);
+"""
+
+# handler(payload, job_id) - raise to retry; job_id is stable across retries (use it as a dedupe key)
+JobHandler = Callable[[Dict[str, Any], str], Awaitable[Any]]
+
+
+class _JobType:
+    __slots__ = ("handler", "concurrency", "max_attempts", "running", "wait", "run")
+
+    def __init__(self, handler: JobHandler, concurrency: int, max_attempts: int):
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.running = 0
+        self.wait = LatencySeries()  # enqueue -> first start
+        self.run = LatencySeries()   # handler duration of successful runs
+
+
+class JobQueue:
+    """SQLite-backed queue; each worker process runs at most `concurrency` jobs of a type at once"""
+
+    def __init__(self, path: str = ":memory:", sync: str = "NORMAL", poll_interval: float = 1.0,
+                 concurrency: Optional[Dict[str, int]] = None, default_concurrency: int = 4,
+                 max_attempts: int = 8, retry_base_delay: float = 2.0, retry_max_delay: float = 600.0):
+        if sync not in SYNC_MODES:
+            raise ValueError(f"Job queue sync mode must be one of {SYNC_MODES}, got {sync!r}")
+        self.path = path
+        self.sync = sync
+        self.poll_interval = poll_interval
+        self.concurrency = concurrency or {}
+        self.default_concurrency = default_concurrency
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self._db = None
+        self._types: Dict[str, _JobType] = {}
+        self._running: Set[asyncio.Task] = set()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"enqueued": 0, "started": 0, "succeeded": 0, "retried": 0, "dead": 0,
+                      "requeued_on_shutdown": 0}
+
+    @property
+    def db(self):
+        if self._db is None:
+            self._db = open_local_db(self.path, self.sync, SCHEMA)
+        return self._db
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    # ---------- producing ----------
+
+    def register(self, job_type: str, handler: JobHandler, concurrency: Optional[int] = None,
+                 max_attempts: Optional[int] = None):
+        self._types[job_type] = _JobType(
+            handler,
+            concurrency or self.concurrency.get(job_type, self.default_concurrency),
+            max_attempts or self.max_attempts,
+        )
+
+    def enqueue(self, job_type: str, payload: Dict[str, Any], delay: float = 0.0) -> str:
+        """Durably queue a job (local SQLite commit); returns its id"""
+        if job_type not in self._types:
+            raise KeyError(f"No job handler registered for {job_type!r}")
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        self.db.execute("INSERT INTO jobs (id, type, payload, enqueued_at, run_at) VALUES (?, ?, ?, ?, ?)",
+                        (job_id, job_type, dumps(payload).decode("utf-8"), now, now + delay))
+        self.stats["enqueued"] += 1
+        if self._wake is not None:
+            self._wake.set()
+        return job_id
+
+    # ---------- running ----------
+
+    def _claim(self, job_type: str, limit: int) -> List[tuple]:
+        now = time.time()
+        db = self.db
+        db.execute("BEGIN IMMEDIATE")  # other worker processes sharing the file wait here
+        try:
+            rows = db.execute(
+                "SELECT id, payload, attempts, enqueued_at FROM jobs WHERE type = ?"
+                " AND ((status = 'queued' AND run_at <= ?) OR (status = 'running' AND lease_until < ?))"
+                " ORDER BY run_at LIMIT ?", (job_type, now, now, limit)).fetchall()
+            if rows:
+                db.executemany("UPDATE jobs SET status = 'running', lease_until = ? WHERE id = ?",
+                               [(now + LEASE_SECONDS, row[0]) for row in rows])
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return rows
+
+    async def run_due(self) -> int:
+        """Start every due job that fits in its type's free slots; returns how many were started"""
+        started = 0
+        for job_type, spec in self._types.items():
+            free = spec.concurrency - spec.running
+            if free <= 0:
+                continue
+            for job_id, payload, attempts, enqueued_at in self._claim(job_type, free):
+                spec.running += 1
+                task = asyncio.create_task(self._execute(job_type, spec, job_id, loads(payload), attempts, enqueued_at))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+                started += 1
+        self.stats["started"] += started
+        return started
+
+    def _retry_delay(self, attempts: int) -> float:
+        delay = min(self.retry_base_delay * (2 ** (attempts - 1)), self.retry_max_delay)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _execute(self, job_type: str, spec: _JobType, job_id: str, payload: Dict[str, Any],
+                       attempts: int, enqueued_at: float):
+        start = time.time()
+        if attempts == 0:
+            spec.wait.add((start - enqueued_at) * 1000)
+        try:
+            await spec.handler(payload, job_id)
+        except asyncio.CancelledError:
+            # Shutdown: not the job's fault - back in the queue for the next start, attempt not counted
+            self.db.execute("UPDATE jobs SET status = 'queued', lease_until = NULL WHERE id = ?", (job_id,))
+            self.stats["requeued_on_shutdown"] += 1
+            raise
+        except Exception as e:
+            attempts += 1
+            error = str(getattr(e, "detail", e))[:500] or type(e).__name__
+            if attempts >= spec.max_attempts:
+                self.db.execute("UPDATE jobs SET status = 'dead', attempts = ?, lease_until = NULL,"
+                                " last_error = ? WHERE id = ?", (attempts, error, job_id))
+                self.stats["dead"] += 1
+                logger.error("❌ Job %s %s failed %d times, moved to dead letters: %s", job_type, job_id, attempts, error)
+            else:
+                delay = self._retry_delay(attempts)
+                self.db.execute("UPDATE jobs SET status = 'queued', attempts = ?, run_at = ?, lease_until = NULL,"
+                                " last_error = ? WHERE id = ?", (attempts, time.time() + delay, error, job_id))
+                self.stats["retried"] += 1
+                logger.warning("⚠️ Job %s %s failed (attempt %d), retrying in %.1fs: %s",
+                               job_type, job_id, attempts, delay, error)
+        else:
+            self.db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            spec.run.add((time.time() - start) * 1000)
+            self.stats["succeeded"] += 1
+        finally:
+            spec.running -= 1
+            if self._wake is not None:
+                self._wake.set()  # a slot is free
+
+    async def drain(self, timeout: Optional[float] = None):
+        """Wait for the jobs that are currently running"""
+        if self._running:
+            await asyncio.wait(set(self._running), timeout=timeout)
+
+    # ---------- background task ----------
+
+    def start(self):
+        """Start the dispatcher (app lifespan); jobs left queued by a previous run go first"""
+        if self._task is not None:
+            return
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._dispatch())
+        logger.info("🧵 Job queue started (%s, concurrency %s)", self.path,
+                    {job_type: spec.concurrency for job_type, spec in self._types.items()})
+
+    async def _dispatch(self):
+        while True:
+            try:
+                await self.run_due()
+            except Exception as e:
+                logger.exception("❌ Job dispatcher error: %s", e)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def stop(self, timeout: float = 10.0):
+        """Stop dispatching, give running jobs `timeout` seconds, requeue the rest"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wake = None
+        await self.drain(timeout)
+        for task in list(self._running):
+            task.cancel()
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+
+    # ---------- inspection ----------
+
+    def dead_letters(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Dead jobs without their payloads (names, phones, LINE ids) - only the order number to find them by"""
+        rows = self.db.execute("SELECT id, type, json_extract(payload, '$.order_number'), attempts, enqueued_at,"
+                               " run_at, last_error FROM jobs WHERE status = 'dead'"
+                               " ORDER BY enqueued_at DESC LIMIT ?", (limit,)).fetchall()
+        return [{"id": job_id, "type": job_type, "order_number": order_number, "attempts": attempts,
+                 "enqueued_at": enqueued_at, "last_attempt_at": run_at, "last_error": last_error}
+                for job_id, job_type, order_number, attempts, enqueued_at, run_at, last_error in rows]
+
+    def retry(self, job_id: str) -> bool:
+        """Put a dead job back in the queue with a fresh attempt budget"""
+        cursor = self.db.execute("UPDATE jobs SET status = 'queued', attempts = 0, run_at = ?, last_error = NULL"
+                                 " WHERE id = ? AND status = 'dead'", (time.time(), job_id))
+        if cursor.rowcount and self._wake is not None:
+            self._wake.set()
+        return bool(cursor.rowcount)
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.time()
+        types: Dict[str, Dict[str, Any]] = {}
+        for job_type, spec in self._types.items():
+            types[job_type] = {"queued": 0, "running_here": spec.running, "dead": 0,
+                               "concurrency": spec.concurrency, "oldest_queued_seconds": 0.0,
+                               "wait": spec.wait.snapshot(), "run": spec.run.snapshot()}
+        for job_type, status, count, oldest in self.db.execute(
+                "SELECT type, status, COUNT(*), MIN(enqueued_at) FROM jobs GROUP BY type, status"):
+            entry = types.setdefault(job_type, {"queued": 0, "dead": 0})
+            entry[status] = count
+            if status == "queued":
+                entry["oldest_queued_seconds"] = round(now - oldest, 1)
+        return {
+            **self.stats,
+            "path": self.path,
+            "running": self._task is not None,
+            "types": types,
+        }
+
+
+# Global instance
+job_queue = JobQueue(JOB_QUEUE_PATH, JOB_QUEUE_SYNC, JOB_QUEUE_POLL_INTERVAL, JOB_CONCURRENCY, JOB_DEFAULT_CONCURRENCY,
+                     JOB_MAX_ATTEMPTS, JOB_RETRY_BASE_DELAY, JOB_RETRY_MAX_DELAY)
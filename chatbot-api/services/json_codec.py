@@ -0,0 +1,45 @@
+"""
+JSON codec - orjson when installed, stdlib json otherwise
+Used for request bodies, Supabase payloads and FastAPI responses
+"""
+import json
+from typing import Any, Union
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers catch this one
+JSONDecodeError = json.JSONDecodeError
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Decode JSON bytes/str"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode to compact UTF-8 JSON bytes (non-ASCII kept as-is, like ensure_ascii=False)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+async def read_json(request: Request) -> Any:
+    """Parse a request body without Starlette's stdlib decode"""
+    return loads(await request.body())
+
+
+class FastJSONResponse(JSONResponse):
+    """Default response class - same output as JSONResponse, encoded by orjson when available"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
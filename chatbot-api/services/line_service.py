@@ -5,15 +5,18 @@ Independent functions for LINE messaging
 import hashlib
 import hmac
 import base64
-from typing import List, Dict
+from typing import List, Dict, Optional
 import httpx
 from modules.config import LINE_CHANNEL_ACCESS_TOKEN, LINE_CHANNEL_SECRET
+from services.logger import get_logger
+
+logger = get_logger(__name__)
 
 async def send_line_message(reply_token: str, messages: List[Dict]):
     """Send reply message to LINE with enhanced error handling"""
     try:
         if not LINE_CHANNEL_ACCESS_TOKEN:
-            print("❌ LINE_CHANNEL_ACCESS_TOKEN not set")
+            logger.error("❌ LINE_CHANNEL_ACCESS_TOKEN not set")
             return False
         
         headers = {
@@ -26,7 +29,7 @@ async def send_line_message(reply_token: str, messages: List[Dict]):
             "messages": messages
         }
         
-        print(f"📤 Sending LINE message: {len(messages)} message(s)")
+        logger.debug("📤 Sending LINE message: %s message(s)", len(messages))
         
         async with httpx.AsyncClient(timeout=15.0) as client:
             response = await client.post(
@@ -36,25 +39,27 @@ async def send_line_message(reply_token: str, messages: List[Dict]):
             )
             
         if response.status_code == 200:
-            print("✅ LINE message sent successfully")
+            logger.debug("✅ LINE message sent successfully")
             return True
         else:
-            print(f"❌ LINE reply error: {response.status_code}")
-            print(f"   Response: {response.text}")
+            logger.error("❌ LINE reply error: %s - %.300s", response.status_code, response.text)
             return False
             
     except httpx.TimeoutException:
-        print("❌ LINE API timeout")
+        logger.error("❌ LINE API timeout")
         return False
     except Exception as e:
-        print(f"❌ Error sending LINE message: {e}")
+        logger.error("❌ Error sending LINE message: %s", e)
         return False
 
-async def send_line_push_message(user_id: str, messages: List[Dict]):
-    """Send push message to specific LINE user (for order confirmation)"""
+async def send_line_push_message(user_id: str, messages: List[Dict], retry_key: Optional[str] = None):
+    """Send push message to specific LINE user (for order confirmation)
+
+    retry_key (a UUID, same on every retry) makes LINE deliver the push at most once.
+    """
     try:
         if not LINE_CHANNEL_ACCESS_TOKEN:
-            print("❌ LINE_CHANNEL_ACCESS_TOKEN not set")
+            logger.error("❌ LINE_CHANNEL_ACCESS_TOKEN not set")
             return False
         
         # Remove LINE_ prefix if present
@@ -64,13 +69,15 @@ async def send_line_push_message(user_id: str, messages: List[Dict]):
             "Authorization": f"Bearer {LINE_CHANNEL_ACCESS_TOKEN}",
             "Content-Type": "application/json"
         }
+        if retry_key:
+            headers["X-Line-Retry-Key"] = retry_key
         
         payload = {
             "to": clean_user_id,
             "messages": messages
         }
         
-        print(f"📤 Sending LINE push to {clean_user_id}: {len(messages)} message(s)")
+        logger.debug("📤 Sending LINE push to %s: %s message(s)", clean_user_id, len(messages))
         
         async with httpx.AsyncClient(timeout=15.0) as client:
             response = await client.post(
@@ -80,18 +87,21 @@ async def send_line_push_message(user_id: str, messages: List[Dict]):
             )
             
         if response.status_code == 200:
-            print("✅ LINE push message sent successfully")
+            logger.debug("✅ LINE push message sent successfully")
+            return True
+        elif response.status_code == 409 and retry_key:
+            # An earlier attempt with this retry key was already accepted
+            logger.debug("✅ LINE push already accepted (retry key %s)", retry_key)
             return True
         else:
-            print(f"❌ LINE push error: {response.status_code}")
-            print(f"   Response: {response.text}")
+            logger.error("❌ LINE push error: %s - %.300s", response.status_code, response.text)
             return False
             
     except httpx.TimeoutException:
-        print("❌ LINE push API timeout")
+        logger.error("❌ LINE push API timeout")
         return False
     except Exception as e:
-        print(f"❌ Error sending LINE push: {e}")
+        logger.error("❌ Error sending LINE push: %s", e)
         return False
 
 def verify_line_signature(body: bytes, signature: str) -> bool:
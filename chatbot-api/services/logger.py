@@ -0,0 +1,178 @@
+"""
+Logger service - Queue-based structured logging
+Handlers only enqueue records; a background thread formats, redacts and writes them
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+from typing import Any, Dict, Optional
+
+from modules.config import (
+    LOG_LEVEL, LOG_FORMAT, LOG_QUEUE_SIZE, LOG_SAMPLING,
+    SUPABASE_SERVICE_KEY, SUPABASE_ANON_KEY, LINE_CHANNEL_ACCESS_TOKEN,
+    LINE_CHANNEL_SECRET, OPENROUTER_API_KEY
+)
+
+# Chatty third-party loggers (httpx logs every request at INFO)
+QUIET_LOGGERS = ("httpx", "httpcore", "hpack")
+
+# Attributes every LogRecord has - anything else came in through extra= and is a structured field
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_SECRET_PATTERNS = [
+    re.compile(r"(Bearer\s+)[A-Za-z0-9._~+/=-]+"),
+    re.compile(r"""((?:apikey|api_key|authorization|access_token|password)['"]?\s*[:=]\s*['"]?)[^'"\s,}]+""", re.I),
+]
+_SECRET_VALUES = [value for value in (
+    SUPABASE_SERVICE_KEY, SUPABASE_ANON_KEY, LINE_CHANNEL_ACCESS_TOKEN, LINE_CHANNEL_SECRET, OPENROUTER_API_KEY
+) if value and len(value) >= 8]
+
+_stats = {"enqueued": 0, "dropped": 0, "sampled_out": 0}
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def redact(text: str) -> str:
+    """Mask configured secrets, bearer tokens and apikey-style key/value pairs"""
+    for value in _SECRET_VALUES:
+        if value in text:
+            text = text.replace(value, "***")
+    for pattern in _SECRET_PATTERNS:
+        text = pattern.sub(r"\1***", text)
+    return text
+
+
+def _fields(record: logging.LogRecord) -> Dict[str, Any]:
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS}
+
+
+class TextFormatter(logging.Formatter):
+    """time LEVEL logger: message key=value ..."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = _fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return redact(line)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **_fields(record),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return redact(json.dumps(entry, ensure_ascii=False, default=str))
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of DEBUG/INFO records per module (longest matching logger prefix wins)"""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: Dict[str, float] = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            matches = [prefix for prefix in self.rates if name == prefix or name.startswith(prefix + ".")]
+            rate = self.rates[max(matches, key=len)] if matches else 1.0
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        _stats["sampled_out"] += 1
+        return False
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands the raw record to the writer thread; drops (and counts) when the queue is full"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Message formatting is deferred to the listener thread (lazy %-args)
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+            _stats["enqueued"] += 1
+        except queue.Full:
+            _stats["dropped"] += 1
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Module logger - use %-style args so disabled levels cost nothing: logger.debug("x=%s", x)"""
+    return logging.getLogger(name)
+
+
+def setup_logging(stream=None) -> logging.handlers.QueueListener:
+    """Install the queue handler on the root logger and start the writer thread (idempotent)"""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+
+    handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    if LOG_SAMPLING:
+        handler.addFilter(SamplingFilter(LOG_SAMPLING))
+
+    root = logging.getLogger()
+    root.handlers = [h for h in root.handlers if not isinstance(h, NonBlockingQueueHandler)]
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(handler.queue, output)
+    _listener.start()
+    atexit.unregister(shutdown_logging)
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+    for handler in logging.getLogger().handlers[:]:
+        if isinstance(handler, NonBlockingQueueHandler):
+            logging.getLogger().removeHandler(handler)
+
+
+def get_logging_stats() -> Dict[str, Any]:
+    handler = next((h for h in logging.getLogger().handlers if isinstance(h, NonBlockingQueueHandler)), None)
+    return {
+        "level": logging.getLevelName(logging.getLogger().level),
+        "format": LOG_FORMAT,
+        "sampling": LOG_SAMPLING,
+        "queue_depth": handler.queue.qsize() if handler else 0,
+        "queue_size": LOG_QUEUE_SIZE,
+        "running": _listener is not None,
+        **_stats,
+    }
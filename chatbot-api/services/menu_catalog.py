@@ -0,0 +1,134 @@
+"""
+Menu catalog service - In-memory snapshot of active categories and available menus
+Built once per version (query cache generation of menus/categories) or TTL and kept as ready-to-send
+JSON + gzip bytes with a content-hash ETag, so GET /api/menu costs no database round trip
+"""
+import asyncio
+import gzip
+import hashlib
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from modules.config import MENU_CATALOG_TTL
+from services.json_codec import dumps
+from services.logger import get_logger
+from services.query_builder import Query
+from services.query_cache import query_cache
+
+logger = get_logger(__name__)
+
+CATALOG_TABLES = ("categories", "menus")
+
+
+class CatalogSnapshot:
+    """One immutable build: identity and gzip bodies plus their strong ETags"""
+    __slots__ = ("body", "gzip_body", "etag", "gzip_etag", "version", "built_at", "categories", "menus")
+
+    def __init__(self, categories: list, menus: list, version: Tuple[int, ...]):
+        self.categories = len(categories)
+        self.menus = len(menus)
+        self.version = version
+        self.built_at = time.monotonic()
+        self.body = dumps({"categories": categories, "menus": menus})
+        # Strong ETag = hash of the exact bytes, so a rebuild with unchanged rows keeps it
+        digest = hashlib.sha256(self.body).hexdigest()[:32]
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gzip"'  # another encoding is another representation
+        self.gzip_body = gzip.compress(self.body, compresslevel=9)
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """If-None-Match check (either encoding's tag names the same content)"""
+        if not if_none_match:
+            return False
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or self.etag in tags or self.gzip_etag in tags
+
+
+class MenuCatalog:
+    """Serves the latest snapshot; one request rebuilds it when the version moves or it expires"""
+
+    def __init__(self, ttl: float = 300.0):
+        self.ttl = ttl
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._building: Optional[asyncio.Task] = None
+        self.stats = {"hits": 0, "builds": 0, "version_bumps": 0, "expirations": 0, "build_errors": 0}
+
+    @staticmethod
+    def current_version() -> Tuple[int, ...]:
+        """Bumped by every write through supabase_request and by POST /api/cache/invalidate"""
+        return tuple(query_cache.generation(table)[0] for table in CATALOG_TABLES)
+
+    def _stale_reason(self, snapshot: Optional[CatalogSnapshot]) -> Optional[str]:
+        if snapshot is None:
+            return "empty"
+        if snapshot.version != self.current_version():
+            return "version_bumps"
+        if time.monotonic() - snapshot.built_at >= self.ttl:
+            return "expirations"
+        return None
+
+    async def get(self) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        reason = self._stale_reason(snapshot)
+        if reason is None:
+            self.stats["hits"] += 1
+            return snapshot
+
+        # Concurrent requests share one rebuild
+        if self._building is None:
+            self._building = asyncio.ensure_future(self._build(reason))
+            self._building.add_done_callback(self._built)
+        try:
+            return await asyncio.shield(self._building)
+        except Exception as e:
+            if snapshot is None:
+                raise
+            # Serve the previous menu rather than failing the page; the next request retries
+            logger.warning("⚠️ Menu catalog rebuild failed, serving previous snapshot: %s", e)
+            return snapshot
+
+    def _built(self, task: asyncio.Task):
+        self._building = None
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            self.stats["build_errors"] += 1
+        else:
+            self._snapshot = task.result()
+
+    async def _build(self, reason: str) -> CatalogSnapshot:
+        if reason != "empty":
+            self.stats[reason] += 1
+        if reason == "expirations":
+            # TTL refresh picks up dashboard edits, so skip reads cached before them
+            for table in CATALOG_TABLES:
+                query_cache.invalidate_table(table)
+        version = self.current_version()
+        categories, menus = await asyncio.gather(
+            Query("categories", "menu_catalog_categories").select("*").eq("is_active", True).order("name").fetch(),
+            Query("menus", "menu_catalog_menus").select("*", "categories(name)")
+            .eq("is_available", True).order("name").fetch(),
+        )
+        snapshot = CatalogSnapshot(categories, menus, version)
+        self.stats["builds"] += 1
+        logger.info("📋 Menu catalog built: %d categories, %d menus, %d bytes (%d gzip), ETag %s",
+                    snapshot.categories, snapshot.menus, len(snapshot.body), len(snapshot.gzip_body), snapshot.etag)
+        return snapshot
+
+    def get_stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        stats: Dict[str, Any] = {**self.stats, "ttl_seconds": self.ttl}
+        if snapshot is not None:
+            stats.update({
+                "etag": snapshot.etag,
+                "categories": snapshot.categories,
+                "menus": snapshot.menus,
+                "bytes": len(snapshot.body),
+                "gzip_bytes": len(snapshot.gzip_body),
+                "age_seconds": round(time.monotonic() - snapshot.built_at, 1),
+            })
+        return stats
+
+
+# Global instance
+menu_catalog = MenuCatalog(MENU_CATALOG_TTL)
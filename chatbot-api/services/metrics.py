@@ -0,0 +1,77 @@
+"""
+Metrics service - In-process latency recorders
+Lightweight counters/percentiles exposed through /health/metrics
+"""
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Tuple
+
+SAMPLE_SIZE = 256  # recent samples kept per series for percentiles
+
+
+class LatencySeries:
+    """Count, mean, max and recent-sample percentiles for one metric/label"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.samples: Deque[float] = deque(maxlen=SAMPLE_SIZE)
+
+    def add(self, elapsed_ms: float):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.samples.append(elapsed_ms)
+
+    def snapshot(self) -> Dict[str, float]:
+        ordered = sorted(self.samples)
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "p50_ms": round(ordered[len(ordered) // 2], 2) if ordered else 0.0,
+            "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2) if ordered else 0.0,
+            "max_ms": round(self.max_ms, 2),
+        }
+
+
+_series: Dict[Tuple[str, str], LatencySeries] = {}
+
+
+def record_latency(metric: str, elapsed_ms: float, label: str = ""):
+    """Add one latency sample"""
+    series = _series.get((metric, label))
+    if series is None:
+        series = _series[(metric, label)] = LatencySeries()
+    series.add(elapsed_ms)
+
+
+@contextmanager
+def timed(metric: str, label: str = ""):
+    """Record the elapsed time of a block (also when it raises)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_latency(metric, (time.perf_counter() - start) * 1000, label)
+
+
+def count_bucket(count: int) -> str:
+    """Group sizes into latency buckets: 1, 2-3, 4-6, 7-12, 13+"""
+    for upper, label in ((1, "1"), (3, "2-3"), (6, "4-6"), (12, "7-12")):
+        if count <= upper:
+            return label
+    return "13+"
+
+
+def get_metrics() -> Dict[str, Any]:
+    """All series grouped by metric name then label"""
+    result: Dict[str, Any] = {}
+    for (metric, label), series in sorted(_series.items()):
+        result.setdefault(metric, {})[label or "all"] = series.snapshot()
+    return result
+
+
+def reset_metrics():
+    _series.clear()
@@ -2,21 +2,27 @@
 Notification service - Order confirmations and notifications
 Uses line_service for sending messages
 """
+from typing import Any, Dict, Optional
+
+from services.job_queue import job_queue
 from services.line_service import send_line_push_message
+from services.logger import get_logger
+
+logger = get_logger(__name__)
 
 async def send_staff_notification(order_number: str, customer_name: str, customer_phone: str, 
-                                 total_amount: float, items: list):
-    """Send order notification to staff LINE group/account"""
+                                 total_amount: float, items: list, retry_key: Optional[str] = None) -> bool:
+    """Send order notification to staff LINE group/account (False = failed, worth retrying)"""
     try:
-        print(f"📢 Sending staff notification for order: {order_number}")
+        logger.info("📢 Sending staff notification for order: %s", order_number)
         
         # Get staff LINE ID from environment variables
         from modules.config import STAFF_LINE_ID
         
         if not STAFF_LINE_ID:
-            print("⚠️ STAFF_LINE_ID not configured in environment - skipping staff notification")
-            print("💡 Add STAFF_LINE_ID='your_staff_line_user_id' to .env file")
-            return
+            logger.warning("⚠️ STAFF_LINE_ID not configured in environment - skipping staff notification "
+                           "(add STAFF_LINE_ID='your_staff_line_user_id' to .env)")
+            return True
         
         # Create staff notification message
         items_text = ""
@@ -126,21 +132,24 @@ async def send_staff_notification(order_number: str, customer_name: str, custome
         
         # Send to staff
         messages = [staff_message]
-        success = await send_line_push_message(STAFF_LINE_ID, messages)
+        success = await send_line_push_message(STAFF_LINE_ID, messages, retry_key)
         
         if success:
-            print(f"✅ Staff notification sent for order {order_number}")
+            logger.info("✅ Staff notification sent for order %s", order_number)
         else:
-            print(f"⚠️ Failed to send staff notification for order {order_number}")
+            logger.warning("⚠️ Failed to send staff notification for order %s", order_number)
+        return success
             
     except Exception as e:
-        print(f"❌ Error sending staff notification: {e}")
+        logger.error("❌ Error sending staff notification: %s", e)
+        return False
 
 async def send_order_confirmation(order_number: str, customer_phone: str, customer_name: str, 
-                                platform: str, platform_user_id: str, total_amount: float, items_count: int, items_list: list = None):
-    """Send order confirmation to customer via appropriate platform"""
+                                platform: str, platform_user_id: str, total_amount: float, items_count: int,
+                                items_list: list = None, retry_key: Optional[str] = None) -> bool:
+    """Send order confirmation to customer via appropriate platform (False = failed, worth retrying)"""
     try:
-        print(f"🔔 Sending order confirmation: {order_number} to {platform}_{platform_user_id}")
+        logger.info("🔔 Sending order confirmation: %s to %s_%s", order_number, platform, platform_user_id)
         
         if platform == "LINE" and platform_user_id:
             # Send LINE push message with Flex Message
@@ -263,20 +272,66 @@ async def send_order_confirmation(order_number: str, customer_phone: str, custom
             }
             
             messages = [{"type": "text", "text": "🎉 สั่งอาหารเรียบร้อยแล้วค่ะ!"}, flex_message, tracking_button]
-            success = await send_line_push_message(platform_user_id, messages)
+            success = await send_line_push_message(platform_user_id, messages, retry_key)
             
             if success:
-                print(f"✅ LINE confirmation sent to {platform_user_id}")
+                logger.info("✅ LINE confirmation sent to %s", platform_user_id)
             else:
-                print(f"⚠️ Failed to send LINE confirmation to {platform_user_id}")
+                logger.warning("⚠️ Failed to send LINE confirmation to %s", platform_user_id)
+            return success
                 
         # TODO: Add Facebook/Instagram push notifications
         elif platform == "FB":
-            print(f"📧 Facebook confirmation for {platform_user_id} (not implemented)")
+            logger.info("📧 Facebook confirmation for %s (not implemented)", platform_user_id)
         elif platform == "IG":
-            print(f"📧 Instagram confirmation for {platform_user_id} (not implemented)")
+            logger.info("📧 Instagram confirmation for %s (not implemented)", platform_user_id)
         else:
-            print(f"📧 Web order confirmation for {customer_phone} (EMAIL/SMS not implemented)")
+            logger.debug("📧 Web order confirmation for %s (EMAIL/SMS not implemented)", order_number)
+        return True
             
     except Exception as e:
-        print(f"❌ Error sending order confirmation: {e}")
\ No newline at end of file
+        logger.error("❌ Error sending order confirmation: %s", e)
+        return False
+
+
+# ---------- durable jobs (services/job_queue.py) ----------
+
+class NotificationFailed(Exception):
+    """The push was not delivered - the job queue retries it"""
+
+
+async def order_confirmation_job(payload: Dict[str, Any], job_id: str):
+    # The job id doubles as LINE's retry key, so a retry after a lost response can't double-send
+    if not await send_order_confirmation(**payload, retry_key=job_id):
+        raise NotificationFailed(f"Order confirmation for {payload.get('order_number')} not delivered")
+
+
+async def staff_notification_job(payload: Dict[str, Any], job_id: str):
+    if not await send_staff_notification(**payload, retry_key=job_id):
+        raise NotificationFailed(f"Staff notification for {payload.get('order_number')} not delivered")
+
+
+job_queue.register("order_confirmation", order_confirmation_job)
+job_queue.register("staff_notification", staff_notification_job)
+
+
+def queue_order_notifications(order_number: str, customer_name: str, customer_phone: str, platform: str,
+                              platform_user_id: str, total_amount: float, items: list):
+    """Queue the customer confirmation and the staff alert (committed locally before returning)"""
+    job_queue.enqueue("order_confirmation", {
+        "order_number": order_number,
+        "customer_phone": customer_phone,
+        "customer_name": customer_name,
+        "platform": platform,
+        "platform_user_id": platform_user_id,
+        "total_amount": total_amount,
+        "items_count": len(items),
+        "items_list": items,
+    })
+    job_queue.enqueue("staff_notification", {
+        "order_number": order_number,
+        "customer_name": customer_name,
+        "customer_phone": customer_phone,
+        "total_amount": total_amount,
+        "items": items,
+    })
@@ -0,0 +1,170 @@
+"""
+Order events - In-process pub/sub of order lifecycle events (SSE stream at GET /api/orders/events)
+Each event is encoded once into an SSE frame and fanned out to bounded per-client queues; a replay
+buffer lets a reconnecting dashboard resume from Last-Event-ID instead of reloading everything
+"""
+import asyncio
+import uuid
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from modules.config import ORDER_EVENTS_REPLAY_SIZE, ORDER_EVENTS_CLIENT_BACKLOG, ORDER_EVENTS_HEARTBEAT
+from services.json_codec import dumps
+from services.logger import get_logger
+from services.query_builder import ORDER_SUMMARY_COLUMNS
+
+logger = get_logger(__name__)
+
+# Browser reconnect delay after the stream drops (EventSource "retry" field, ms)
+RECONNECT_MS = 3000
+HEARTBEAT_FRAME = b": ping\n\n"
+# Sent when the client's Last-Event-ID can't be resumed (other worker, restart, fell out of the buffer)
+RESET_FRAME = b"event: reset\ndata: {}\n\n"
+
+
+class Subscriber:
+    """One connected client: a bounded queue of encoded frames; None ends the stream"""
+    __slots__ = ("queue", "backlog", "closed")
+
+    def __init__(self, backlog: int):
+        # Bounded by offer() rather than maxsize, so the replay/position frames and the end marker always fit
+        self.queue: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue()
+        self.backlog = backlog
+        self.closed = False
+
+    def offer(self, frame: bytes) -> bool:
+        """Queue a frame; False when the client is already `backlog` frames behind"""
+        if self.closed:
+            return True
+        if self.queue.qsize() >= self.backlog:
+            return False
+        self.queue.put_nowait(frame)
+        return True
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        # Whatever is still queued is lost to this connection; the reconnect replays it
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class OrderEventBus:
+    """Publishers never wait: a slow client is disconnected rather than slowing the publisher down"""
+
+    def __init__(self, replay_size: int = 1000, client_backlog: int = 100, heartbeat: float = 15.0):
+        self.client_backlog = client_backlog
+        self.heartbeat = heartbeat
+        # Event ids are "<epoch>-<seq>": an id from another process or an earlier run is never resumed
+        self.epoch = uuid.uuid4().hex[:8]
+        self._seq = 0
+        self._replay: Deque[Tuple[int, bytes]] = deque(maxlen=replay_size)
+        self._subscribers: Set[Subscriber] = set()
+        self._listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+        self.stats = {"published": 0, "delivered": 0, "replayed": 0, "resets": 0,
+                      "slow_client_disconnects": 0, "connections": 0}
+
+    @property
+    def last_event_id(self) -> str:
+        return f"{self.epoch}-{self._seq}"
+
+    def add_listener(self, listener: Callable[[str, Dict[str, Any]], None]):
+        """Also call listener(event_type, order) for every event (in-process consumers, e.g. order tracking)"""
+        self._listeners.append(listener)
+
+    def publish(self, event_type: str, order: Dict[str, Any]):
+        """Fan an event out to every connected client (no awaits - safe to call from any handler)"""
+        self._seq += 1
+        data = {"type": event_type, "order": {column: order[column] for column in ORDER_SUMMARY_COLUMNS
+                                              if column in order}}
+        frame = (f"id: {self.last_event_id}\nevent: {event_type}\ndata: ".encode("utf-8")
+                 + dumps(data) + b"\n\n")
+        self._replay.append((self._seq, frame))
+        self.stats["published"] += 1
+        for subscriber in list(self._subscribers):
+            self._offer(subscriber, frame)
+        for listener in self._listeners:
+            try:
+                listener(event_type, order)
+            except Exception as e:
+                logger.error("❌ Order event listener failed: %s", e)
+
+    def _offer(self, subscriber: Subscriber, frame: bytes):
+        if subscriber.offer(frame):
+            self.stats["delivered"] += 1
+        else:
+            # Too far behind: cut it loose, the browser reconnects with Last-Event-ID and replays
+            subscriber.close()
+            self._subscribers.discard(subscriber)
+            self.stats["slow_client_disconnects"] += 1
+            logger.warning("⚠️ SSE client %d events behind, disconnected", self.client_backlog)
+
+    def _missed(self, last_event_id: Optional[str]) -> Optional[List[bytes]]:
+        """Frames after last_event_id; None when they are not all in the replay buffer any more"""
+        if not last_event_id:
+            return []
+        epoch, _, seq = last_event_id.strip().partition("-")
+        if epoch != self.epoch or not seq.isdigit() or int(seq) > self._seq:
+            return None
+        oldest = self._replay[0][0] if self._replay else self._seq + 1
+        if int(seq) < oldest - 1:
+            return None
+        return [frame for event_seq, frame in self._replay if event_seq > int(seq)]
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> Subscriber:
+        """Register a client; it first gets the events it missed (or a reset) and its position"""
+        subscriber = Subscriber(self.client_backlog)
+        missed = self._missed(last_event_id)
+        if missed is None or len(missed) > self.client_backlog:
+            missed = [RESET_FRAME]
+            self.stats["resets"] += 1
+        else:
+            self.stats["replayed"] += len(missed)
+        # Ends with the current position, so even an idle client resumes correctly after a drop
+        missed.append(f"retry: {RECONNECT_MS}\nid: {self.last_event_id}\nevent: ready\ndata: {{}}\n\n".encode("utf-8"))
+        for frame in missed:
+            subscriber.queue.put_nowait(frame)
+        self._subscribers.add(subscriber)
+        self.stats["connections"] += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+        subscriber.close()
+
+    async def stream(self, subscriber: Subscriber) -> AsyncIterator[bytes]:
+        """SSE body: queued frames, a comment line as heartbeat when idle"""
+        try:
+            while True:
+                try:
+                    frame = await asyncio.wait_for(subscriber.queue.get(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT_FRAME
+                    continue
+                if frame is None:
+                    return
+                yield frame
+        finally:
+            self.unsubscribe(subscriber)
+
+    def close(self):
+        """End every stream (app shutdown) - open SSE responses would otherwise hold it up"""
+        for subscriber in list(self._subscribers):
+            self.unsubscribe(subscriber)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "clients": len(self._subscribers),
+            "last_event_id": self.last_event_id,
+            "replay_buffered": len(self._replay),
+            "replay_size": self._replay.maxlen,
+            "client_backlog": self.client_backlog,
+            "heartbeat_seconds": self.heartbeat,
+        }
+
+
+# Global instance
+order_events = OrderEventBus(ORDER_EVENTS_REPLAY_SIZE, ORDER_EVENTS_CLIENT_BACKLOG, ORDER_EVENTS_HEARTBEAT)
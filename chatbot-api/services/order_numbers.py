@@ -0,0 +1,90 @@
+"""
+Order number service - Time-ordered, collision-free order numbers without a database lookup
+T{mmdd}{9 chars}: Bangkok date, then base32 of (ms of day | node id | per-ms sequence)
+Uniqueness comes from the node id + sequence; the orders.order_number unique index is the backstop
+"""
+import secrets
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+from fastapi import HTTPException
+from pytz import timezone
+
+from modules.config import ORDER_NUMBER_NODE_ID
+
+# Crockford base32 - no I/L/O/U, and ASCII order == numeric order, so numbers sort by time
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+MS_OF_DAY_BITS = 27   # 86,400,000 ms < 2^27
+NODE_BITS = 10        # 1024 workers/processes
+SEQUENCE_BITS = 8     # 256 numbers per ms per worker
+ENCODED_LENGTH = 9    # 45 bits / 5 bits per char
+
+MAX_NODE_ID = (1 << NODE_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+
+def encode_base32(value: int, length: int = ENCODED_LENGTH) -> str:
+    chars = []
+    for _ in range(length):
+        value, remainder = divmod(value, 32)
+        chars.append(ALPHABET[remainder])
+    return "".join(reversed(chars))
+
+
+def is_order_number_conflict(error: HTTPException) -> bool:
+    """Unique violation on order_number (PostgREST 409 / 23505) - regenerate and insert again"""
+    detail = str(error.detail)
+    return "23505" in detail and "order_number" in detail
+
+
+class OrderNumberGenerator:
+    """Monotonic per process; distinct node ids make numbers from different workers disjoint"""
+
+    def __init__(self, node_id: Optional[int] = None, clock: Callable[[], float] = time.time,
+                 tz: str = "Asia/Bangkok"):
+        if node_id is None:
+            # No configured id: random per process (Docker gives every container pid 1)
+            node_id = secrets.randbelow(MAX_NODE_ID + 1)
+        if not 0 <= node_id <= MAX_NODE_ID:
+            raise ValueError(f"Order number node id must be 0-{MAX_NODE_ID}, got {node_id}")
+        self.node_id = node_id
+        self.clock = clock
+        self.tz = timezone(tz)
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+        self.stats = {"generated": 0, "sequence_overflows": 0, "clock_regressions": 0}
+
+    def _next_slot(self):
+        with self._lock:
+            now_ms = int(self.clock() * 1000)
+            if now_ms < self._last_ms:
+                # Clock stepped back (NTP) - keep counting on the last ms so numbers never go backwards
+                self.stats["clock_regressions"] += 1
+                now_ms = self._last_ms
+            if now_ms == self._last_ms:
+                self._sequence += 1
+                if self._sequence > MAX_SEQUENCE:
+                    # Over 256 in one ms: borrow the next ms instead of sleeping
+                    self.stats["sequence_overflows"] += 1
+                    now_ms += 1
+                    self._sequence = 0
+            else:
+                self._sequence = 0
+            self._last_ms = now_ms
+            self.stats["generated"] += 1
+            return now_ms, self._sequence
+
+    def next(self) -> str:
+        now_ms, sequence = self._next_slot()
+        local = datetime.fromtimestamp(now_ms / 1000, self.tz)
+        ms_of_day = ((local.hour * 60 + local.minute) * 60 + local.second) * 1000 + now_ms % 1000
+        value = (ms_of_day << (NODE_BITS + SEQUENCE_BITS)) | (self.node_id << SEQUENCE_BITS) | sequence
+        return f"T{local.strftime('%m%d')}{encode_base32(value)}"
+
+
+# Global instance (set ORDER_NUMBER_NODE_ID per worker for guaranteed-disjoint numbers)
+order_numbers = OrderNumberGenerator(ORDER_NUMBER_NODE_ID)
@@ -0,0 +1,68 @@
+"""
+Order status service - One place that changes orders.status
+Compare-and-set on the current status, so the caller knows exactly which transition happened
+(customer aggregates are adjusted per transition, never twice for the same change)
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from services.customer_stats import customer_stats
+from services.logger import get_logger
+from services.order_events import order_events
+from services.query_builder import Query
+
+logger = get_logger(__name__)
+
+ORDER_TRANSITION_COLUMNS = ("id", "order_number", "status", "customer_id", "total_amount", "created_at")
+
+ORDER_STATUSES = ("pending", "confirmed", "preparing", "ready", "completed", "cancelled")
+# Orders the kitchen still has to act on - exactly the predicate of the idx_orders_pending partial index
+ACTIVE_STATUSES = ("pending", "confirmed", "preparing")
+# Nothing happens to an order after these
+FINAL_STATUSES = ("completed", "cancelled")
+
+# Customer-facing progress steps (order-status.html)
+TIMELINE_STEPS = (
+    ("pending", "รับออเดอร์แล้ว"),
+    ("confirmed", "ยืนยันออเดอร์"),
+    ("preparing", "กำลังเตรียมอาหาร"),
+    ("ready", "เตรียมเสร็จแล้ว"),
+    ("completed", "เสร็จสิ้น"),
+)
+
+
+def status_timeline(current_status: str) -> List[Dict[str, Any]]:
+    """Timeline for the tracking page: every step up to the current one is completed"""
+    steps = [status for status, _ in TIMELINE_STEPS]
+    reached = steps.index(current_status) if current_status in steps else 0
+    return [{"status": status, "text": text, "completed": index <= reached}
+            for index, (status, text) in enumerate(TIMELINE_STEPS)]
+
+
+async def change_order_status(order_number: str, new_status: str, extra: Optional[Dict[str, Any]] = None,
+                              attempts: int = 3) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """Set status (plus `extra` columns); returns (before, after) rows, or None if the order doesn't exist"""
+    for attempt in range(attempts):
+        before = await (Query("orders", "order_status_current")
+                        .select(*ORDER_TRANSITION_COLUMNS).eq("order_number", order_number).first())
+        if before is None:
+            return None
+
+        # Only applies if nobody changed the status since we read it
+        query = Query("orders", "order_status_change").eq("order_number", order_number)
+        if before["status"] is None:
+            query.is_("status", None)
+        else:
+            query.eq("status", before["status"])
+        # The orders_updated_at.sql trigger overrides this with the database clock when installed
+        changes = {"status": new_status, "updated_at": datetime.now(timezone.utc).isoformat(), **(extra or {})}
+        rows = await query.update(changes)
+        if rows:
+            customer_stats.record_status_change(before, new_status)
+            order_events.publish("order_status_changed", rows[0])  # staff dashboards (SSE)
+            return before, rows[0]
+        logger.warning("⚠️ Order %s status changed concurrently, retrying (attempt %d)", order_number, attempt + 1)
+
+    raise HTTPException(status_code=409, detail="Order status changed concurrently, please retry")
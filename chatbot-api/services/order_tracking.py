@@ -0,0 +1,118 @@
+"""
+Order tracking - Per-order fan-out registry for the order-status.html WebSocket
+Status changes arrive from the order event bus and are pushed to the watchers of that order
+number only; each watcher holds just the latest update, so a slow tab never builds a backlog
+"""
+import asyncio
+from typing import Any, Dict, Optional, Set
+
+from modules.config import ORDER_TRACKING_MAX_PER_ORDER
+from services.json_codec import dumps
+from services.logger import get_logger
+from services.order_events import order_events
+from services.order_status import status_timeline
+
+logger = get_logger(__name__)
+
+
+def status_message(order: Dict[str, Any]) -> Dict[str, Any]:
+    """What the tracking page needs to redraw status, payment and timeline"""
+    status = order.get("status") or "pending"
+    return {
+        "type": "status",
+        "order_number": order.get("order_number"),
+        "status": status,
+        "payment_status": order.get("payment_status") or "unpaid",
+        "updated_at": order.get("updated_at"),
+        "status_history": status_timeline(status),
+    }
+
+
+class Watcher:
+    """One open tracking connection; `latest` replaces anything not yet sent"""
+    __slots__ = ("latest", "ready", "closed")
+
+    def __init__(self):
+        self.latest: Optional[str] = None
+        self.ready = asyncio.Event()
+        self.closed = False
+
+    def push(self, message: str):
+        self.latest = message
+        self.ready.set()
+
+    def close(self):
+        self.closed = True
+        self.ready.set()
+
+    async def next(self) -> Optional[str]:
+        """Wait for the next update; None once the watcher is closed"""
+        await self.ready.wait()
+        self.ready.clear()
+        if self.closed:
+            return None
+        message, self.latest = self.latest, None
+        return message
+
+
+class OrderTracker:
+    """order number -> its watchers; a status change touches only that order's connections"""
+
+    def __init__(self, max_per_order: int = 10):
+        self.max_per_order = max_per_order
+        self._watchers: Dict[str, Set[Watcher]] = {}
+        self.stats = {"connections": 0, "rejected": 0, "pushes": 0, "delivered": 0}
+
+    def register(self, order_number: str) -> Optional[Watcher]:
+        """New watcher for the order, or None when it already has max_per_order connections"""
+        watchers = self._watchers.setdefault(order_number, set())
+        if len(watchers) >= self.max_per_order:
+            self.stats["rejected"] += 1
+            logger.warning("⚠️ Order %s already has %d tracking connections", order_number, len(watchers))
+            return None
+        watcher = Watcher()
+        watchers.add(watcher)
+        self.stats["connections"] += 1
+        return watcher
+
+    def unregister(self, order_number: str, watcher: Watcher):
+        watcher.close()
+        watchers = self._watchers.get(order_number)
+        if watchers is not None:
+            watchers.discard(watcher)
+            if not watchers:
+                del self._watchers[order_number]
+
+    def publish(self, order_number: str, message: Dict[str, Any]):
+        watchers = self._watchers.get(order_number)
+        if not watchers:
+            return
+        encoded = dumps(message).decode("utf-8")  # once, whatever the number of tabs
+        for watcher in watchers:
+            watcher.push(encoded)
+        self.stats["pushes"] += 1
+        self.stats["delivered"] += len(watchers)
+
+    def on_order_event(self, event_type: str, order: Dict[str, Any]):
+        """Order event bus listener"""
+        if event_type == "order_status_changed" and order.get("order_number"):
+            self.publish(order["order_number"], status_message(order))
+
+    def close(self):
+        """Close every connection (app shutdown)"""
+        for order_number, watchers in list(self._watchers.items()):
+            for watcher in list(watchers):
+                self.unregister(order_number, watcher)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "orders_watched": len(self._watchers),
+            "open_connections": sum(len(watchers) for watchers in self._watchers.values()),
+            "max_per_order": self.max_per_order,
+        }
+
+
+# Global instance
+order_tracker = OrderTracker(ORDER_TRACKING_MAX_PER_ORDER)
+order_events.add_listener(order_tracker.on_order_event)
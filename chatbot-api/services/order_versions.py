@@ -0,0 +1,76 @@
+"""
+Order versions - Strong ETags for GET /api/orders/{order_number} (order-status.html polling)
+The validator is derived from updated_at + status + payment_status; a small LRU map of the current
+ETag per order, kept up to date by order events, answers If-None-Match without the items join
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from modules.config import ORDER_VERSION_TTL, ORDER_VERSION_MAX_ENTRIES
+from services.order_events import order_events
+from services.query_builder import template
+
+
+def order_etag(order: Dict[str, Any]) -> str:
+    """Every write to an order moves updated_at (orders_updated_at.sql), status/payment guard the rest"""
+    version = f"{order.get('updated_at')}|{order.get('status')}|{order.get('payment_status')}"
+    return f'"{hashlib.sha256(version.encode("utf-8")).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
+class OrderVersionMap:
+    """order number -> (ETag, checked_at); LRU bounded, entries older than ttl are re-read"""
+
+    def __init__(self, max_entries: int = 5000, ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._versions: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self.stats = {"map_hits": 0, "version_reads": 0, "not_modified": 0, "full_responses": 0, "evictions": 0}
+
+    def remember(self, order_number: str, etag: str):
+        self._versions[order_number] = (etag, time.monotonic())
+        self._versions.move_to_end(order_number)
+        while len(self._versions) > self.max_entries:
+            self._versions.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def forget(self, order_number: str):
+        self._versions.pop(order_number, None)
+
+    async def current(self, order_number: str) -> Optional[str]:
+        """Current ETag: from the map while fresh, else one projected row (no join); None if no such order"""
+        entry = self._versions.get(order_number)
+        if entry is not None and time.monotonic() - entry[1] < self.ttl:
+            self._versions.move_to_end(order_number)
+            self.stats["map_hits"] += 1
+            return entry[0]
+        self.stats["version_reads"] += 1
+        order = await template("order_tracking", order_number).first()
+        if order is None:
+            self.forget(order_number)
+            return None
+        etag = order_etag(order)
+        self.remember(order_number, etag)
+        return etag
+
+    def on_order_event(self, event_type: str, order: Dict[str, Any]):
+        """Order event bus listener - writes in this process update the map immediately"""
+        if order.get("order_number") and "updated_at" in order:
+            self.remember(order["order_number"], order_etag(order))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "entries": len(self._versions), "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl}
+
+
+# Global instance
+order_versions = OrderVersionMap(ORDER_VERSION_MAX_ENTRIES, ORDER_VERSION_TTL)
+order_events.add_listener(order_versions.on_order_event)
@@ -4,13 +4,6 @@ Handles PromptPay QR generation, slip verification, and payment processing
 Part of Database V2 Payment System
 """
 
-try:
-    import qrcode
-    QR_AVAILABLE = True
-except ImportError:
-    print("⚠️ qrcode library not available - QR generation disabled")
-    QR_AVAILABLE = False
-
 import uuid
 import base64
 from io import BytesIO
@@ -19,6 +12,18 @@ from typing import Dict, List, Optional, Any
 from pytz import timezone
 
 from services.database_v2 import db_v2
+from services.query_builder import Query, template
+from services.order_status import change_order_status
+from services.logger import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    import qrcode
+    QR_AVAILABLE = True
+except ImportError:
+    logger.warning("⚠️ qrcode library not available - QR generation disabled")
+    QR_AVAILABLE = False
 
 
 class PaymentService:
@@ -69,11 +74,11 @@ class PaymentService:
             else:
                 qr_data["qr_image_base64"] = "data:text/plain;base64,UVIgZ2VuZXJhdGlvbiBub3QgYXZhaWxhYmxl"  # "QR generation not available"
             
-            print(f"✅ Generated PromptPay QR for ฿{amount} - Order {order_number}")
+            logger.info("✅ Generated PromptPay QR for ฿%s - Order %s", amount, order_number)
             return qr_data
             
         except Exception as e:
-            print(f"❌ Error generating QR code: {e}")
+            logger.error("❌ Error generating QR code: %s", e)
             raise Exception(f"Failed to generate QR code: {e}")
     
     def _create_promptpay_payload(self, promptpay_id: str, amount: float, ref: str) -> str:
@@ -90,11 +95,11 @@ class PaymentService:
             qr_data = {}
             if method == "promptpay":
                 # Get order number for QR generation
-                orders = await db_v2.supabase_request("GET", f"orders?id=eq.{order_id}&select=order_number")
-                if not orders:
+                order = await template("order_number_for_id", order_id).first()
+                if not order:
                     raise Exception("Order not found")
                 
-                order_number = orders[0]["order_number"]
+                order_number = order["order_number"]
                 qr_data = self.generate_promptpay_qr(amount, order_number)
             
             # Create payment transaction
@@ -121,7 +126,7 @@ class PaymentService:
             }
             
         except Exception as e:
-            print(f"❌ Error creating payment transaction: {e}")
+            logger.error("❌ Error creating payment transaction: %s", e)
             raise Exception(f"Failed to create payment transaction: {e}")
     
     async def verify_payment_slip(self, transaction_id: str, slip_image_data: str) -> Dict[str, Any]:
@@ -146,24 +151,23 @@ class PaymentService:
                 "status": "verifying"
             }
             
-            await db_v2.supabase_request("PATCH", f"payment_transactions?id=eq.{transaction_id}", update_data)
+            await Query("payment_transactions").eq("id", transaction_id).update(update_data)
             
-            print(f"✅ Payment slip uploaded for transaction {transaction_id}")
+            logger.info("✅ Payment slip uploaded for transaction %s", transaction_id)
             return verification_result
             
         except Exception as e:
-            print(f"❌ Error verifying payment slip: {e}")
+            logger.error("❌ Error verifying payment slip: %s", e)
             raise Exception(f"Failed to verify payment slip: {e}")
     
     async def confirm_payment(self, transaction_id: str, verified_by: str = "system") -> Dict[str, Any]:
         """Confirm payment and update order status"""
         try:
             # Get transaction
-            transactions = await db_v2.supabase_request("GET", f"payment_transactions?id=eq.{transaction_id}&select=*,orders(order_number)")
-            if not transactions:
+            transaction = await template("payment_by_id", transaction_id).first()
+            if not transaction:
                 raise Exception("Transaction not found")
             
-            transaction = transactions[0]
             order_number = transaction["orders"]["order_number"]
             
             # Update transaction status
@@ -172,16 +176,12 @@ class PaymentService:
                 "verified_at": datetime.now(self.thailand_tz).isoformat(),
                 "verified_by": verified_by
             }
-            await db_v2.supabase_request("PATCH", f"payment_transactions?id=eq.{transaction_id}", update_data)
+            await Query("payment_transactions").eq("id", transaction_id).update(update_data)
             
-            # Update order payment status
-            order_update = {
-                "payment_status": "paid",
-                "status": "confirmed"  # Auto-confirm when payment received
-            }
-            await db_v2.supabase_request("PATCH", f"orders?order_number=eq.{order_number}", order_update)
+            # Update order payment status and auto-confirm when payment received
+            await change_order_status(order_number, "confirmed", {"payment_status": "paid"})
             
-            print(f"✅ Payment confirmed for order {order_number}")
+            logger.info("✅ Payment confirmed for order %s", order_number)
             return {
                 "success": True,
                 "order_number": order_number,
@@ -191,22 +191,20 @@ class PaymentService:
             }
             
         except Exception as e:
-            print(f"❌ Error confirming payment: {e}")
+            logger.error("❌ Error confirming payment: %s", e)
             raise Exception(f"Failed to confirm payment: {e}")
     
     async def get_payment_status(self, order_id: str) -> Dict[str, Any]:
         """Get payment status for an order"""
         try:
-            query = f"payment_transactions?order_id=eq.{order_id}&select=*&order=created_at.desc&limit=1"
-            transactions = await db_v2.supabase_request("GET", query)
+            transaction = await template("latest_payment", order_id).first()
             
-            if not transactions:
+            if not transaction:
                 return {
                     "status": "no_payment",
                     "message": "No payment transaction found"
                 }
             
-            transaction = transactions[0]
             return {
                 "status": transaction["status"],
                 "method": transaction["method"],
@@ -217,7 +215,7 @@ class PaymentService:
             }
             
         except Exception as e:
-            print(f"❌ Error getting payment status: {e}")
+            logger.error("❌ Error getting payment status: %s", e)
             return {
                 "status": "error",
                 "message": f"Failed to get payment status: {e}"
@@ -0,0 +1,314 @@
+"""
+Query builder - Typed PostgREST endpoints with column projection
+Replaces hand-built f-string endpoints; named templates keep query shapes reusable and countable
+"""
+import base64
+import binascii
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+from services.database_service import supabase_request
+from services.json_codec import dumps, loads
+from services.metrics import timed
+
+# Characters PostgREST needs verbatim inside filter values / select lists
+_SAFE_VALUE = "-_.:@*"
+_LIST_RESERVED = set(',()"')
+
+
+def _encode(value: Any) -> str:
+    """Render a Python value as a PostgREST filter literal"""
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return quote(str(value), safe=_SAFE_VALUE)
+
+
+def _encode_logic(value: Any) -> str:
+    """Value inside an or=(...) tree - quoted when it holds PostgREST delimiters (timestamps do)"""
+    text = _encode(value)
+    if any(ch in text for ch in ",.:()"):
+        # %22, not a bare quote: httpx re-encodes the whole query (and our %XX escapes) if it sees one
+        text = "%22" + text + "%22"
+    return text
+
+
+def encode_cursor(row: Dict[str, Any], *columns: str) -> str:
+    """Opaque keyset cursor (URL-safe) for the last row of a page"""
+    return base64.urlsafe_b64encode(dumps([row[column] for column in columns])).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """Inverse of encode_cursor; ValueError for anything a client made up"""
+    try:
+        values = loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if not isinstance(values, list) or len(values) != size or not all(isinstance(v, str) for v in values):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def _encode_list(values: Iterable[Any]) -> str:
+    items = []
+    for value in values:
+        text = str(value)
+        if any(ch in _LIST_RESERVED for ch in text):
+            text = '"' + text.replace('"', '\\"') + '"'
+        items.append(quote(text, safe=_SAFE_VALUE + '"'))
+    return f"({','.join(items)})"
+
+
+class Query:
+    """Chainable builder for one PostgREST request: Query("orders").select("id").eq("status", "pending")"""
+
+    def __init__(self, table: str, name: Optional[str] = None):
+        self.table = table
+        self.name = name
+        self._select: List[str] = []
+        self._filters: List[Tuple[str, str]] = []
+        self._order: List[str] = []
+        self._limit: Optional[int] = None
+        self._offset: Optional[int] = None
+        self._on_conflict: Optional[str] = None
+
+    # ---------- projection ----------
+
+    def select(self, *columns: str) -> "Query":
+        """Columns to return; embeds are plain strings, e.g. "order_items(quantity,menus(name))" """
+        self._select.extend(columns)
+        return self
+
+    # ---------- filters ----------
+
+    def _filter(self, column: str, op: str, rendered: str) -> "Query":
+        self._filters.append((column, f"{op}.{rendered}"))
+        return self
+
+    def eq(self, column: str, value: Any) -> "Query":
+        return self._filter(column, "eq", _encode(value))
+
+    def neq(self, column: str, value: Any) -> "Query":
+        return self._filter(column, "neq", _encode(value))
+
+    def gt(self, column: str, value: Any) -> "Query":
+        return self._filter(column, "gt", _encode(value))
+
+    def gte(self, column: str, value: Any) -> "Query":
+        return self._filter(column, "gte", _encode(value))
+
+    def lt(self, column: str, value: Any) -> "Query":
+        return self._filter(column, "lt", _encode(value))
+
+    def lte(self, column: str, value: Any) -> "Query":
+        return self._filter(column, "lte", _encode(value))
+
+    def in_(self, column: str, values: Iterable[Any]) -> "Query":
+        return self._filter(column, "in", _encode_list(values))
+
+    def is_(self, column: str, value: Optional[bool]) -> "Query":
+        return self._filter(column, "is", _encode(value))
+
+    def after(self, column: str, value: Any, tie_column: str, tie_value: Any, desc: bool = False) -> "Query":
+        """Keyset filter: rows past (value, tie_value) in (column, tie_column) order - pair with matching .order()"""
+        op = "lt" if desc else "gt"
+        sort, tie = _encode_logic(value), _encode_logic(tie_value)
+        self._filters.append(("or", f"({column}.{op}.{sort},and({column}.eq.{sort},{tie_column}.{op}.{tie}))"))
+        return self
+
+    # ---------- modifiers ----------
+
+    def order(self, column: str, desc: bool = False, nulls: Optional[str] = None) -> "Query":
+        clause = f"{column}.{'desc' if desc else 'asc'}"
+        if nulls:
+            clause += f".nulls{nulls}"
+        self._order.append(clause)
+        return self
+
+    def limit(self, count: int) -> "Query":
+        self._limit = int(count)
+        return self
+
+    def offset(self, count: int) -> "Query":
+        self._offset = int(count)
+        return self
+
+    def on_conflict(self, *columns: str) -> "Query":
+        self._on_conflict = ",".join(columns)
+        return self
+
+    # ---------- rendering ----------
+
+    def _params(self, values: bool = True) -> List[Tuple[str, str]]:
+        params: List[Tuple[str, str]] = []
+        if self._select:
+            params.append(("select", ",".join(self._select)))
+        for column, expression in self._filters:
+            if not values:
+                expression = "(?)" if column in ("or", "and") else f"{expression.split('.', 1)[0]}.?"
+            params.append((column, expression))
+        if self._order:
+            params.append(("order", ",".join(self._order)))
+        if self._limit is not None:
+            params.append(("limit", str(self._limit) if values else "?"))
+        if self._offset is not None:
+            params.append(("offset", str(self._offset) if values else "?"))
+        if self._on_conflict:
+            params.append(("on_conflict", self._on_conflict))
+        return params
+
+    def _render(self, params: List[Tuple[str, str]]) -> str:
+        if not params:
+            return self.table
+        return f"{self.table}?{'&'.join(f'{key}={value}' for key, value in params)}"
+
+    def to_endpoint(self) -> str:
+        """Endpoint string for supabase_request ("orders?select=id&status=eq.pending")"""
+        return self._render(self._params())
+
+    @property
+    def shape(self) -> str:
+        """Endpoint with literal values blanked - identical for every call of the same query"""
+        return self._render(self._params(values=False))
+
+    def __repr__(self) -> str:
+        return f"Query({self.to_endpoint()!r})"
+
+    # ---------- execution ----------
+
+    async def _run(self, method: str, data: Any = None, use_service_key: bool = True):
+        # Templates are labelled by name, ad-hoc queries by their shape
+        with timed("db.query", f"{method} {self.name or self.shape}"):
+            return await supabase_request(method, self.to_endpoint(), data, use_service_key=use_service_key)
+
+    async def fetch(self, use_service_key: bool = True) -> List[Dict[str, Any]]:
+        return await self._run("GET", use_service_key=use_service_key) or []
+
+    async def first(self, use_service_key: bool = True) -> Optional[Dict[str, Any]]:
+        if self._limit is None:
+            self.limit(1)
+        rows = await self.fetch(use_service_key)
+        return rows[0] if rows else None
+
+    async def insert(self, data: Any) -> Any:
+        return await self._run("POST", data)
+
+    async def update(self, data: Dict[str, Any]) -> Any:
+        if not self._filters:
+            raise ValueError(f"Refusing to PATCH every row of {self.table} - add a filter")
+        return await self._run("PATCH", data)
+
+    async def delete(self) -> Any:
+        if not self._filters:
+            raise ValueError(f"Refusing to DELETE every row of {self.table} - add a filter")
+        return await self._run("DELETE")
+
+
+# Column sets - only what each caller actually reads
+ORDER_SUMMARY_COLUMNS = (
+    "id", "order_number", "status", "customer_name", "customer_phone", "total_amount",
+    "payment_status", "order_type", "notes", "created_at", "updated_at",
+)
+ORDER_ITEM_COLUMNS = "order_items(menu_name,quantity,unit_price,total_price,notes,menus(name))"
+PAYMENT_STATUS_COLUMNS = (
+    "status", "method", "amount", "transaction_ref", "created_at", "verified_at",
+)
+
+
+def _order_by_number(order_number: str) -> Query:
+    return Query("orders", "order_by_number").select("id", "order_number", "status").eq("order_number", order_number)
+
+
+def _order_status(order_number: str) -> Query:
+    return (Query("orders", "order_status")
+            .select(*ORDER_SUMMARY_COLUMNS, ORDER_ITEM_COLUMNS)
+            .eq("order_number", order_number).limit(1))
+
+
+def _order_tracking(order_number: str) -> Query:
+    return (Query("orders", "order_tracking")
+            .select("order_number", "status", "payment_status", "updated_at")
+            .eq("order_number", order_number).limit(1))
+
+
+def _order_with_history(order_number: str) -> Query:
+    return (Query("orders", "order_with_history")
+            .select("*", "order_items(*)", "order_status_history(*)")
+            .eq("order_number", order_number).limit(1))
+
+
+def _recent_orders(limit: int = 100) -> Query:
+    return (Query("orders", "recent_orders")
+            .select(*ORDER_SUMMARY_COLUMNS)
+            .order("created_at", desc=True).limit(limit))
+
+
+def _orders_between(start: str, end: str, limit: int = 100, statuses: Optional[Sequence[str]] = None,
+                    cursor: Optional[Sequence[str]] = None) -> Query:
+    """Newest first within [start, end) - range on idx_orders_created_at, keyset on (created_at, id)"""
+    query = (Query("orders", "orders_between")
+             .select(*ORDER_SUMMARY_COLUMNS)
+             .gte("created_at", start).lt("created_at", end))
+    if statuses:
+        query.in_("status", statuses)
+    if cursor:
+        query.after("created_at", cursor[0], "id", cursor[1], desc=True)
+    return query.order("created_at", desc=True).order("id", desc=True).limit(limit)
+
+
+def _orders_changed_since(cursor: Sequence[str], before: str, limit: int = 200) -> Query:
+    """Change feed: rows past (updated_at, id) and stamped before `before`, oldest change first"""
+    return (Query("orders", "orders_changed_since")
+            .select(*ORDER_SUMMARY_COLUMNS)
+            .after("updated_at", cursor[0], "id", cursor[1])
+            .lt("updated_at", before)
+            .order("updated_at").order("id").limit(limit))
+
+
+def _latest_order_change(before: str) -> Query:
+    return (Query("orders", "latest_order_change")
+            .select("id", "updated_at")
+            .lt("updated_at", before)
+            .order("updated_at", desc=True).order("id", desc=True).limit(1))
+
+
+def _order_number_for_id(order_id: str) -> Query:
+    return Query("orders", "order_number_for_id").select("order_number").eq("id", order_id).limit(1)
+
+
+def _payment_by_id(transaction_id: str) -> Query:
+    return (Query("payment_transactions", "payment_by_id")
+            .select("id", "amount", "status", "orders(order_number)")
+            .eq("id", transaction_id).limit(1))
+
+
+def _latest_payment(order_id: str) -> Query:
+    return (Query("payment_transactions", "latest_payment")
+            .select(*PAYMENT_STATUS_COLUMNS)
+            .eq("order_id", order_id).order("created_at", desc=True).limit(1))
+
+
+QUERY_TEMPLATES = {
+    "order_by_number": _order_by_number,
+    "order_status": _order_status,
+    "order_tracking": _order_tracking,
+    "order_with_history": _order_with_history,
+    "recent_orders": _recent_orders,
+    "orders_between": _orders_between,
+    "orders_changed_since": _orders_changed_since,
+    "latest_order_change": _latest_order_change,
+    "order_number_for_id": _order_number_for_id,
+    "payment_by_id": _payment_by_id,
+    "latest_payment": _latest_payment,
+}
+
+
+def template(name: str, *args, **kwargs) -> Query:
+    """Build a named query; its name labels db.query latency in /health/metrics"""
+    try:
+        builder = QUERY_TEMPLATES[name]
+    except KeyError:
+        raise KeyError(f"Unknown query template: {name}. Available: {sorted(QUERY_TEMPLATES)}")
+    return builder(*args, **kwargs)
+
@@ -0,0 +1,140 @@
+"""
+Query cache - Read-through TTL + LRU cache for Supabase GETs
+Keyed by table plus normalized query; writes through supabase_request invalidate the table
+"""
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+from modules.config import SUPABASE_CACHE_MAX_ENTRIES, SUPABASE_CACHE_TTLS
+from services.http_pool import endpoint_table
+
+EMBED_PATTERN = re.compile(r"([A-Za-z_]\w*)(?:![\w]+)?\(")
+
+
+def endpoint_tables(endpoint: str) -> Set[str]:
+    """Tables a read depends on: the base table plus any select= embeds"""
+    tables = {endpoint_table(endpoint)}
+    query = endpoint.partition("?")[2]
+    for param in query.split("&"):
+        if param.startswith("select="):
+            tables.update(name for name in EMBED_PATTERN.findall(param[7:]) if name not in ("or", "and"))
+    return tables
+
+
+# Tables written by database functions called through /rpc/
+RPC_WRITES = {
+    "resolve_customer": ("customers",),
+    "create_order_full": ("customers", "orders", "order_items"),
+    "apply_customer_stats": ("customers",),
+    "set_customer_stats": ("customers",),
+}
+
+
+def written_tables(endpoint: str) -> Set[str]:
+    """Tables a write endpoint modifies"""
+    table = endpoint_table(endpoint)
+    if table.startswith("rpc/"):
+        return set(RPC_WRITES.get(table[4:], ()))
+    return {table}
+
+
+class QueryCache:
+    """Per-table TTL cache with LRU eviction (cached values are shared - treat them as read-only)"""
+
+    def __init__(self, max_entries: int = 512, table_ttls: Optional[Dict[str, float]] = None):
+        self.max_entries = max_entries
+        self.table_ttls = table_ttls or {}
+        self._entries: "OrderedDict[str, Tuple[float, Set[str], Any]]" = OrderedDict()
+        self._table_keys: Dict[str, Set[str]] = {}
+        # Bumped on every write so a read that started before the write can't store stale data
+        self._generations: Dict[str, int] = {}
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0,
+                      "expirations": 0, "invalidations": 0, "stale_skips": 0}
+
+    def ttl_for(self, endpoint: str) -> float:
+        """TTL of a read - the shortest TTL of every table it touches (0 = not cached)"""
+        return min(self.table_ttls.get(table, 0) for table in endpoint_tables(endpoint))
+
+    def generation(self, endpoint: str) -> Tuple[int, ...]:
+        return tuple(self._generations.get(table, 0) for table in sorted(endpoint_tables(endpoint)))
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return False, None
+
+        expires_at, _, value = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.stats["expirations"] += 1
+            self.stats["misses"] += 1
+            return False, None
+
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return True, value
+
+    def set(self, key: str, endpoint: str, value: Any, generation: Tuple[int, ...]):
+        ttl = self.ttl_for(endpoint)
+        if ttl <= 0:
+            return
+        if generation != self.generation(endpoint):
+            self.stats["stale_skips"] += 1
+            return
+
+        existing = self._entries.get(key)
+        if existing is not None and existing[2] is value:
+            return  # coalesced callers storing the same shared result
+
+        tables = endpoint_tables(endpoint)
+        self._remove(key)
+        self._entries[key] = (time.monotonic() + ttl, tables, value)
+        for table in tables:
+            self._table_keys.setdefault(table, set()).add(key)
+        self.stats["stores"] += 1
+
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats["evictions"] += 1
+
+    def invalidate_table(self, table: str) -> int:
+        """Drop every entry that reads from `table`"""
+        self._generations[table] = self._generations.get(table, 0) + 1
+        keys = list(self._table_keys.get(table, ()))
+        for key in keys:
+            self._remove(key)
+        if keys:
+            self.stats["invalidations"] += len(keys)
+        return len(keys)
+
+    def clear(self):
+        for table in list(self._table_keys):
+            self.invalidate_table(table)
+        self._entries.clear()
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for table in entry[1]:
+            keys = self._table_keys.get(table)
+            if keys is not None:
+                keys.discard(key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "table_ttls": self.table_ttls,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Global instance
+query_cache = QueryCache(SUPABASE_CACHE_MAX_ENTRIES, SUPABASE_CACHE_TTLS)
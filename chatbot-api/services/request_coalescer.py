@@ -0,0 +1,57 @@
+"""
+Request coalescer - Single-flight for identical concurrent Supabase GETs
+Concurrent callers with the same key share one in-flight request and one decoded result
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class RequestCoalescer:
+    """Deduplicate identical in-flight reads (results are shared - treat them as read-only)"""
+
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.stats = {
+            "misses": 0,   # caller started a new request
+            "joins": 0,    # caller attached to a request already in flight
+            "hits": 0,     # joined caller received the shared result
+            "shared_errors": 0,
+        }
+
+    async def run(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the result of fetch(), sharing it with concurrent callers using the same key"""
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.stats["joins"] += 1
+            try:
+                result = await asyncio.shield(task)
+            except Exception:
+                self.stats["shared_errors"] += 1
+                raise
+            self.stats["hits"] += 1
+            return result
+
+        self.stats["misses"] += 1
+        # Run as its own task so a cancelled leader doesn't cancel the joiners
+        task = asyncio.ensure_future(fetch())
+        self._in_flight[key] = task
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Future):
+        self._in_flight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # mark retrieved even if every caller went away
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self.stats["misses"] + self.stats["joins"]
+        return {
+            **self.stats,
+            "in_flight": len(self._in_flight),
+            "saved_round_trips": self.stats["joins"],
+            "join_rate": round(self.stats["joins"] / total, 4) if total else 0.0,
+        }
+
+
+# Global instance
+supabase_coalescer = RequestCoalescer()
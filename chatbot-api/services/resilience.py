@@ -0,0 +1,149 @@
+"""
+Resilience service - Retry policy and per-table circuit breakers for Supabase calls
+Retries only what is safe to repeat; an open breaker fails fast instead of tying up workers
+"""
+import asyncio
+import random
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+from modules.config import (
+    SUPABASE_RETRY_ATTEMPTS, SUPABASE_RETRY_BASE_DELAY, SUPABASE_RETRY_MAX_DELAY,
+    SUPABASE_BREAKER_THRESHOLD, SUPABASE_BREAKER_RESET_SECONDS
+)
+from services.http_pool import endpoint_table
+from services.logger import get_logger
+
+logger = get_logger(__name__)
+
+RETRYABLE_STATUSES = {429, 502, 503, 504}
+
+# The request never left this process - safe to retry any method
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+# Database functions that give the same result when repeated
+IDEMPOTENT_RPCS = {"rpc/resolve_customer"}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose breaker is open"""
+
+
+def is_idempotent(method: str, endpoint: str) -> bool:
+    """GET, PATCH (absolute values) and DELETE can be repeated; POST only when it is an upsert or idempotent RPC"""
+    if method in ("GET", "PATCH", "DELETE"):
+        return True
+    return method == "POST" and ("on_conflict=" in endpoint or endpoint_table(endpoint) in IDEMPOTENT_RPCS)
+
+
+def should_retry_error(method: str, endpoint: str, error: Exception) -> bool:
+    if isinstance(error, UNSENT_ERRORS):
+        return True
+    return isinstance(error, httpx.TransportError) and is_idempotent(method, endpoint)
+
+
+def should_retry_status(method: str, endpoint: str, status_code: int) -> bool:
+    return status_code in RETRYABLE_STATUSES and is_idempotent(method, endpoint)
+
+
+def backoff_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """Full-jitter exponential backoff, honouring Retry-After when the server sends one"""
+    if retry_after:
+        try:
+            return min(float(retry_after), SUPABASE_RETRY_MAX_DELAY)
+        except ValueError:
+            pass
+    return random.uniform(0, min(SUPABASE_RETRY_MAX_DELAY, SUPABASE_RETRY_BASE_DELAY * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """closed -> open after N consecutive failures -> half_open probe after reset timeout"""
+
+    def __init__(self, name: str, threshold: int = 5, reset_seconds: float = 30.0):
+        self.name = name
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.stats = {"failures": 0, "successes": 0, "opened": 0, "short_circuited": 0}
+
+    def check(self):
+        """Raise CircuitOpenError unless a request may go through now"""
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_seconds:
+                self.stats["short_circuited"] += 1
+                raise CircuitOpenError(f"Circuit open for {self.name}")
+            self.state = "half_open"
+            self.probe_in_flight = False
+
+        if self.state == "half_open":
+            if self.probe_in_flight:
+                self.stats["short_circuited"] += 1
+                raise CircuitOpenError(f"Circuit half-open for {self.name} (probe in flight)")
+            self.probe_in_flight = True
+
+    def record_success(self):
+        self.stats["successes"] += 1
+        self.consecutive_failures = 0
+        if self.state != "closed":
+            logger.info("✅ Circuit closed for %s", self.name)
+        self.state = "closed"
+        self.probe_in_flight = False
+
+    def record_failure(self):
+        self.stats["failures"] += 1
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.threshold:
+            if self.state != "open":
+                self.stats["opened"] += 1
+                logger.warning("🚫 Circuit opened for %s after %s failures", self.name, self.consecutive_failures)
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.probe_in_flight = False
+
+    def abandon(self):
+        """Request ended without an answer from the dependency (e.g. cancelled) - free the probe slot"""
+        self.probe_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        retry_in = 0.0
+        if self.state == "open":
+            retry_in = max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_in_seconds": round(retry_in, 1),
+            **self.stats,
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+retry_stats = {"retries": 0}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = _breakers[name] = CircuitBreaker(name, SUPABASE_BREAKER_THRESHOLD, SUPABASE_BREAKER_RESET_SECONDS)
+    return breaker
+
+
+async def wait_before_retry(attempt: int, retry_after: Optional[str] = None):
+    retry_stats["retries"] += 1
+    await asyncio.sleep(backoff_delay(attempt, retry_after))
+
+
+def get_resilience_stats() -> Dict[str, Any]:
+    return {
+        "retry_policy": {
+            "max_retries": SUPABASE_RETRY_ATTEMPTS,
+            "base_delay": SUPABASE_RETRY_BASE_DELAY,
+            "max_delay": SUPABASE_RETRY_MAX_DELAY,
+            **retry_stats,
+        },
+        "breakers": {name: breaker.snapshot() for name, breaker in sorted(_breakers.items())},
+    }
@@ -0,0 +1,371 @@
+"""
+Write journal - Local durable write-behind for non-critical side effects
+Requests append audit rows, conversation logs and customer stat deltas to an append-only SQLite
+journal (a local commit, no network); a background flusher batches them to Supabase with retries
+"""
+import asyncio
+import os
+import random
+import re
+import sqlite3
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from modules.config import (
+    JOURNAL_PATH, JOURNAL_SYNC, JOURNAL_FLUSH_INTERVAL, JOURNAL_BATCH_SIZE, JOURNAL_MAX_ATTEMPTS,
+    JOURNAL_RETRY_BASE_DELAY, JOURNAL_RETRY_MAX_DELAY
+)
+from services.json_codec import dumps, loads
+from services.logger import get_logger
+from services.query_builder import Query
+
+logger = get_logger(__name__)
+
+INSERT_KIND = "insert"
+
+# A claimed batch not settled within this time (process crashed mid-flush) is claimed again
+LEASE_SECONDS = 120.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS journal (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    lease_until REAL,
+    dead INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS journal_pending ON journal (kind, dead, next_attempt_at, seq);
+"""
+
+_DATABASE_ERROR = re.compile(r"^Database error: (\d{3})")
+
+Handler = Callable[[List[Dict[str, Any]]], Awaitable[Any]]
+
+SYNC_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+
+def open_local_db(path: str, sync: str, schema: str) -> sqlite3.Connection:
+    """Autocommit SQLite connection in WAL mode (shared by the journal and the job queue)"""
+    if path != ":memory:" and os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    # NORMAL: survives a process crash without an fsync per commit; FULL: also power loss
+    db.execute(f"PRAGMA synchronous={sync}")
+    db.execute("PRAGMA busy_timeout=5000")
+    db.executescript(schema)
+    return db
+
+
+def is_permanent_failure(error: Exception) -> bool:
+    """PostgREST rejected the payload (4xx) - retrying the same rows can't succeed"""
+    if not isinstance(error, HTTPException):
+        return False
+    match = _DATABASE_ERROR.match(str(error.detail))
+    return bool(match) and 400 <= int(match.group(1)) < 500 and int(match.group(1)) not in (408, 429)
+
+
+async def insert_rows(payloads: List[Dict[str, Any]]):
+    """Handler for journaled inserts: one upsert per table, keyed on the id assigned at append time"""
+    by_table: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for payload in payloads:
+        by_table[payload["table"]].append(payload["row"])
+    for table, rows in by_table.items():
+        # Upsert on id: a batch that was written but not acknowledged is a no-op the second time
+        await Query(table, f"journal_{table}").on_conflict("id").insert(rows)
+
+
+class _Kind:
+    __slots__ = ("handler", "flush_interval", "batch_size", "last_flush")
+
+    def __init__(self, handler: Handler, flush_interval: float, batch_size: int):
+        self.handler = handler
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.last_flush = 0.0
+
+
+class WriteJournal:
+    """SQLite append-only queue of side-effect writes, drained per kind by registered handlers
+
+    A handler gets the payloads of one batch; returning settles (deletes) them, raising schedules
+    a retry with backoff. A 4xx rejection is bisected down to the rejected entries, so one bad row
+    doesn't take its batch with it. After max_attempts, or when rejected on its own, an entry is
+    kept as a dead letter (never deleted) until retry() queues it again. Entries survive restarts; a crash between a handler's
+    write and the delete replays that batch. Every payload carries the `entry_id` (uuid) stamped
+    when it was appended and kept across replays - handlers must dedupe on it (or on an id inside
+    the payload, as inserts do) so that writing a batch twice changes nothing.
+    """
+
+    def __init__(self, path: str = ":memory:", sync: str = "NORMAL", flush_interval: float = 2.0,
+                 batch_size: int = 200, max_attempts: int = 10, retry_base_delay: float = 1.0,
+                 retry_max_delay: float = 300.0):
+        if sync not in SYNC_MODES:
+            raise ValueError(f"Journal sync mode must be one of {SYNC_MODES}, got {sync!r}")
+        self.path = path
+        self.sync = sync
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self._db: Optional[sqlite3.Connection] = None
+        self._kinds: Dict[str, _Kind] = {}
+        self._pending: Dict[str, int] = defaultdict(int)  # appended since the last flush of each kind
+        self._flushing: Dict[str, asyncio.Future] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"appended": 0, "flushed": 0, "batches": 0, "retries": 0, "dead_letters": 0,
+                      "splits": 0, "requeued": 0, "append_errors": 0}
+        self.register(INSERT_KIND, insert_rows)
+
+    # ---------- storage ----------
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = open_local_db(self.path, self.sync, SCHEMA)
+        return self._db
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    # ---------- appending ----------
+
+    def register(self, kind: str, handler: Handler, flush_interval: Optional[float] = None,
+                 batch_size: Optional[int] = None):
+        self._kinds[kind] = _Kind(handler, flush_interval or self.flush_interval, batch_size or self.batch_size)
+
+    def append(self, kind: str, payload: Dict[str, Any]) -> str:
+        """Durably record one write (local SQLite commit, no network); returns its entry_id"""
+        if kind not in self._kinds:
+            raise KeyError(f"No journal handler registered for {kind!r}")
+        payload = {"entry_id": str(uuid.uuid4()), **payload}
+        try:
+            self.db.execute("INSERT INTO journal (kind, payload, created_at) VALUES (?, ?, ?)",
+                            (kind, dumps(payload).decode("utf-8"), time.time()))
+        except sqlite3.Error:
+            self.stats["append_errors"] += 1
+            raise
+        self.stats["appended"] += 1
+        self._pending[kind] += 1
+        if self._pending[kind] >= self._kinds[kind].batch_size and self._wake is not None:
+            self._wake.set()
+        return payload["entry_id"]
+
+    def insert(self, table: str, row: Dict[str, Any]) -> str:
+        """Journal an insert into `table`; returns the row id (assigned now, so replays are upserts)"""
+        row = {"id": row.get("id") or str(uuid.uuid4()), **row}
+        self.append(INSERT_KIND, {"table": table, "row": row})
+        return row["id"]
+
+    # ---------- flushing ----------
+
+    def _claim(self, kind: str, limit: int) -> List[tuple]:
+        """Lease up to `limit` due entries: [(seq, payload, attempts)]"""
+        now = time.time()
+        db = self.db
+        db.execute("BEGIN IMMEDIATE")  # other worker processes sharing the file wait here
+        try:
+            rows = db.execute(
+                "SELECT seq, payload, attempts FROM journal WHERE kind = ? AND dead = 0 AND next_attempt_at <= ?"
+                " AND (lease_until IS NULL OR lease_until < ?) ORDER BY seq LIMIT ?",
+                (kind, now, now, limit)).fetchall()
+            claimed, stamped = [], []
+            for seq, payload, attempts in rows:
+                payload = loads(payload)
+                if "entry_id" not in payload:  # appended by a version that didn't stamp ids
+                    payload["entry_id"] = str(uuid.uuid4())
+                    stamped.append((dumps(payload).decode("utf-8"), seq))
+                claimed.append((seq, payload, attempts))
+            if stamped:
+                db.executemany("UPDATE journal SET payload = ? WHERE seq = ?", stamped)
+            if rows:
+                db.executemany("UPDATE journal SET lease_until = ? WHERE seq = ?",
+                               [(now + LEASE_SECONDS, row[0]) for row in rows])
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return claimed
+
+    def _retry_delay(self, attempts: int) -> float:
+        delay = min(self.retry_base_delay * (2 ** (attempts - 1)), self.retry_max_delay)
+        return delay * random.uniform(0.5, 1.0)
+
+    def _settle_failed(self, kind: str, rows: List[tuple], error: Exception):
+        permanent = is_permanent_failure(error)
+        detail = str(getattr(error, "detail", error))[:500]
+        now = time.time()
+        updates = []
+        dead = 0
+        for seq, _, attempts in rows:
+            attempts += 1
+            is_dead = permanent or attempts >= self.max_attempts
+            dead += is_dead
+            updates.append((attempts, now + self._retry_delay(attempts), int(is_dead), detail, seq))
+        self.db.executemany("UPDATE journal SET attempts = ?, next_attempt_at = ?, lease_until = NULL,"
+                            " dead = ?, last_error = ? WHERE seq = ?", updates)
+        self.stats["retries"] += len(rows) - dead
+        self.stats["dead_letters"] += dead
+        if dead:
+            logger.error("❌ Journal %s: %d entr(ies) moved to dead letters: %s", kind, dead, detail)
+        else:
+            logger.warning("⚠️ Journal %s flush failed, %d entr(ies) will be retried: %s", kind, len(rows), detail)
+
+    async def _write(self, kind: str, entry: _Kind, rows: List[tuple]) -> Tuple[int, bool]:
+        """Hand rows to the handler: (entries written, False if some are left for a retry)
+
+        A 4xx rejection of several entries is split in halves until only the rejected ones fail;
+        the halves that went through are settled (handlers dedupe, so a half written twice is fine).
+        """
+        try:
+            await entry.handler([row[1] for row in rows])
+        except Exception as e:
+            if len(rows) > 1 and is_permanent_failure(e):
+                self.stats["splits"] += 1
+                middle = len(rows) // 2
+                first, first_ok = await self._write(kind, entry, rows[:middle])
+                second, second_ok = await self._write(kind, entry, rows[middle:])
+                return first + second, first_ok and second_ok
+            self._settle_failed(kind, rows, e)
+            return 0, is_permanent_failure(e)
+        self.db.executemany("DELETE FROM journal WHERE seq = ?", [(row[0],) for row in rows])
+        self.stats["flushed"] += len(rows)
+        self.stats["batches"] += 1
+        return len(rows), True
+
+    async def _flush_kind(self, kind: str) -> int:
+        entry = self._kinds[kind]
+        entry.last_flush = time.monotonic()
+        self._pending[kind] = 0
+        flushed = 0
+        while True:
+            rows = self._claim(kind, entry.batch_size)
+            if not rows:
+                return flushed
+            written, settled = await self._write(kind, entry, rows)
+            flushed += written
+            if not settled or len(rows) < entry.batch_size:
+                return flushed  # something will be retried later - stop draining for now
+
+    async def flush(self, kind: Optional[str] = None) -> int:
+        """Drain due entries of one kind (or all kinds); returns the number written"""
+        total = 0
+        for name in ([kind] if kind else list(self._kinds)):
+            # One drain per kind at a time - a second caller waits for the running one
+            running = self._flushing.get(name)
+            if running is not None:
+                await asyncio.shield(running)
+                continue
+            task = asyncio.ensure_future(self._flush_kind(name))
+            self._flushing[name] = task
+            try:
+                total += await asyncio.shield(task)
+            finally:
+                if self._flushing.get(name) is task:
+                    del self._flushing[name]
+        return total
+
+    # ---------- background task ----------
+
+    def start(self):
+        """Start the periodic flusher (app lifespan); entries left by a previous run go first"""
+        if self._task is not None:
+            return
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info("📒 Write journal started (%s, flush every %ss)", self.path, self.flush_interval)
+
+    async def _run(self):
+        tick = min(entry.flush_interval for entry in self._kinds.values())
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=tick)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            now = time.monotonic()
+            for kind, entry in list(self._kinds.items()):
+                if self._pending[kind] >= entry.batch_size or now - entry.last_flush >= entry.flush_interval:
+                    try:
+                        await self.flush(kind)
+                    except Exception as e:
+                        logger.exception("❌ Journal flusher error (%s): %s", kind, e)
+
+    async def stop(self):
+        """Stop the flusher and try once more to drain; anything left stays on disk for next start"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wake = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.warning("⚠️ Journal drain on shutdown failed, entries kept for next start: %s", e)
+
+    # ---------- inspection ----------
+
+    def depth(self, kind: Optional[str] = None, dead: bool = False) -> int:
+        query = "SELECT COUNT(*) FROM journal WHERE dead = ?"
+        params: List[Any] = [int(dead)]
+        if kind:
+            query += " AND kind = ?"
+            params.append(kind)
+        return self.db.execute(query, params).fetchone()[0]
+
+    def dead_letters(self, limit: int = 50, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Dead entries without their payloads (conversation text, phones) - newest first"""
+        query = "SELECT seq, kind, attempts, created_at, next_attempt_at, last_error FROM journal WHERE dead = 1"
+        params: List[Any] = []
+        if kind:
+            query += " AND kind = ?"
+            params.append(kind)
+        rows = self.db.execute(query + " ORDER BY seq DESC LIMIT ?", params + [limit]).fetchall()
+        return [{"seq": seq, "kind": entry_kind, "attempts": attempts, "created_at": created_at,
+                 "last_attempt_at": last_attempt_at, "last_error": last_error}
+                for seq, entry_kind, attempts, created_at, last_attempt_at, last_error in rows]
+
+    def retry(self, seq: int) -> bool:
+        """Put a dead entry back in the journal with a fresh attempt budget"""
+        cursor = self.db.execute("UPDATE journal SET dead = 0, attempts = 0, next_attempt_at = 0, lease_until = NULL,"
+                                 " last_error = NULL WHERE seq = ? AND dead = 1", (seq,))
+        if cursor.rowcount:
+            self.stats["requeued"] += 1
+            if self._wake is not None:
+                self._wake.set()
+        return bool(cursor.rowcount)
+
+    def get_stats(self) -> Dict[str, Any]:
+        by_kind: Dict[str, Dict[str, Any]] = {kind: {"pending": 0, "dead": 0} for kind in self._kinds}
+        for kind, dead, count, oldest in self.db.execute(
+                "SELECT kind, dead, COUNT(*), MIN(created_at) FROM journal GROUP BY kind, dead"):
+            counts = by_kind.setdefault(kind, {"pending": 0, "dead": 0})
+            counts["dead" if dead else "pending"] = count
+            if not dead:
+                counts["oldest_age_seconds"] = round(time.time() - oldest, 1)
+        return {
+            **self.stats,
+            "path": self.path,
+            "running": self._task is not None,
+            "kinds": by_kind,
+        }
+
+
+# Global instance
+write_journal = WriteJournal(JOURNAL_PATH, JOURNAL_SYNC, JOURNAL_FLUSH_INTERVAL, JOURNAL_BATCH_SIZE,
+                             JOURNAL_MAX_ATTEMPTS, JOURNAL_RETRY_BASE_DELAY, JOURNAL_RETRY_MAX_DELAY)
@@ -0,0 +1,943 @@
+#!/usr/bin/env python3
+"""
+Database Layer Test (offline)
+Validates supabase_request plumbing against the SQLite PostgREST fake:
+GET coalescing, read-through cache, write-driven invalidation,
+retries/circuit breakers, the query builder, the customer identity cache,
+the customer dedupe job, incremental customer aggregates, order numbers,
+Idempotency-Key handling and OrderCreate validation on order creation,
+the /api/menu catalog snapshot, the write journal, the job queue
+the staff dashboard's paginated day view, change feed and order event stream,
+the per-order tracking WebSocket and order status ETags
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+from fastapi import HTTPException
+
+from benchmarks.harness import seed_catalog, sample_order, fake_app
+from benchmarks.fake_postgrest import FakePostgrest
+from services.http_pool import init_http_pool, close_http_pool
+from services.database_service import (
+    supabase_request, find_or_create_customer, customer_rpc, _find_or_create_customer_legacy
+)
+from services.request_coalescer import supabase_coalescer
+from services.query_cache import query_cache
+from services.customer_cache import customer_cache
+from services.resilience import get_breaker
+from services.query_builder import Query, template, decode_cursor
+from services.customer_dedupe import CustomerDedupeJob
+from services.customer_stats import customer_stats, backfill_customer_stats
+from services.order_status import change_order_status, ORDER_STATUSES, ACTIVE_STATUSES
+from services.order_numbers import OrderNumberGenerator
+from services.menu_catalog import menu_catalog
+from services.write_journal import WriteJournal
+from services.job_queue import JobQueue, job_queue
+from services.order_events import OrderEventBus, order_events, RESET_FRAME, HEARTBEAT_FRAME
+from services.order_tracking import Watcher, order_tracker
+from services.order_versions import order_versions
+from routers import orders as orders_router
+from schemas.order_schemas import OrderCreate
+
+
+async def _with_fake(scenario, **fake_kwargs):
+    fake = FakePostgrest(**fake_kwargs)
+    query_cache.clear()
+    customer_cache.clear()
+    await init_http_pool(transport=fake)
+    try:
+        return await scenario(fake)
+    finally:
+        await close_http_pool()
+        fake.close()
+
+
+@asynccontextmanager
+async def _websocket(path):
+    """Minimal ASGI WebSocket client on the test's event loop; yields the queue of server messages"""
+    from main import app
+    incoming, outgoing = asyncio.Queue(), asyncio.Queue()
+    scope = {"type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws", "path": path,
+             "raw_path": path.encode(), "query_string": b"", "root_path": "", "headers": [(b"host", b"test")],
+             "client": ("127.0.0.1", 5000), "server": ("test", 80), "subprotocols": []}
+    task = asyncio.create_task(app(scope, incoming.get, outgoing.put))
+    await incoming.put({"type": "websocket.connect"})
+    assert (await outgoing.get())["type"] == "websocket.accept"
+    try:
+        yield outgoing
+    finally:
+        await incoming.put({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(task, 2)
+
+
+def test_concurrent_gets_are_coalesced():
+    """10 identical concurrent GETs -> 1 round trip"""
+    async def scenario(fake):
+        fake.seed_rows("orders", [{"order_number": "T0001", "total_amount": 100}])
+        joins_before = supabase_coalescer.stats["joins"]
+        results = await asyncio.gather(*[
+            supabase_request("GET", "orders?order_number=eq.T0001&select=*") for _ in range(10)
+        ])
+        assert all(r[0]["order_number"] == "T0001" for r in results)
+        assert fake.calls[("GET", "orders")] == 1, fake.calls
+        assert supabase_coalescer.stats["joins"] - joins_before == 9
+    asyncio.run(_with_fake(scenario, latency_ms=20))
+    print("✅ Concurrent GET coalescing: PASSED")
+    return True
+
+
+def test_catalog_reads_are_cached():
+    """menus reads hit Supabase once within the TTL"""
+    async def scenario(fake):
+        seed_catalog(fake)
+        for _ in range(5):
+            menus = await supabase_request("GET", "menus?is_available=eq.true&select=*", use_service_key=False)
+        assert len(menus) > 0
+        assert fake.calls[("GET", "menus")] == 1, fake.calls
+    asyncio.run(_with_fake(scenario))
+    print("✅ Catalog read-through cache: PASSED")
+    return True
+
+
+def test_write_invalidates_cached_reads():
+    """A PATCH through supabase_request is visible to the next cached GET"""
+    async def scenario(fake):
+        menus = seed_catalog(fake)
+        endpoint = f"menus?id=eq.{menus[0]['id']}&select=id,price"
+        assert (await supabase_request("GET", endpoint))[0]["price"] == menus[0]["price"]
+        await supabase_request("PATCH", f"menus?id=eq.{menus[0]['id']}", {"price": 999})
+        assert (await supabase_request("GET", endpoint))[0]["price"] == 999
+        assert fake.calls[("GET", "menus")] == 2, fake.calls
+    asyncio.run(_with_fake(scenario))
+    print("✅ Write-driven invalidation: PASSED")
+    return True
+
+
+def test_embedded_reads_follow_child_writes():
+    """Writes to an embedded table invalidate reads that embed it"""
+    async def scenario(fake):
+        query_cache.table_ttls["orders"] = 60
+        try:
+            order = fake.seed_rows("orders", [{"order_number": "T0002", "total_amount": 50}])[0]
+            endpoint = "orders?order_number=eq.T0002&select=*,order_items(*)"
+            assert (await supabase_request("GET", endpoint))[0]["order_items"] == []
+            await supabase_request("POST", "order_items", {
+                "order_id": order["id"], "menu_name": "Tuna Roll", "quantity": 1,
+                "unit_price": 50, "total_price": 50
+            })
+            assert len((await supabase_request("GET", endpoint))[0]["order_items"]) == 1
+        finally:
+            query_cache.table_ttls.pop("orders", None)
+    asyncio.run(_with_fake(scenario))
+    print("✅ Embedded table invalidation: PASSED")
+    return True
+
+
+def test_idempotent_reads_are_retried():
+    """Transient 503s on a GET are retried; a plain POST is not"""
+    async def scenario(fake):
+        fake.seed_rows("orders", [{"order_number": "T0003", "total_amount": 10}])
+        fake.fail_next(2, 503)
+        assert (await supabase_request("GET", "orders?order_number=eq.T0003"))[0]["order_number"] == "T0003"
+        assert fake.calls[("GET", "orders")] == 3, fake.calls
+
+        fake.fail_next(1, 503)
+        try:
+            await supabase_request("POST", "conversations", {"line_user_id": "LINE_x", "message_text": "hi"})
+            raise AssertionError("POST should not be retried")
+        except HTTPException:
+            pass
+        assert fake.calls[("POST", "conversations")] == 1, fake.calls
+    asyncio.run(_with_fake(scenario))
+    print("✅ Idempotent-aware retries: PASSED")
+    return True
+
+
+def test_open_breaker_fails_fast():
+    """After repeated failures the table's breaker short-circuits without a round trip"""
+    async def scenario(fake):
+        breaker = get_breaker("staff_actions")
+        fake.fail_tables.add("staff_actions")
+        for _ in range(breaker.threshold):
+            try:
+                await supabase_request("POST", "staff_actions", {"staff_id": "s1", "action": "test"})
+            except HTTPException:
+                pass
+        calls = fake.calls[("POST", "staff_actions")]
+        try:
+            await supabase_request("POST", "staff_actions", {"staff_id": "s1", "action": "test"})
+            raise AssertionError("breaker should be open")
+        except HTTPException as e:
+            assert e.status_code == 503
+        assert fake.calls[("POST", "staff_actions")] == calls
+        assert breaker.state == "open"
+    asyncio.run(_with_fake(scenario))
+    print("✅ Circuit breaker fail-fast: PASSED")
+    return True
+
+
+def test_query_builder_projects_columns():
+    """Templates render stable endpoints and only return the projected columns"""
+    query = Query("orders").select("id", "status").eq("customer_phone", "+66 81").in_("status", ["pending", "a,b"])
+    assert query.to_endpoint() == 'orders?select=id,status&customer_phone=eq.%2B66%2081&status=in.(pending,"a%2Cb")'
+    assert template("order_status", "T1").shape == template("order_status", "T2").shape
+
+    async def scenario(fake):
+        menus = seed_catalog(fake)
+        order = fake.seed_rows("orders", [{"order_number": "T0004", "total_amount": 50, "status": "pending"}])[0]
+        fake.seed_rows("order_items", [{"order_id": order["id"], "menu_id": menus[0]["id"], "menu_name": "x",
+                                        "quantity": 1, "unit_price": 50, "total_price": 50}])
+        row = await template("order_status", "T0004").first()
+        assert "metadata" not in row and "customer_id" not in row
+        assert row["order_items"][0]["menus"] == {"name": menus[0]["name"]}
+        await Query("orders").eq("order_number", "T0004").update({"status": "confirmed"})
+        assert (await template("order_by_number", "T0004").first())["status"] == "confirmed"
+    asyncio.run(_with_fake(scenario))
+    print("✅ Query builder projection: PASSED")
+    return True
+
+
+def test_repeat_customers_resolve_from_cache():
+    """Legacy path: second order from the same customer needs no lookups; PATCHed phones re-index"""
+    async def scenario(fake):
+        customer_rpc["enabled"] = False
+        web_id = await find_or_create_customer("Somchai", "0811111111")
+        fake.reset_stats()
+        assert await find_or_create_customer("Somchai", "0811111111") == web_id
+        assert sum(fake.calls.values()) == 0, fake.calls
+
+        # Same phone ordering from LINE upgrades the WEB_ platform ID (one PATCH, no GETs after)
+        line_id = await find_or_create_customer("Somchai", "0811111111", "LINE", "U123")
+        assert line_id == web_id
+        fake.reset_stats()
+        await find_or_create_customer("Somchai", "0822222222", "LINE", "U123")  # phone changed
+        assert fake.calls == {("PATCH", "customers"): 1}, fake.calls
+        assert customer_cache.get_by_phone("0811111111") is None
+        assert customer_cache.get_by_phone("0822222222")["id"] == web_id
+        assert fake.select("customers", ' WHERE "id" = ?', [web_id])[0]["phone"] == "0822222222"
+    try:
+        asyncio.run(_with_fake(scenario))
+    finally:
+        customer_rpc["enabled"] = True
+    print("✅ Customer identity cache: PASSED")
+    return True
+
+
+def test_legacy_resolution_leaves_shared_rows_alone():
+    """Legacy path: upgrading a customer doesn't mutate the GET result a coalesced caller also holds"""
+    async def scenario(fake):
+        customer = fake.seed_rows("customers", [{"display_name": "Shared", "phone": "0833333333",
+                                                 "line_user_id": "WEB_0833333333"}])[0]
+        phone_query = "customers?phone=eq.0833333333&select=id,line_user_id,phone&limit=1"
+        fake.reset_stats()
+        other, customer_id = await asyncio.gather(
+            supabase_request("GET", phone_query, use_service_key=False),
+            _find_or_create_customer_legacy("Shared", "0833333333", "LINE", None, "LINE_Ushared"))
+        assert customer_id == customer["id"]
+        assert fake.calls[("GET", "customers")] == 1  # the resolver joined the in-flight read
+        assert other[0]["line_user_id"] == "WEB_0833333333", other
+        assert customer_cache.get_by_platform_id("LINE_Ushared")["id"] == customer["id"]
+    asyncio.run(_with_fake(scenario, latency_ms=20))
+    print("✅ Legacy resolution copies shared rows: PASSED")
+    return True
+
+
+def test_concurrent_first_orders_create_one_customer():
+    """resolve_customer RPC: parallel first orders from one phone never duplicate the customer"""
+    async def scenario(fake):
+        ids = await asyncio.gather(*[
+            find_or_create_customer(f"Guest {i}", "0833333333") for i in range(20)
+        ])
+        assert len(set(ids)) == 1, ids
+        assert len(fake.select("customers", ' WHERE "phone" = ?', ["0833333333"])) == 1
+
+        customer_cache.clear()
+        line_ids = await asyncio.gather(*[
+            find_or_create_customer("Guest", "0833333333", "LINE", "U999") for _ in range(10)
+        ])
+        assert set(line_ids) == set(ids)
+        rows = fake.select("customers", ' WHERE "phone" = ?', ["0833333333"])
+        assert len(rows) == 1 and rows[0]["line_user_id"] == "LINE_U999"
+
+        fake.reset_stats()
+        await find_or_create_customer("Guest", "0833333333", "LINE", "U999")
+        assert sum(fake.calls.values()) == 0  # identity cache hit
+    asyncio.run(_with_fake(scenario, latency_ms=5, jitter_ms=5, seed=7))
+    print("✅ Concurrent customer resolution (no duplicates): PASSED")
+    return True
+
+
+def test_customer_dedupe_resumes_from_checkpoint():
+    """Dedupe job: stopped twice, resumed from a cursor-only checkpoint, merges into the oldest row"""
+    def customer(minute, name, phone, platform_id, orders=0, spent=0.0):
+        return {"display_name": name, "phone": phone, "line_user_id": platform_id,
+                "platform_type": platform_id.split("_")[0], "total_orders": orders, "total_spent": spent,
+                "created_at": f"2025-01-01T10:{minute:02d}:00+00:00"}
+
+    async def scenario(fake):
+        rows = fake.seed_rows("customers", [
+            customer(0, "Ann", "0811111111", "WEB_0811111111", 2, 200.0),
+            customer(1, "คุณ Somchai", None, "LINE_Ub"),
+            *[customer(2 + i, f"Filler {i}", f"08200000{i:02d}", f"WEB_08200000{i:02d}", 1, 10.0) for i in range(6)],
+            customer(8, "Ann L", "+66 81-111-1111", "LINE_Ua", 1, 50.0),
+            customer(9, "somchai", None, "LINE_Ub"),
+            customer(10, "Ann", "66811111111", "WEB_x1", 1, 25.0),
+            customer(11, "ann l", None, "LINE_Ua"),  # only matches the merged-away "Ann L" (merged_from)
+        ])
+        fake.seed_rows("orders", [{"order_number": "T-DUP", "customer_id": rows[8]["id"], "total_amount": 50}])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            checkpoint = os.path.join(tmp, "dedupe.json")
+            first = await CustomerDedupeJob(page_size=3, checkpoint_path=checkpoint).run(max_pages=2)
+            assert not first["done"] and first["merged"] == 0 and first["scanned"] == 6
+
+            second = CustomerDedupeJob(page_size=3, checkpoint_path=checkpoint)
+            assert second.load_checkpoint()
+            assert (await second.run(max_pages=1))["merged"] == 1  # "Ann L" merged, then stopped
+            with open(checkpoint, "rb") as f:
+                assert "index" not in json.loads(f.read())  # cursor only - rebuilt on resume
+
+            resumed = CustomerDedupeJob(page_size=3, checkpoint_path=checkpoint)
+            assert resumed.load_checkpoint()
+            customer_stats.add(rows[10]["id"], orders=1, lifetime_value=5.0, spent=5.0)  # not flushed yet
+            stats = await resumed.run()
+            assert stats["done"] and stats["merged"] == 4 and stats["scanned"] == 12, stats
+
+        assert len(fake.select("customers")) == 8
+        ann = fake.select("customers", ' WHERE "id" = ?', [rows[0]["id"]])[0]
+        assert ann["total_orders"] == 5 and ann["total_spent"] == 280.0  # the duplicate's pending delta too
+        assert ann["line_user_id"] == "LINE_Ua"  # real platform ID beats WEB_
+        assert {entry["id"] for entry in ann["merged_from"]} == {rows[8]["id"], rows[10]["id"], rows[11]["id"]}
+        assert fake.select("orders")[0]["customer_id"] == rows[0]["id"]
+        somchai = fake.select("customers", ' WHERE "id" = ?', [rows[1]["id"]])[0]
+        assert [entry["id"] for entry in somchai["merged_from"]] == [rows[9]["id"]]
+
+        rerun = await CustomerDedupeJob(page_size=3).run()
+        assert rerun["duplicates"] == 0
+    asyncio.run(_with_fake(scenario))
+    print("✅ Customer dedupe job (resumable): PASSED")
+    return True
+
+
+def test_customer_stats_write_behind():
+    """Order create/complete/cancel deltas are buffered and applied in one RPC, replays skipped; backfill agrees"""
+    async def scenario(fake):
+        customer = fake.seed_rows("customers", [{"display_name": "Stats", "phone": "0844444444"}])[0]
+        orders = fake.seed_rows("orders", [
+            {"order_number": f"T-S{i}", "customer_id": customer["id"], "total_amount": 100.0 * (i + 1),
+             "status": "pending", "created_at": f"2025-01-0{i + 1}T12:00:00+00:00"} for i in range(3)
+        ])
+        for order in orders:
+            customer_stats.record_order_created(order)
+        await change_order_status("T-S0", "completed")
+        await change_order_status("T-S1", "cancelled")
+        await change_order_status("T-S0", "completed")  # same status - no delta
+
+        def check():
+            row = fake.select("customers", ' WHERE "id" = ?', [customer["id"]])[0]
+            assert row["total_orders"] == 2, row
+            assert row["lifetime_value"] == 400.0 and row["total_spent"] == 100.0, row
+            assert row["last_order_at"].startswith("2025-01-03"), row
+
+        journaled = [json.loads(payload) for (payload,) in customer_stats.journal.db.execute(
+            "SELECT payload FROM journal WHERE kind = ?", [customer_stats.KIND])]
+        fake.reset_stats()
+        assert await customer_stats.flush() == 1
+        assert sum(fake.calls.values()) == 1 and fake.calls[("POST", "apply_customer_stats")] == 1
+        check()
+
+        # Crash after the RPC committed but before the journal deleted the batch: the replay is a no-op
+        await customer_stats.apply(journaled)
+        check()
+
+        fake.update("customers", {"total_orders": 0, "total_spent": 0, "lifetime_value": 0, "last_order_at": None},
+                    ' WHERE "id" = ?', [customer["id"]])
+        # An order of a customer deleted since (merged away) - the backfill must not recreate it
+        fake.seed_rows("orders", [{"order_number": "T-S9", "customer_id": "00000000-0000-4000-8000-000000000009",
+                                   "total_amount": 50.0, "status": "completed"}])
+        assert await backfill_customer_stats(page_size=2) == {"orders_scanned": 4, "customers_updated": 1}
+        assert len(fake.select("customers")) == 1
+        check()
+        del fake.rpc_functions["set_customer_stats"]  # not installed: PATCH by id instead
+        assert await backfill_customer_stats(page_size=2) == {"orders_scanned": 4, "customers_updated": 1}
+        assert len(fake.select("customers")) == 1
+        check()
+    asyncio.run(_with_fake(scenario))
+    print("✅ Customer stats write-behind + backfill: PASSED")
+    return True
+
+
+def test_order_numbers_need_no_existence_check():
+    """Order numbers: monotonic under a stalled clock, no pre-check GET, a unique clash draws again"""
+    clock = lambda: 1760000000.0  # frozen - every number lands in the same ms
+    generator = OrderNumberGenerator(node_id=5, clock=clock)
+    numbers = [generator.next() for _ in range(600)]
+    assert numbers == sorted(numbers) and len(set(numbers)) == 600
+    assert generator.stats["sequence_overflows"] == 2
+    other = OrderNumberGenerator(node_id=6, clock=clock)
+    assert not set(numbers) & {other.next() for _ in range(600)}
+
+    class Replay:
+        """First draw repeats an existing number"""
+        def __init__(self, first):
+            self.pending = [first]
+        def next(self):
+            return self.pending.pop() if self.pending else generator.next()
+
+    async def scenario(fake):
+        menus = seed_catalog(fake)
+        fake.seed_rows("orders", [{"order_number": "T1017TAKEN0000", "total_amount": 1}])
+        original = orders_router.order_numbers
+        orders_router.order_numbers = Replay("T1017TAKEN0000")
+        try:
+            fake.reset_stats()
+            order = await orders_router._create_order_multi_call(OrderCreate(
+                customer_name="Numbers", customer_phone="0855555555", total_amount=60.0,
+                order_type="pickup", items=[{"id": menus[0]["id"], "name": "Salmon Nigiri",
+                                             "quantity": 1, "price": 60.0}],
+            ), datetime.now(timezone.utc))
+        finally:
+            orders_router.order_numbers = original
+        assert order["order_number"] != "T1017TAKEN0000"
+        assert fake.calls[("GET", "orders")] == 0  # no existence check
+        assert fake.calls[("POST", "orders")] == 2  # clash, then a fresh number
+    asyncio.run(_with_fake(scenario))
+    print("✅ Order numbers without existence check: PASSED")
+    return True
+
+
+def test_idempotent_order_retries():
+    """Idempotency-Key: concurrent and later retries get the first response, one order is created"""
+    async def scenario():
+        async with fake_app(latency_ms=20) as (client, fake):
+            payload = sample_order(seed_catalog(fake), 2, phone="0866666666")
+            headers = {"Idempotency-Key": "order-retry-1"}
+            responses = await asyncio.gather(*[
+                client.post("/api/orders/create", json=payload, headers=headers) for _ in range(5)
+            ])
+            assert {r.status_code for r in responses} == {200}
+            assert len({r.json()["order_number"] for r in responses}) == 1
+            assert sum(r.headers.get("Idempotent-Replayed") == "true" for r in responses) == 4
+
+            fake.reset_stats()
+            late = await client.post("/api/orders/create", json=payload, headers=headers)
+            assert late.json() == responses[0].json() and sum(fake.calls.values()) == 0
+            assert len(fake.select("orders", ' WHERE "customer_phone" = ?', ["0866666666"])) == 1
+
+            changed = await client.post("/api/orders/create", json={**payload, "notes": "other"}, headers=headers)
+            assert changed.status_code == 422
+    asyncio.run(scenario())
+    print("✅ Idempotent order retries: PASSED")
+    return True
+
+
+def test_order_create_contract():
+    """OrderCreate: field-level 422s before any DB call, web app extras ignored, values flow into rows"""
+    async def scenario():
+        async with fake_app() as (client, fake):
+            payload = sample_order(seed_catalog(fake), 2, phone="0877777777")
+            fake.reset_stats()
+            bad_item = {**payload["items"][0], "quantity": 0}
+            invalid = await client.post("/api/orders/create", json={
+                **payload, "order_type": "dine-in", "items": [bad_item]})
+            assert invalid.status_code == 422
+            assert {tuple(error["loc"]) for error in invalid.json()["detail"]} == {
+                ("order_type",), ("items", 0, "quantity")}
+            malformed = await client.post("/api/orders/create", content=b"{not json")
+            assert malformed.status_code == 422 and malformed.json()["detail"][0]["type"] == "json_invalid"
+            assert sum(fake.calls.values()) == 0
+
+            extras = {**payload, "customer_name": "  Contract  ", "platform": "WEB", "platform_user_id": "x",
+                      "items": [{**item, "total": item["price"] * item["quantity"]} for item in payload["items"]]}
+            created = await client.post("/api/orders/create", json=extras)
+            assert created.status_code == 200
+            order = fake.select("orders", ' WHERE "order_number" = ?', [created.json()["order_number"]])[0]
+            assert order["customer_name"] == "Contract" and order["payment_method"] == "cash"
+            items = fake.select("order_items", ' WHERE "order_id" = ?', [order["id"]])
+            assert sorted(item["total_price"] for item in items) == sorted(
+                item["price"] * item["quantity"] for item in payload["items"])
+    asyncio.run(scenario())
+    print("✅ OrderCreate contract: PASSED")
+    return True
+
+
+def test_order_for_merged_away_customer():
+    """Multi-call orders: a cached customer deleted by another process (dedupe job) is resolved again"""
+    async def scenario():
+        async with fake_app() as (client, fake):
+            payload = sample_order(seed_catalog(fake), 1, phone="0866666666")
+            first = await client.post("/api/orders/create", json=payload)
+            assert first.status_code == 200
+            gone = fake.select("orders", ' WHERE "order_number" = ?', [first.json()["order_number"]])[0]["customer_id"]
+            fake.delete("orders", ' WHERE "customer_id" = ?', [gone])
+            fake.delete("customers", ' WHERE "id" = ?', [gone])  # the API's customer cache still has it
+
+            second = await client.post("/api/orders/create", json=payload)
+            assert second.status_code == 200, second.text
+            order = fake.select("orders", ' WHERE "order_number" = ?', [second.json()["order_number"]])[0]
+            assert order["customer_id"] != gone and fake.select("customers", ' WHERE "id" = ?', [order["customer_id"]])
+            assert customer_cache.get_by_phone("0866666666")["id"] == order["customer_id"]
+    saved = orders_router.order_rpc["enabled"], customer_rpc["enabled"]
+    try:
+        for customer_path in (False, True):  # legacy lookup, resolve_customer RPC
+            orders_router.order_rpc["enabled"], customer_rpc["enabled"] = False, customer_path
+            asyncio.run(scenario())
+    finally:
+        orders_router.order_rpc["enabled"], customer_rpc["enabled"] = saved
+    print("✅ Order for a merged-away customer: PASSED")
+    return True
+
+
+def test_menu_catalog_snapshot():
+    """/api/menu: one build serves concurrent loads, 304 on a matching ETag, rebuilt on a version bump"""
+    async def scenario():
+        async with fake_app() as (client, fake):
+            query_cache.clear()
+            menus = seed_catalog(fake)
+            fake.reset_stats()
+            responses = await asyncio.gather(*[client.get("/api/menu") for _ in range(10)])
+            assert {r.status_code for r in responses} == {200}
+            assert fake.calls[("GET", "categories")] == 1 and fake.calls[("GET", "menus")] == 1
+            first = responses[0]
+            assert first.headers["content-encoding"] == "gzip" and first.headers["etag"].endswith('-gzip"')
+            catalog = first.json()
+            assert len(catalog["categories"]) == 2 and len(catalog["menus"]) == len(menus)
+            assert catalog["menus"][0]["categories"]["name"] in ("Sushi", "Drinks")
+
+            plain = await client.get("/api/menu", headers={"Accept-Encoding": "identity"})
+            assert "content-encoding" not in plain.headers and plain.json() == catalog
+            for etag in (first.headers["etag"], plain.headers["etag"]):
+                cached = await client.get("/api/menu", headers={"If-None-Match": etag})
+                assert cached.status_code == 304 and not cached.content
+            assert sum(fake.calls.values()) == 2
+
+            # Version bump without a data change: rebuilt, same ETag, clients still get 304s
+            await client.post("/api/cache/invalidate", params={"table": "menus"})
+            unchanged = await client.get("/api/menu", headers={"If-None-Match": first.headers["etag"]})
+            assert unchanged.status_code == 304 and menu_catalog.stats["version_bumps"] >= 1
+            assert fake.calls[("GET", "menus")] == 2
+
+            await supabase_request("PATCH", f"menus?id=eq.{menus[0]['id']}", {"is_available": False})
+            changed = await client.get("/api/menu", headers={"If-None-Match": first.headers["etag"]})
+            assert changed.status_code == 200 and changed.headers["etag"] != first.headers["etag"]
+            assert len(changed.json()["menus"]) == len(menus) - 1
+    asyncio.run(scenario())
+    print("✅ Menu catalog snapshot: PASSED")
+    return True
+
+
+def test_write_journal_survives_restart_and_retries():
+    """Write journal: appends survive a restart, batches upsert by id, replays keep entry ids, dead letters"""
+    path = os.path.join(tempfile.mkdtemp(), "journal.db")
+
+    async def scenario(fake):
+        crashed = WriteJournal(path)
+        ids = [crashed.insert("conversations", {"line_user_id": f"LINE_u{i}", "message_text": "hi",
+                                                "response_text": "hello"}) for i in range(3)]
+        crashed.close()  # process died before its flusher ran
+
+        journal = WriteJournal(path, retry_base_delay=0)
+        assert journal.depth() == 3
+        fake.reset_stats()
+        assert await journal.flush() == 3
+        assert fake.calls[("POST", "conversations")] == 1
+        assert {row["id"] for row in fake.select("conversations")} == set(ids)
+
+        # Replays (retry, or a crash after the write) carry the entry ids handlers dedupe on
+        batches = []
+        async def flaky(payloads):
+            batches.append(payloads)
+            if len(batches) == 1:
+                raise HTTPException(status_code=500, detail="Database error: 503 - unavailable")
+        journal.register("flaky", flaky)
+        entry_id = journal.append("flaky", {"n": 1})
+        journal.db.execute("INSERT INTO journal (kind, payload, created_at) VALUES ('flaky', '{\"n\": 2}', 0)")
+        assert await journal.flush("flaky") == 0 and journal.depth("flaky") == 2
+        assert await journal.flush("flaky") == 2 and journal.depth("flaky") == 0
+        assert batches[0] == batches[1] and batches[0][0] == {"entry_id": entry_id, "n": 1}
+        assert batches[0][1]["n"] == 2 and batches[0][1]["entry_id"]  # appended before ids: stamped once
+
+        # One rejected row in a batch goes dead on its own; the rest of the batch is written
+        good = [journal.insert("conversations", {"line_user_id": f"LINE_b{i}", "message_text": "hi",
+                                                 "response_text": "hello"}) for i in range(2)]
+        journal.insert("no_such_table", {"value": 1})
+        good.append(journal.insert("conversations", {"line_user_id": "LINE_b2", "message_text": "hi",
+                                                     "response_text": "hello"}))
+        assert await journal.flush() == 3 and journal.stats["splits"] >= 1
+        assert set(good) <= {row["id"] for row in fake.select("conversations")}
+        assert journal.depth(dead=True) == 1 and journal.stats["dead_letters"] == 1
+        assert await journal.flush() == 0 and journal.stats["dead_letters"] == 1  # not retried
+        dead = journal.dead_letters()
+        assert [entry["kind"] for entry in dead] == ["insert"] and "payload" not in dead[0]
+        assert journal.retry(dead[0]["seq"]) and not journal.retry(dead[0]["seq"])
+        assert journal.depth(dead=True) == 0 and journal.depth() == 1
+        assert await journal.flush() == 0 and journal.depth(dead=True) == 1  # still rejected
+        journal.close()
+    asyncio.run(_with_fake(scenario))
+    print("✅ Write journal restart + retries: PASSED")
+    return True
+
+
+def test_job_queue_limits_retries_and_dead_letters():
+    """Job queue: jobs outlive a restart, per-type concurrency holds, failures retry then dead-letter"""
+    path = os.path.join(tempfile.mkdtemp(), "jobs.db")
+
+    async def noop(payload, job_id):
+        pass
+
+    async def scenario():
+        before = JobQueue(path)
+        before.register("notify", noop)
+        for n in range(5):
+            before.enqueue("notify", {"n": n})
+        before.close()  # restarted before any job ran
+
+        queue = JobQueue(path, retry_base_delay=0, max_attempts=2)
+        active, peak, seen, failed_once = [0], [0], [], set()
+        async def notify(payload, job_id):
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            await asyncio.sleep(0.01)
+            active[0] -= 1
+            if payload["n"] == 3 and job_id not in failed_once:
+                failed_once.add(job_id)
+                raise RuntimeError("LINE push failed")
+            seen.append(payload["n"])
+        queue.register("notify", notify, concurrency=2)
+        assert await queue.run_due() == 2  # two slots
+        while await queue.run_due() or queue._running:
+            await queue.drain()
+        assert sorted(seen) == [0, 1, 2, 3, 4] and peak[0] == 2
+        assert queue.stats["retried"] == 1 and queue.get_stats()["types"]["notify"]["queued"] == 0
+
+        async def broken(payload, job_id):
+            raise RuntimeError("always down")
+        queue.register("broken", broken)
+        job_id = queue.enqueue("broken", {"order_number": "T-DEAD"})
+        for _ in range(3):
+            await queue.run_due()
+            await queue.drain()
+        dead = queue.dead_letters()
+        assert [job["id"] for job in dead] == [job_id] and dead[0]["attempts"] == 2
+        assert dead[0]["order_number"] == "T-DEAD" and "payload" not in dead[0]
+        assert dead[0]["last_error"] == "always down"
+        assert queue.retry(job_id) and not queue.dead_letters()
+        queue.close()
+
+        # Order creation queues both notifications instead of running them inline
+        async with fake_app() as (client, fake):
+            queued = lambda: {name: job_queue.get_stats()["types"][name]["queued"]
+                              for name in ("order_confirmation", "staff_notification")}
+            start = queued()
+            created = await client.post("/api/orders/create", json=sample_order(seed_catalog(fake), 2))
+            assert created.status_code == 200
+            assert queued() == {name: count + 1 for name, count in start.items()}
+    asyncio.run(scenario())
+    print("✅ Job queue concurrency, retries and dead letters: PASSED")
+    return True
+
+
+def test_today_orders_cover_busy_day():
+    """Day view: only the Bangkok day's orders, every one exactly once across keyset pages, status filters"""
+    async def scenario():
+        async with fake_app() as (client, fake):
+            opening = datetime(2025, 8, 22, 17, 0, tzinfo=timezone.utc)  # 2025-08-23 00:00 in Bangkok
+            rows = [{"order_number": f"D{n:04d}", "total_amount": 100, "status": ORDER_STATUSES[n % 6],
+                     "created_at": (opening + timedelta(minutes=n // 2)).isoformat()}  # pairs share a timestamp
+                    for n in range(250)]
+            rows += [{"order_number": "BEFORE", "total_amount": 100, "created_at": "2025-08-22T23:59:59+07:00"},
+                     {"order_number": "AFTER", "total_amount": 100, "created_at": "2025-08-24T00:00:00+07:00"}]
+            fake.seed_rows("orders", rows)
+            fake.reset_stats()
+
+            pages, seen, cursor = 0, [], None
+            while True:
+                params = {"date": "2025-08-23", "limit": 100, **({"cursor": cursor} if cursor else {})}
+                page = (await client.get("/api/orders/status/today", params=params)).json()
+                pages += 1
+                seen.extend(page["orders"])
+                cursor = page["next_cursor"]
+                if not cursor:
+                    break
+            numbers = [order["order_number"] for order in seen]
+            assert pages == 3 and len(numbers) == 250 and set(numbers) == {row["order_number"] for row in rows[:250]}
+            keys = [(order["created_at"], order["id"]) for order in seen]
+            assert keys == sorted(keys, reverse=True)  # newest first, ties broken by id
+            assert fake.calls[("GET", "orders")] == 3
+
+            active = (await client.get("/api/orders/today", params={"date": "2025-08-23", "status": "active",
+                                                                  "limit": 500})).json()
+            assert {order["status"] for order in active["orders"]} == set(ACTIVE_STATUSES)
+            assert len(active["orders"]) == 126 and active["next_cursor"] is None
+            ready = (await client.get("/api/orders/status/today", params={"date": "2025-08-23",
+                                                                         "status": "ready,completed"})).json()
+            assert len(ready["orders"]) == 83 and {o["status"] for o in ready["orders"]} == {"ready", "completed"}
+
+            for params in ({"cursor": "not-a-cursor"}, {"status": "lost"}, {"date": "23/08/2025"}):
+                assert (await client.get("/api/orders/status/today", params=params)).status_code == 400
+    asyncio.run(scenario())
+    print("✅ Today's orders day range + keyset pages: PASSED")
+    return True
+
+
+def test_order_changes_feed():
+    """/api/orders/changes: only rows past the cursor, status changes show up, an idle poll is one empty GET"""
+    async def scenario():
+        settle, orders_router.changes_feed["settle_seconds"] = orders_router.changes_feed["settle_seconds"], 0
+        try:
+            await run()
+        finally:
+            orders_router.changes_feed["settle_seconds"] = settle
+
+    async def run():
+        async with fake_app() as (client, fake):
+            menus = seed_catalog(fake)
+            fake.seed_rows("orders", [{"order_number": f"OLD{n}", "total_amount": 100,
+                                       "updated_at": f"2025-08-23T10:00:0{n}+07:00"} for n in range(3)])
+            start = (await client.get("/api/orders/changes")).json()
+            assert start["orders"] == [] and start["next_cursor"]
+            assert (await client.get("/api/orders/changes", params={"since": start["next_cursor"]})).json()["orders"] == []
+
+            created = [(await client.post("/api/orders/create", json=sample_order(menus, 1))).json()["order_number"]
+                       for _ in range(3)]
+            patched = await client.patch(f"/api/orders/{created[0]}/status", json={"status": "preparing"})
+            assert patched.status_code == 200
+
+            fake.reset_stats()
+            seen, cursor, pages = {}, start["next_cursor"], 0
+            while True:
+                page = await client.get("/api/orders/changes", params={"since": cursor, "limit": 2})
+                assert page.headers["cache-control"] == "no-store"
+                page = page.json()
+                pages += 1
+                seen.update({order["order_number"]: order["status"] for order in page["orders"]})
+                cursor = page["next_cursor"]
+                if not page["has_more"]:
+                    break
+            assert pages == 2 and fake.calls[("GET", "orders")] == 2
+            assert seen == {created[0]: "preparing", created[1]: "pending", created[2]: "pending"}
+
+            fake.reset_stats()
+            idle = (await client.get("/api/orders/changes", params={"since": cursor})).json()
+            assert idle["orders"] == [] and idle["next_cursor"] == cursor
+            assert fake.calls[("GET", "orders")] == 1
+
+            await client.patch(f"/api/orders/{created[2]}/status", json={"status": "cancelled"})
+            later = (await client.get("/api/orders/changes", params={"since": cursor})).json()
+            assert [(o["order_number"], o["status"]) for o in later["orders"]] == [(created[2], "cancelled")]
+            assert (await client.get("/api/orders/changes", params={"since": "x"})).status_code == 400
+    asyncio.run(scenario())
+    print("✅ Order change feed: PASSED")
+    return True
+
+
+def test_order_changes_late_commit():
+    """Change feed: a row committed late with an older updated_at still arrives (cursor never passes the settle horizon)"""
+    async def scenario():
+        async with fake_app() as (client, fake):
+            now = datetime.now(timezone.utc)
+            stamp = lambda seconds: (now - timedelta(seconds=seconds)).isoformat()
+            fake.seed_rows("orders", [{"order_number": "SETTLED", "total_amount": 100, "updated_at": stamp(60)},
+                                      {"order_number": "B-FAST", "total_amount": 100, "updated_at": stamp(1)}])
+            start = (await client.get("/api/orders/changes")).json()["next_cursor"]
+            assert decode_cursor(start, 2)[0] < stamp(5)  # the fresh row doesn't move the start cursor
+
+            first = (await client.get("/api/orders/changes", params={"since": start})).json()
+            assert first["orders"] == [] and first["next_cursor"] == start  # B-FAST not handed out yet
+
+            # Transaction A stamped before B but commits only now
+            fake.seed_rows("orders", [{"order_number": "A-SLOW", "total_amount": 100, "updated_at": stamp(2)}])
+            settle, orders_router.changes_feed["settle_seconds"] = orders_router.changes_feed["settle_seconds"], 0
+            try:
+                later = (await client.get("/api/orders/changes", params={"since": first["next_cursor"]})).json()
+            finally:
+                orders_router.changes_feed["settle_seconds"] = settle
+            assert [order["order_number"] for order in later["orders"]] == ["A-SLOW", "B-FAST"]
+    asyncio.run(scenario())
+    print("✅ Order change feed late commit: PASSED")
+    return True
+
+
+def test_order_event_stream():
+    """Order events: publishers fan out, Last-Event-ID replays, slow clients are cut off, heartbeats when idle"""
+    def drain(subscriber):
+        frames = []
+        while not subscriber.queue.empty():
+            frames.append(subscriber.queue.get_nowait())
+        return frames
+
+    async def scenario():
+        bus = OrderEventBus(replay_size=5, client_backlog=3, heartbeat=0.01)
+        live = bus.subscribe()
+        assert drain(live)[-1].startswith(b"retry: ")
+        bus.publish("order_created", {"order_number": "E1", "status": "pending", "secret": "x"})
+        frame = drain(live)[0]
+        assert frame.startswith(f"id: {bus.epoch}-1\nevent: order_created\n".encode()) and b"secret" not in frame
+
+        # Resume: only what came after the client's last id, then its new position
+        for n in range(2, 5):
+            bus.publish("order_status_changed", {"order_number": f"E{n}", "status": "confirmed"})
+        resumed = drain(bus.subscribe(f"{bus.epoch}-2"))
+        assert [f.split(b"\n")[0] for f in resumed] == [f"id: {bus.epoch}-{n}".encode() for n in (3, 4)] + [b"retry: 3000"]
+        for stale in ("otherproc-3", f"{bus.epoch}-99"):
+            assert drain(bus.subscribe(stale))[0] == RESET_FRAME
+
+        # `live` never read: the 4th queued event disconnects it instead of growing its queue
+        for n in range(5, 9):
+            bus.publish("order_created", {"order_number": f"E{n}"})
+        assert live.closed and bus.stats["slow_client_disconnects"] >= 1
+        assert drain(bus.subscribe(f"{bus.epoch}-1"))[0] == RESET_FRAME  # fell out of the 5-event buffer
+
+        quiet = bus.subscribe(bus.last_event_id)
+        stream = bus.stream(quiet)
+        assert (await stream.__anext__()).startswith(b"retry: ")
+        assert await stream.__anext__() == HEARTBEAT_FRAME
+        bus.close()
+        assert [frame async for frame in stream] == [] and bus.get_stats()["clients"] == 0
+
+        # Order creation and status changes publish to the app's bus
+        async with fake_app() as (client, fake):
+            watcher = order_events.subscribe()
+            drain(watcher)
+            number = (await client.post("/api/orders/create", json=sample_order(seed_catalog(fake), 1))).json()["order_number"]
+            await client.patch(f"/api/orders/{number}/status", json={"status": "confirmed"})
+            events = [f.split(b"\n")[1] for f in drain(watcher)]
+            assert events == [b"event: order_created", b"event: order_status_changed"]
+            order_events.unsubscribe(watcher)
+    asyncio.run(scenario())
+    print("✅ Order event stream: PASSED")
+    return True
+
+
+def test_order_tracking_websocket():
+    """Tracking WebSocket: current state on connect, pushes only to that order's tabs, per-order cap"""
+    async def next_message(messages):
+        message = await asyncio.wait_for(messages.get(), 2)
+        return json.loads(message["text"]) if message["type"] == "websocket.send" else message
+
+    async def scenario():
+        watcher = Watcher()
+        watcher.push("preparing")
+        watcher.push("ready")
+        assert await watcher.next() == "ready"  # a slow tab only ever gets the newest status
+
+        async with fake_app() as (client, fake):
+            menus = seed_catalog(fake)
+            first, other = [(await client.post("/api/orders/create", json=sample_order(menus, 1))).json()["order_number"]
+                            for _ in range(2)]
+            async with _websocket(f"/api/orders/{first}/track") as tab1, \
+                    _websocket(f"/api/orders/{first}/track") as tab2, \
+                    _websocket(f"/api/orders/{other}/track") as tab3:
+                for tab, number in ((tab1, first), (tab2, first), (tab3, other)):
+                    hello = await next_message(tab)
+                    assert hello["order_number"] == number and hello["status"] == "pending"
+                fake.reset_stats()
+                await client.patch(f"/api/orders/{first}/status", json={"status": "preparing"})
+                for tab in (tab1, tab2):
+                    update = await next_message(tab)
+                    assert update["status"] == "preparing"
+                    assert [step["completed"] for step in update["status_history"]] == [True, True, True, False, False]
+                await asyncio.sleep(0.05)
+                assert tab3.empty() and fake.calls[("GET", "orders")] == 1  # the PATCH's own read only
+
+                order_tracker.max_per_order = 2
+                try:
+                    async with _websocket(f"/api/orders/{first}/track") as rejected:
+                        assert (await next_message(rejected)) == {"type": "websocket.close", "code": 1013, "reason": ""}
+                finally:
+                    order_tracker.max_per_order = 10
+                assert order_tracker.get_stats()["open_connections"] == 3
+            async with _websocket("/api/orders/T-MISSING/track") as missing:
+                assert (await next_message(missing))["code"] == 4404
+            assert order_tracker.get_stats()["open_connections"] == 0
+    asyncio.run(scenario())
+    print("✅ Order tracking WebSocket: PASSED")
+    return True
+
+
+def test_order_status_conditional_get():
+    """GET /api/orders/{n}: unchanged polls are 304s without the join, any status change is a new ETag"""
+    async def scenario():
+        async with fake_app() as (client, fake):
+            number = (await client.post("/api/orders/create", json=sample_order(seed_catalog(fake), 2))).json()["order_number"]
+            url = f"/api/orders/{number}"
+            fake.reset_stats()
+            full = await client.get(url)
+            etag = full.headers["etag"]
+            assert full.status_code == 200 and len(full.json()["items"]) == 2 and fake.calls[("GET", "orders")] == 1
+
+            fake.reset_stats()
+            for _ in range(5):
+                cached = await client.get(url, headers={"If-None-Match": etag})
+                assert cached.status_code == 304 and not cached.content and cached.headers["etag"] == etag
+            assert sum(fake.calls.values()) == 0  # served from the version map
+
+            await client.patch(f"{url}/status", json={"status": "ready"})
+            fake.reset_stats()
+            changed = await client.get(url, headers={"If-None-Match": etag})
+            assert changed.status_code == 200 and changed.json()["status"] == "ready"
+            assert changed.headers["etag"] != etag and fake.calls[("GET", "orders")] == 1
+            etag = changed.headers["etag"]
+
+            # Expired entry: a one-row version read instead of the join; an outside write is noticed
+            ttl, order_versions.ttl = order_versions.ttl, 0
+            try:
+                fake.reset_stats()
+                assert (await client.get(url, headers={"If-None-Match": etag})).status_code == 304
+                assert fake.calls[("GET", "orders")] == 1
+                fake.update("orders", {"status": "completed", "updated_at": "2030-01-01T00:00:00+00:00"},
+                            ' WHERE "order_number" = ?', [number])
+                outside = await client.get(url, headers={"If-None-Match": etag})
+                assert outside.status_code == 200 and outside.json()["status"] == "completed"
+            finally:
+                order_versions.ttl = ttl
+            assert (await client.get("/api/orders/T-NONE", headers={"If-None-Match": etag})).status_code == 404
+    asyncio.run(scenario())
+    print("✅ Order status conditional GET: PASSED")
+    return True
+
+
+if __name__ == "__main__":
+    print("🔍 DATABASE LAYER TESTS (offline)")
+    print("=" * 50)
+    tests = [
+        test_concurrent_gets_are_coalesced,
+        test_catalog_reads_are_cached,
+        test_write_invalidates_cached_reads,
+        test_embedded_reads_follow_child_writes,
+        test_idempotent_reads_are_retried,
+        test_open_breaker_fails_fast,
+        test_query_builder_projects_columns,
+        test_repeat_customers_resolve_from_cache,
+        test_legacy_resolution_leaves_shared_rows_alone,
+        test_concurrent_first_orders_create_one_customer,
+        test_customer_dedupe_resumes_from_checkpoint,
+        test_customer_stats_write_behind,
+        test_order_numbers_need_no_existence_check,
+        test_idempotent_order_retries,
+        test_order_create_contract,
+        test_order_for_merged_away_customer,
+        test_menu_catalog_snapshot,
+        test_write_journal_survives_restart_and_retries,
+        test_job_queue_limits_retries_and_dead_letters,
+        test_today_orders_cover_busy_day,
+        test_order_changes_feed,
+        test_order_changes_late_commit,
+        test_order_event_stream,
+        test_order_tracking_websocket,
+        test_order_status_conditional_get,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            passed += 1 if test() else 0
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: FAILED {e}")
+    print(f"\n🎯 {passed}/{len(tests)} tests passed")
+    sys.exit(0 if passed == len(tests) else 1)